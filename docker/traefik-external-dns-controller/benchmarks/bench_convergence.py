@@ -0,0 +1,173 @@
+"""End-to-end convergence benchmark against an in-process fake API server.
+
+Generates ROUTES IngressRoutes spread over NAMESPACES namespaces and SERVICES
+LoadBalancer services (a STALE fraction of them pointing at an old target),
+then drives the real controller code through four phases:
+
+  initial sync  sync_all_existing_ingress_routes() plus the patch workers
+  kopf replay   handle_ingressroute_event() for every route, as kopf's initial
+                listing would deliver them
+  LB flip       a new target on one service through apply_service_status(),
+                i.e. the settle window, sync_all_ingress_routes() and the patch workers
+  LB flap       FLAPS target changes on another service in quick succession,
+                which the settle window should collapse into one resync
+
+Patches are echoed back to the handlers as MODIFIED events. For each phase it
+reports the API calls by verb, calls per affected route, wall time until the
+fake cluster converged and how many handler events were dropped unevaluated
+(fingerprint or resourceVersion fast path); peak RSS is printed at the end.
+With --trace the run's spans are written to a JSONL file for trace_summary.py.
+
+Usage:
+    python benchmarks/bench_convergence.py [--routes 10000] [--namespaces 100] [--services 5]
+        [--stale 0.1] [--latency-ms 2] [--workers 4] [--qps 0] [--settle 0.2] [--flaps 5]
+        [--trace traces.jsonl]
+"""
+import argparse
+import logging
+import os
+import resource
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import controller  # noqa: E402
+from fake_api import EventDispatcher, FakeCustomObjectsApi  # noqa: E402
+
+GROUP = 'traefik.io'
+TARGET = 'external-dns.alpha.kubernetes.io/target'
+PROXIED = 'external-dns.alpha.kubernetes.io/cloudflare-proxied'
+SELECTOR = 'bench.example.com/lb'
+
+
+def load_balancer(namespace, name, hostname):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(namespace=namespace, name=name),
+        status=SimpleNamespace(load_balancer=SimpleNamespace(ingress=[SimpleNamespace(hostname=hostname, ip=None)])),
+    )
+
+
+def wait_until(predicate, timeout=600):
+    started = time.perf_counter()
+    while not predicate():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError("the fake cluster did not converge")
+        time.sleep(0.005)
+    return time.perf_counter() - started
+
+
+def converged(api, routes, targets):
+    return all(api.annotation(GROUP, namespace, name, TARGET) == targets[service_type]
+               for namespace, name, service_type in routes)
+
+
+def skipped_events():
+    return sum(controller.REGISTRY.get_sample_value(f'{controller.METRICS_PREFIX}_ingressroute_events_total', {'result': result}) or 0
+               for result in ('skipped_fingerprint', 'skipped_resource_version'))
+
+
+def run_phase(api, dispatcher, label, affected, action, done):
+    dispatcher.drain()
+    api.calls.clear()
+    delivered, skipped = dispatcher.delivered, skipped_events()
+    started = time.perf_counter()
+    action()
+    wait_until(lambda: done() and controller.update_queue.qsize() == 0)
+    dispatcher.drain()
+    elapsed = time.perf_counter() - started
+    calls = sum(api.calls.values())
+    verbs = ', '.join(f"{verb} {count}" for verb, count in sorted(api.calls.items())) or 'none'
+    per_route = calls / affected if affected else 0
+    events = f"{skipped_events() - skipped:.0f}/{dispatcher.delivered - delivered}"
+    print(f"{label:<14} {affected:>8} {calls:>7} {per_route:>10.3f} {elapsed:>9.3f} {events:>13}  {verbs}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=10000)
+    parser.add_argument('--namespaces', type=int, default=100)
+    parser.add_argument('--services', type=int, default=5)
+    parser.add_argument('--stale', type=float, default=0.1, help='fraction of routes on an old target at startup')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='simulated API round trip per request')
+    parser.add_argument('--workers', type=int, default=controller.PATCH_CONCURRENCY, help='patch worker threads')
+    parser.add_argument('--qps', type=float, default=0, help='IngressRoute write limit (0 = unlimited)')
+    parser.add_argument('--settle', type=float, default=0.2, help='LoadBalancer settle window in seconds')
+    parser.add_argument('--flaps', type=int, default=5, help='target changes in the LB flap phase')
+    parser.add_argument('--trace', help='write spans to this JSONL file')
+    args = parser.parse_args()
+    controller.logger.setLevel(logging.WARNING)
+    if args.trace:
+        controller.tracer = controller.JsonlTracer(args.trace)
+
+    api = FakeCustomObjectsApi(latency=args.latency_ms / 1000)
+    controller.custom_objects_api = api
+    controller.active_api_groups = [GROUP]
+    controller.service_configs = {
+        f"svc-{i}": {'namespace': 'traefik', 'name': f"lb-{i}", 'priority': 100, 'default': i == 0,
+                     'annotations': {SELECTOR: f"svc-{i}"}}
+        for i in range(args.services)
+    }
+    controller.service_matcher = controller.ServiceMatcher(controller.service_configs)
+    controller.api_write_limiter = controller.TokenBucket(args.qps, max(int(args.qps), 1))
+    controller.PATCH_CONCURRENCY = args.workers
+    controller.DRIFT_RECONCILE_INTERVAL = 0
+    controller.target_settler.settle = args.settle
+
+    targets = {service_type: f"{service_type}.lb.example.com" for service_type in controller.service_configs}
+    for service_type, hostname in targets.items():
+        controller.service_targets.set(service_type, hostname)
+
+    routes = []
+    stale_every = int(1 / args.stale) if args.stale > 0 else 0
+    for i in range(args.routes):
+        namespace = f"ns-{i % args.namespaces}"
+        service_type = f"svc-{i % args.services}"
+        stale = stale_every and i % stale_every == 0
+        annotations = {SELECTOR: service_type, TARGET: 'old.lb.example.com' if stale else targets[service_type]}
+        if not stale:
+            annotations[PROXIED] = 'true'
+        api.add(GROUP, namespace, f"route-{i}", annotations)
+        routes.append((namespace, f"route-{i}", service_type))
+
+    dispatcher = EventDispatcher(controller.handle_ingressroute_event)
+    api.listeners.append(dispatcher)
+    controller.start_patch_workers()
+
+    print(f"{args.routes} routes in {args.namespaces} namespaces over {args.services} services, "
+          f"{args.stale:.0%} stale, {args.latency_ms}ms API latency, {args.workers} workers")
+    print(f"{'phase':<14} {'routes':>8} {'calls':>7} {'calls/route':>10} {'seconds':>9} {'events skip':>13}  by verb")
+
+    run_phase(api, dispatcher, 'initial sync', args.routes,
+              controller.sync_all_existing_ingress_routes,
+              lambda: converged(api, routes, targets))
+
+    def replay():
+        for namespace, name, _ in routes:
+            obj = api.objects[(GROUP, namespace, name)]
+            dispatcher(GROUP, None, obj)
+    run_phase(api, dispatcher, 'kopf replay', args.routes, replay, lambda: dispatcher.events.empty())
+
+    flipped = [route for route in routes if route[2] == 'svc-0']
+    targets['svc-0'] = 'svc-0-new.lb.example.com'
+    run_phase(api, dispatcher, 'LB flip', len(flipped),
+              lambda: controller.apply_service_status('svc-0', load_balancer('traefik', 'lb-0', targets['svc-0'])),
+              lambda: converged(api, flipped, targets))
+
+    if args.services > 1:
+        flapped = [route for route in routes if route[2] == 'svc-1']
+
+        def flap():
+            for i in range(args.flaps):
+                targets['svc-1'] = f"svc-1-flap-{i}.lb.example.com"
+                controller.apply_service_status('svc-1', load_balancer('traefik', 'lb-1', targets['svc-1']))
+                time.sleep(args.settle / 10)
+        run_phase(api, dispatcher, f"LB flap x{args.flaps}", len(flapped), flap,
+                  lambda: converged(api, flapped, targets))
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"peak RSS: {peak_kb / 1024:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Micro-benchmark: precompiled ServiceMatcher vs the original per-route config scan.
+
+Generates SERVICES service configurations and ROUTES IngressRoute annotation sets,
+checks that both implementations pick the same service for every route (all
+services share one priority, so the original first-match order applies), then
+times resolving every route with each.
+
+Usage:
+    python benchmarks/bench_matcher.py [--services 50] [--routes 10000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import controller  # noqa: E402
+
+
+def legacy_determine_service_type(annotations, service_configs):
+    """determine_service_type as it was before the matcher was introduced."""
+    lb_type = annotations.get('traefik.io/load-balancer-type', '').lower()
+    if lb_type and lb_type in service_configs:
+        return lb_type
+
+    matching_services = []
+    for service_id, service_config in service_configs.items():
+        service_annotations = service_config.get('annotations', {})
+        matches = True
+        for key, value in service_annotations.items():
+            if annotations.get(key, '').lower() != value.lower():
+                matches = False
+                break
+        if matches and service_annotations:
+            matching_services.append(service_id)
+
+    if matching_services:
+        return matching_services[0]
+
+    if service_configs:
+        for service_id, config in service_configs.items():
+            if config.get('default', False):
+                return service_id
+        return list(service_configs.keys())[0]
+    return None
+
+
+def make_configs(count):
+    regions = ['us-east', 'us-west', 'eu-central', 'ap-south', 'sa-east']
+    configs = {}
+    for i in range(count):
+        annotations = {'traefik.io/region': regions[i % len(regions)]}
+        if i % 3:
+            annotations[f"traefik.io/tier-{i % 7}"] = 'true'
+        configs[f"lb-{i}"] = {
+            'namespace': 'traefik',
+            'name': f"traefik-{i}",
+            'priority': 100,
+            'default': i == count - 1,
+            'annotations': annotations,
+        }
+    return configs
+
+
+def make_routes(count, configs, rng):
+    service_ids = list(configs)
+    routes = []
+    for i in range(count):
+        annotations = {
+            'kubernetes.io/ingress.class': 'traefik',
+            'external-dns.alpha.kubernetes.io/target': 'lb.example.com',
+            'external-dns.alpha.kubernetes.io/cloudflare-proxied': 'true',
+            'meta.helm.sh/release-name': f"app-{i}",
+            'meta.helm.sh/release-namespace': f"ns-{i % 40}",
+        }
+        roll = rng.random()
+        if roll < 0.1:
+            annotations['traefik.io/load-balancer-type'] = rng.choice(service_ids)
+        elif roll < 0.8:
+            annotations.update({key: value.upper() if rng.random() < 0.2 else value
+                                for key, value in configs[rng.choice(service_ids)]['annotations'].items()})
+        routes.append(annotations)
+    return routes
+
+
+def timed(fn, routes, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for annotations in routes:
+            fn(annotations)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--services', type=int, default=50)
+    parser.add_argument('--routes', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    configs = make_configs(args.services)
+    routes = make_routes(args.routes, configs, rng)
+    matcher = controller.ServiceMatcher(configs)
+
+    mismatches = sum(1 for annotations in routes
+                     if matcher.resolve(annotations) != legacy_determine_service_type(annotations, configs))
+    build_started = time.perf_counter()
+    controller.ServiceMatcher(configs)
+    build = time.perf_counter() - build_started
+
+    legacy = timed(lambda annotations: legacy_determine_service_type(annotations, configs), routes, args.repeat)
+    compiled = timed(matcher.resolve, routes, args.repeat)
+
+    print(f"{args.services} services x {args.routes} routes (best of {args.repeat})")
+    print(f"  legacy scan:      {legacy * 1000:8.1f} ms  ({legacy / args.routes * 1e6:.2f} us/route)")
+    print(f"  ServiceMatcher:   {compiled * 1000:8.1f} ms  ({compiled / args.routes * 1e6:.2f} us/route)")
+    print(f"  matcher build:    {build * 1000:8.3f} ms")
+    print(f"  speedup:          {legacy / compiled:8.1f}x")
+    print(f"  mismatches:       {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
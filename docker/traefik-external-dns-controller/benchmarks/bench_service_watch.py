@@ -0,0 +1,193 @@
+"""Compare the Service watch modes against an in-process fake API server.
+
+Simulates SERVICES configured LoadBalancer Services spread over NAMESPACES
+namespaces, each namespace also holding NOISE unrelated Services, then pushes
+EVENTS status updates through every Service in the cluster. For each
+SERVICE_WATCH_MODE it reports how many long-lived watches were opened, how
+many events the API server had to stream to the controller and how long it
+took to route them, plus how long the startup LISTs took with LIST_LATENCY_MS
+per LIST (they run concurrently, so this stays close to one round trip).
+
+Usage:
+    python benchmarks/bench_service_watch.py [--services 20] [--namespaces 4] [--noise 10] [--events 50]
+        [--list-latency-ms 20]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import controller  # noqa: E402
+
+LABEL_KEY = 'external-dns-controller/watch'
+
+
+def make_service(namespace, name, resource_version, hostname, labels):
+    return {
+        'metadata': {'namespace': namespace, 'name': name, 'resourceVersion': str(resource_version), 'labels': labels},
+        'status': {'loadBalancer': {'ingress': [{'hostname': hostname}]}},
+    }
+
+
+class FakeStream:
+    """Response object consumed by kubernetes_asyncio's Watch (readline per event)."""
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.content = self
+
+    async def readline(self):
+        line = await self.queue.get()
+        return line
+
+    def close(self):
+        pass
+
+    def release(self):
+        pass
+
+
+class FakeCluster:
+    """Minimal Services API: LIST and WATCH with namespace, field and label selectors."""
+    def __init__(self, list_latency=0.0):
+        self.list_latency = list_latency
+        self.services = {}
+        self.resource_version = 1
+        self.watches = []
+        self.list_calls = 0
+        self.watch_calls = 0
+        self.events_streamed = 0
+
+    def add(self, namespace, name, labeled):
+        labels = {LABEL_KEY: 'true'} if labeled else {}
+        self.services[(namespace, name)] = make_service(namespace, name, self.resource_version, f"{name}.lb.example.com", labels)
+
+    @staticmethod
+    def _matches(svc, namespace=None, field_selector=None, label_selector=None):
+        meta = svc['metadata']
+        if namespace and meta['namespace'] != namespace:
+            return False
+        if field_selector and meta['name'] != field_selector.split('=', 1)[1]:
+            return False
+        if label_selector:
+            key, value = label_selector.split('=', 1)
+            if meta['labels'].get(key) != value:
+                return False
+        return True
+
+    def update(self, namespace, name, hostname):
+        self.resource_version += 1
+        svc = self.services[(namespace, name)]
+        svc['metadata']['resourceVersion'] = str(self.resource_version)
+        svc['status']['loadBalancer']['ingress'] = [{'hostname': hostname}]
+        line = (json.dumps({'type': 'MODIFIED', 'object': svc}) + '\n').encode()
+        for selectors, stream in self.watches:
+            if self._matches(svc, **selectors):
+                stream.queue.put_nowait(line)
+                self.events_streamed += 1
+
+    async def _list_or_watch(self, watch=False, namespace=None, field_selector=None, label_selector=None, **_):
+        selectors = {'namespace': namespace, 'field_selector': field_selector, 'label_selector': label_selector}
+        if watch:
+            self.watch_calls += 1
+            stream = FakeStream()
+            self.watches.append((selectors, stream))
+            return stream
+        self.list_calls += 1
+        await asyncio.sleep(self.list_latency)
+        items = [controller.async_api_client.deserialize(SimpleNamespace(data=json.dumps(svc)), 'V1Service')
+                 for svc in self.services.values() if self._matches(svc, **selectors)]
+        return SimpleNamespace(items=items, metadata=SimpleNamespace(resource_version=str(self.resource_version)))
+
+
+class FakeCoreV1Api:
+    def __init__(self, cluster):
+        self.cluster = cluster
+
+    async def list_namespaced_service(self, namespace, **kwargs):
+        """:rtype: V1ServiceList"""
+        return await self.cluster._list_or_watch(namespace=namespace, **kwargs)
+
+    async def list_service_for_all_namespaces(self, **kwargs):
+        """:rtype: V1ServiceList"""
+        return await self.cluster._list_or_watch(**kwargs)
+
+
+async def run_mode(mode, args):
+    cluster = FakeCluster(args.list_latency_ms / 1000)
+    configs = {}
+    for i in range(args.services):
+        namespace = f"traefik-{i % args.namespaces}"
+        cluster.add(namespace, f"lb-{i}", labeled=True)
+        configs[f"svc-{i}"] = {'namespace': namespace, 'name': f"lb-{i}", 'priority': 100, 'annotations': {}}
+    for n in range(args.namespaces):
+        for j in range(args.noise):
+            cluster.add(f"traefik-{n}", f"other-{j}", labeled=False)
+
+    routed = []
+    controller.service_configs = configs
+    controller.service_targets = controller.ServiceTargetCache()
+    controller.service_watch_tasks.clear()
+    controller.SERVICE_WATCH_MODE = mode
+    controller.SERVICE_WATCH_LABEL_SELECTOR = f"{LABEL_KEY}=true" if mode == 'label' else ''
+    controller.sync_all_ingress_routes = lambda service_type, hostname, changed_at=None: routed.append(service_type)
+    controller.target_settler.settle = 0  # count every change, not just settled ones
+
+    async def no_config():
+        pass
+    controller.load_async_kube_config = no_config
+    controller.async_client.CoreV1Api = lambda _client: FakeCoreV1Api(cluster)
+
+    started = time.perf_counter()
+    await controller.watch_service()
+    init_seconds = time.perf_counter() - started
+    await asyncio.sleep(0.05)
+
+    expected = args.services * args.events
+    started = time.perf_counter()
+    for round_ in range(args.events):
+        for (namespace, name) in list(cluster.services):
+            cluster.update(namespace, name, f"{name}-{round_}.lb.example.com")
+    while len(routed) < expected:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+
+    for task in controller.service_watch_tasks.values():
+        task.cancel()
+    await asyncio.gather(*controller.service_watch_tasks.values(), return_exceptions=True)
+    await controller.async_api_client.close()
+    controller.async_api_client = None
+    return {
+        'mode': mode,
+        'lists': cluster.list_calls,
+        'watches': cluster.watch_calls,
+        'events_streamed': cluster.events_streamed,
+        'resyncs': len(routed),
+        'seconds': elapsed,
+        'init_seconds': init_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--services', type=int, default=20)
+    parser.add_argument('--namespaces', type=int, default=4)
+    parser.add_argument('--noise', type=int, default=10, help='unrelated Services per namespace')
+    parser.add_argument('--events', type=int, default=50, help='status updates per Service')
+    parser.add_argument('--list-latency-ms', type=float, default=20, help='simulated round trip per Service LIST')
+    args = parser.parse_args()
+    controller.logger.setLevel(logging.WARNING)
+
+    print(f"{args.services} services in {args.namespaces} namespaces, {args.noise} unrelated services per namespace, {args.events} updates each")
+    print(f"{'mode':<10} {'lists':>6} {'init s':>7} {'watches':>8} {'events streamed':>16} {'resyncs':>8} {'seconds':>8}")
+    for mode in ('service', 'namespace', 'label'):
+        result = asyncio.run(run_mode(mode, args))
+        print(f"{result['mode']:<10} {result['lists']:>6} {result['init_seconds']:>7.3f} {result['watches']:>8} {result['events_streamed']:>16} {result['resyncs']:>8} {result['seconds']:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Exercise leader election and sharding against an in-process fake Lease API.
+
+Runs REPLICAS ShardElectors against a fake coordination.k8s.io API with
+optimistic concurrency, using short Lease timings. For "leader" mode (one
+Lease) and "sharded" mode (SHARDS Leases) it reports how long the replicas
+take to cover every shard, how the shards and NAMESPACES namespaces are spread
+across replicas, and how long it takes to recover after a replica crashes
+(stops renewing), shuts down cleanly (releases its Leases) and rejoins. Every
+tick it also checks that no shard is ever owned by two replicas at once.
+
+Usage:
+    python benchmarks/bench_sharding.py [--replicas 3] [--shards 8] [--namespaces 1000] [--lease-duration 1.0]
+"""
+import argparse
+import asyncio
+import copy
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import controller  # noqa: E402
+
+
+class FakeCoordinationV1Api:
+    """Leases in one namespace with create/replace conflicts like the API server."""
+    def __init__(self):
+        self.leases = {}
+        self.resource_version = 0
+        self.calls = Counter()
+
+    def _store(self, lease):
+        self.resource_version += 1
+        lease = copy.deepcopy(lease)
+        lease.metadata.resource_version = str(self.resource_version)
+        self.leases[lease.metadata.name] = lease
+
+    async def read_namespaced_lease(self, name, namespace):
+        self.calls['get'] += 1
+        if name not in self.leases:
+            raise controller.AsyncApiException(status=404)
+        return copy.deepcopy(self.leases[name])
+
+    async def create_namespaced_lease(self, namespace, body):
+        self.calls['create'] += 1
+        if body.metadata.name in self.leases:
+            raise controller.AsyncApiException(status=409)
+        self._store(body)
+
+    async def replace_namespaced_lease(self, name, namespace, body):
+        self.calls['update'] += 1
+        current = self.leases.get(name)
+        if current is None:
+            raise controller.AsyncApiException(status=404)
+        if body.metadata.resource_version != current.metadata.resource_version:
+            raise controller.AsyncApiException(status=409)
+        self._store(body)
+
+    async def list_namespaced_lease(self, namespace, label_selector=None):
+        self.calls['list'] += 1
+        key, value = label_selector.split('=', 1)
+        items = [copy.deepcopy(lease) for lease in self.leases.values()
+                 if (lease.metadata.labels or {}).get(key) == value]
+        return controller.async_client.V1LeaseList(items=items)
+
+    async def delete_namespaced_lease(self, name, namespace):
+        self.calls['delete'] += 1
+        if self.leases.pop(name, None) is None:
+            raise controller.AsyncApiException(status=404)
+
+
+class Fleet:
+    """A set of replicas sharing one fake API, sampled for ownership every tick."""
+    def __init__(self, api, shards, args):
+        self.api = api
+        self.shards = shards
+        self.args = args
+        self.electors = {}
+        self.tasks = {}
+        self.overlaps = 0
+        self.next_id = 0
+
+    def start(self):
+        identity = f"replica-{self.next_id}"
+        self.next_id += 1
+        elector = controller.ShardElector(
+            self.api, 'default', identity, self.shards,
+            duration=self.args.lease_duration,
+            renew_deadline=self.args.lease_duration * 2 / 3,
+            retry_period=self.args.lease_duration / 5,
+        )
+        self.electors[identity] = elector
+        self.tasks[identity] = asyncio.create_task(elector.run())
+        return identity
+
+    async def crash(self, identity):
+        self.tasks.pop(identity).cancel()
+        del self.electors[identity]
+
+    async def stop(self, identity):
+        task = self.tasks.pop(identity)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await self.electors.pop(identity).stop()
+
+    def sample(self):
+        owners = Counter(shard for elector in self.electors.values() for shard in elector.owned)
+        self.overlaps += sum(1 for count in owners.values() if count > 1)
+        return owners
+
+    async def converge(self, balanced=False, timeout=60):
+        """Wait until every shard has exactly one owner (and, if asked, every replica owns one)."""
+        started = time.perf_counter()
+        while time.perf_counter() - started < timeout:
+            owners = self.sample()
+            covered = len(owners) == self.shards and all(count == 1 for count in owners.values())
+            if covered and (not balanced or all(e.owned for e in self.electors.values())):
+                return time.perf_counter() - started
+            await asyncio.sleep(0.01)
+        raise TimeoutError("replicas did not converge")
+
+    def distribution(self, namespaces):
+        per_replica = {identity: len(e.owned) for identity, e in self.electors.items()}
+        per_namespace = Counter()
+        for i in range(namespaces):
+            for identity, elector in self.electors.items():
+                if elector.owns(f"namespace-{i}"):
+                    per_namespace[identity] += 1
+        return per_replica, per_namespace
+
+
+async def run_mode(mode, args):
+    shards = 1 if mode == 'leader' else args.shards
+    balanced = mode == 'sharded' and args.shards >= args.replicas
+    fleet = Fleet(FakeCoordinationV1Api(), shards, args)
+    results = []
+
+    for _ in range(args.replicas):
+        fleet.start()
+    results.append(('start', await fleet.converge(balanced)))
+    per_replica, per_namespace = fleet.distribution(args.namespaces)
+
+    victim = next(identity for identity, e in fleet.electors.items() if e.owned)
+    await fleet.crash(victim)
+    results.append(('crash', await fleet.converge()))
+
+    victim = next(identity for identity, e in fleet.electors.items() if e.owned)
+    await fleet.stop(victim)
+    results.append(('clean stop', await fleet.converge()))
+
+    fleet.start()
+    results.append(('rejoin', await fleet.converge(balanced)))
+
+    for identity in list(fleet.tasks):
+        await fleet.stop(identity)
+    return results, per_replica, per_namespace, fleet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--replicas', type=int, default=3)
+    parser.add_argument('--shards', type=int, default=8)
+    parser.add_argument('--namespaces', type=int, default=1000)
+    parser.add_argument('--lease-duration', type=float, default=1.0, help='seconds; renew deadline and retry period scale with it')
+    args = parser.parse_args()
+    controller.logger.setLevel(logging.WARNING)
+
+    print(f"{args.replicas} replicas, {args.shards} shards, {args.namespaces} namespaces, lease duration {args.lease_duration}s")
+    for mode in ('leader', 'sharded'):
+        results, per_replica, per_namespace, fleet = asyncio.run(run_mode(mode, args))
+        print(f"\n{mode} mode")
+        for phase, seconds in results:
+            print(f"  {phase:<12} converged in {seconds:6.2f}s")
+        print(f"  shards per replica:     {sorted(per_replica.values(), reverse=True)}")
+        print(f"  namespaces per replica: {sorted(per_namespace.values(), reverse=True)}")
+        print(f"  overlapping owners:     {fleet.overlaps}")
+        print(f"  lease API calls:        {dict(fleet.api.calls)}")
+
+
+if __name__ == '__main__':
+    main()
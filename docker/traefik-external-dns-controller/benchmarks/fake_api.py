@@ -0,0 +1,127 @@
+"""In-process stand-in for the IngressRoute part of the Kubernetes API.
+
+FakeCustomObjectsApi implements the CustomObjectsApi methods the controller
+calls (paginated cluster/namespaced LIST, GET and PATCH), keeps objects in
+memory with resourceVersions, counts every call by verb and can add a fixed
+latency per request. Writes are echoed as MODIFIED events through
+EventDispatcher, which plays kopf's role and feeds them to the real
+handle_ingressroute_event.
+"""
+import copy
+import queue
+import threading
+import time
+import uuid
+from collections import Counter
+
+from kubernetes.client.exceptions import ApiException
+
+
+def make_ingress_route(group, namespace, name, annotations):
+    return {
+        'apiVersion': f'{group}/v1alpha1',
+        'kind': 'IngressRoute',
+        'metadata': {
+            'namespace': namespace,
+            'name': name,
+            'uid': str(uuid.uuid4()),
+            'annotations': dict(annotations),
+        },
+        'spec': {'routes': [{'match': f"Host(`{name}.{namespace}.example.com`)", 'kind': 'Rule'}]},
+    }
+
+
+class FakeCustomObjectsApi:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.objects = {}   # {(group, namespace, name): object}
+        self.resource_version = 0
+        self.calls = Counter()
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def add(self, group, namespace, name, annotations):
+        obj = make_ingress_route(group, namespace, name, annotations)
+        with self._lock:
+            self.resource_version += 1
+            obj['metadata']['resourceVersion'] = str(self.resource_version)
+            self.objects[(group, namespace, name)] = obj
+
+    def annotation(self, group, namespace, name, key):
+        with self._lock:
+            return self.objects[(group, namespace, name)]['metadata']['annotations'].get(key)
+
+    def _call(self, verb):
+        with self._lock:
+            self.calls[verb] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _list(self, group, namespace, limit, continue_token):
+        with self._lock:
+            keys = sorted(key for key in self.objects if key[0] == group and (namespace is None or key[1] == namespace))
+            start = int(continue_token or 0)
+            end = start + limit if limit else len(keys)
+            items = [copy.deepcopy(self.objects[key]) for key in keys[start:end]]
+            metadata = {'resourceVersion': str(self.resource_version)}
+        if end < len(keys):
+            metadata['continue'] = str(end)
+        return {'items': items, 'metadata': metadata}
+
+    def list_cluster_custom_object(self, group, version, plural, limit=None, _continue=None, **_):
+        self._call('list')
+        return self._list(group, None, limit, _continue)
+
+    def list_namespaced_custom_object(self, group, version, namespace, plural, limit=None, _continue=None, **_):
+        self._call('list')
+        return self._list(group, namespace, limit, _continue)
+
+    def get_namespaced_custom_object(self, group, version, namespace, plural, name, **_):
+        self._call('get')
+        with self._lock:
+            obj = self.objects.get((group, namespace, name))
+            if obj is None:
+                raise ApiException(status=404, reason='Not Found')
+            return copy.deepcopy(obj)
+
+    def patch_namespaced_custom_object(self, group, version, namespace, plural, name, body, **_):
+        self._call('patch')
+        with self._lock:
+            obj = self.objects.get((group, namespace, name))
+            if obj is None:
+                raise ApiException(status=404, reason='Not Found')
+            annotations = obj['metadata']['annotations']
+            for key, value in body['metadata'].get('annotations', {}).items():
+                if value is None:
+                    annotations.pop(key, None)
+                else:
+                    annotations[key] = value
+            self.resource_version += 1
+            obj['metadata']['resourceVersion'] = str(self.resource_version)
+            result = copy.deepcopy(obj)
+        for listener in self.listeners:
+            listener(group, 'MODIFIED', copy.deepcopy(result))
+        return result
+
+
+class EventDispatcher:
+    """Deliver watch events to a handler on one background thread, like a kopf watcher."""
+    def __init__(self, handler):
+        self.handler = handler
+        self.events = queue.Queue()
+        self.delivered = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def __call__(self, group, event_type, obj):
+        self.events.put((group, event_type, obj))
+
+    def _run(self):
+        while True:
+            group, event_type, obj = self.events.get()
+            metadata = obj['metadata']
+            self.handler(metadata['name'], metadata['namespace'], obj, group, event_type)
+            self.delivered += 1
+            self.events.task_done()
+
+    def drain(self):
+        self.events.join()
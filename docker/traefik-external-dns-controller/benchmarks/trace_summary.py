@@ -0,0 +1,62 @@
+"""Summarize a JSONL trace written with TRACING_EXPORTER=jsonl (or bench_convergence.py --trace).
+
+For every span name it prints how many spans there were and their total, median,
+p99 and maximum duration. For each resync it then splits the time to converge
+into the time its routes spent waiting in the queue (from the start of the resync
+to the start of their reconcile span) and in the reconcile itself, and adds up the
+child spans of those reconciles (target lookups, rate limiter waits, API calls).
+
+Usage:
+    python benchmarks/trace_summary.py traces.jsonl [--resyncs 10]
+"""
+import argparse
+import json
+from collections import defaultdict
+
+
+def duration(span):
+    return (span['endTimeUnixNano'] - span['startTimeUnixNano']) / 1e9
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--resyncs', type=int, default=10, help='longest resyncs to break down')
+    args = parser.parse_args()
+
+    with open(args.path) as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+    children = defaultdict(list)
+    by_name = defaultdict(list)
+    for span in spans:
+        children[span['parentSpanId']].append(span)
+        by_name[span['name']].append(duration(span))
+
+    print(f"{'span':<24} {'count':>8} {'total s':>10} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, durations in sorted(by_name.items(), key=lambda item: -sum(item[1])):
+        durations.sort()
+        print(f"{name:<24} {len(durations):>8} {sum(durations):>10.3f} {percentile(durations, 0.5) * 1e3:>9.2f} "
+              f"{percentile(durations, 0.99) * 1e3:>9.2f} {durations[-1] * 1e3:>9.2f}")
+
+    resyncs = sorted((span for span in spans if span['name'] == 'resync'), key=duration, reverse=True)
+    for resync in resyncs[:args.resyncs]:
+        reconciles = [span for span in children[resync['spanId']] if span['name'] == 'ingressroute.reconcile']
+        if not reconciles:
+            continue
+        queued = sorted((span['startTimeUnixNano'] - resync['startTimeUnixNano']) / 1e9 for span in reconciles)
+        nested = defaultdict(float)
+        for reconcile in reconciles:
+            for child in children[reconcile['spanId']]:
+                nested[child['name']] += duration(child)
+        breakdown = ', '.join(f"{name} {seconds:.3f}s" for name, seconds in sorted(nested.items(), key=lambda item: -item[1]))
+        print(f"\n{resync['attributes'].get('label')}: {duration(resync):.3f}s for {len(reconciles)} reconciles")
+        print(f"  queue wait  p50 {percentile(queued, 0.5):.3f}s, max {queued[-1]:.3f}s")
+        print(f"  reconciling {sum(duration(span) for span in reconciles):.3f}s in total: {breakdown or 'no child spans'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,35 +1,64 @@
 import os
 import logging
+import logging.handlers
 import warnings
 import sys
 import io
+import atexit
+import queue
 import kopf
 import kubernetes.config
-from kubernetes.client import ApiClient, CustomObjectsApi, CoreV1Api
-from kubernetes import watch
+from kubernetes.client import ApiClient, ApisApi, Configuration, CustomObjectsApi, CoreV1Api
+from kubernetes.client.exceptions import ApiException
+from kubernetes_asyncio import client as async_client, config as async_config, watch as async_watch
+from kubernetes_asyncio.client.exceptions import ApiException as AsyncApiException
+import asyncio
+import urllib3
+import random
 import threading
 import time
 import json
-from queue import Queue
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import gzip
+import base64
+import re
+import fnmatch
+import hashlib
+import functools
+import socket
+import heapq
+import itertools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from aiohttp import web
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
 
-# Supported Traefik API groups (old and new)
-TRAEFIK_API_GROUPS = ['traefik.containo.us', 'traefik.io']
+# Supported Traefik API groups, preferred (new) first
+TRAEFIK_API_GROUPS = ['traefik.io', 'traefik.containo.us']
 TRAEFIK_VERSION = 'v1alpha1'
+TRAEFIK_ALIAS_PROBE_SIZE = 50  # routes compared per group to detect aliasing
 active_api_groups = []  # Will be populated at startup
+served_api_groups = None  # {group: [versions]} from API discovery, cached for the process lifetime
 
 # Custom stderr filter to suppress CRD warnings
+CRD_WARNING_PREFIX = 'Unresolved resources cannot be served'
+
 class FilteredStderr:
-    """Wrapper for stderr that filters out CRD warning messages."""
+    """Wrapper for stderr that filters out CRD warning messages.
+
+    Only third-party output passes through here (the controller's own log handler
+    writes to the real stderr), and only the start of each write is compared.
+    """
     def __init__(self, original_stderr):
         self.original_stderr = original_stderr
         self.buffer = []
         
     def write(self, text):
         # Filter out CRD warning messages
-        if 'Unresolved resources cannot be served' in text:
-            return
-        if 'try creating their CRDs' in text:
+        if text.startswith(CRD_WARNING_PREFIX):
             return
         self.original_stderr.write(text)
         
@@ -45,6 +74,7 @@ sys.stderr = FilteredStderr(sys.stderr)
 # Dynamic Service Configuration Support
 # ====================================
 # This controller supports dynamic service configuration through the SERVICES_CONFIG environment variable.
+# or the file named by SERVICES_CONFIG_FILE, which is reloaded in place when it changes.
 # 
 # Example SERVICES_CONFIG JSON format:
 # {
@@ -83,28 +113,85 @@ sys.stderr = FilteredStderr(sys.stderr)
 warnings.filterwarnings('ignore', module='kopf._core.reactor.running')
 
 # 2. Robust logging configuration
+# LOG_LEVEL sets the controller's level and LOG_FORMAT picks "text" lines or one JSON
+# object per line ("json"). The logger only puts records on a queue: a QueueListener
+# thread formats them and writes to stderr, so the handler, watch and worker threads
+# never wait on I/O. During bulk resyncs only one in LOG_SAMPLE_EVERY per-route info
+# lines is logged (1 logs them all); the rest go out at debug level.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_SAMPLE_EVERY = max(1, int(os.getenv('LOG_SAMPLE_EVERY', '100')))
+
 class SimpleFormatter(logging.Formatter):
     def format(self, record):
         return f"[{self.formatTime(record)}] [{record.levelname}] - {record.getMessage()}"
 
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any fields passed with extra=."""
+    RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread.
+
+    The stock prepare() renders the message on the logging thread so the record
+    can be pickled; this queue never leaves the process, so it isn't needed.
+    """
+    def prepare(self, record):
+        return record
+
 logger = logging.getLogger('external-dns-controller')
 logger.handlers.clear()
-logger.setLevel(logging.INFO)
+log_level = logging.getLevelName(LOG_LEVEL)
+logger.setLevel(log_level if isinstance(log_level, int) else logging.INFO)
 logger.propagate = False
 
-handler = logging.StreamHandler()
-handler.setFormatter(SimpleFormatter(datefmt='%Y-%m-%d %H:%M:%S'))
-logger.addHandler(handler)
+# Written to the real stderr, past the FilteredStderr wrapper
+handler = logging.StreamHandler(sys.stderr.original_stderr)
+if LOG_FORMAT == 'json':
+    handler.setFormatter(JsonFormatter(datefmt='%Y-%m-%dT%H:%M:%S%z'))
+else:
+    handler.setFormatter(SimpleFormatter(datefmt='%Y-%m-%d %H:%M:%S'))
+log_queue = queue.SimpleQueue()
+logger.addHandler(DeferredQueueHandler(log_queue))
+log_listener = logging.handlers.QueueListener(log_queue, handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+class LogSampler:
+    """Let through the first of every `every` calls to sample()."""
+    def __init__(self, every):
+        self.every = every
+        self._count = itertools.count()
+
+    def sample(self):
+        return next(self._count) % self.every == 0
+
+route_log_sampler = LogSampler(LOG_SAMPLE_EVERY)
 
 # 3. Custom filter to suppress specific CRD warnings
 class SuppressCRDWarnings(logging.Filter):
-    """Filter to suppress 'Unresolved resources cannot be served' warnings."""
+    """Filter to suppress 'Unresolved resources cannot be served' warnings.
+
+    kopf logs the full text as the record's msg, so the unformatted message is
+    checked without rendering the record.
+    """
     def filter(self, record):
-        message = record.getMessage()
         # Suppress CRD warnings for API groups we're handling dynamically
-        if 'Unresolved resources cannot be served' in message:
-            return False
-        return True
+        return not (isinstance(record.msg, str) and record.msg.startswith(CRD_WARNING_PREFIX))
 
 # 4. Silence other loggers and apply custom filter
 for lib in ['kubernetes', 'urllib3', 'kopf', 'asyncio']:
@@ -112,19 +199,840 @@ for lib in ['kubernetes', 'urllib3', 'kopf', 'asyncio']:
     logging.getLogger(lib).propagate = False
     logging.getLogger(lib).setLevel(logging.WARNING)
 
-# Apply custom filter to root logger to catch all CRD warnings
-logging.root.addFilter(SuppressCRDWarnings())
-# Also apply to kopf's observation logger specifically
-logging.getLogger('kopf.reactor.observation').addFilter(SuppressCRDWarnings())
+# Logger filters only see records logged on that logger itself, so the filter goes
+# on kopf's observation logger (under both its current and its older module path)
+for name in ['kopf._core.reactor.observation', 'kopf.reactor.observation']:
+    logging.getLogger(name).addFilter(SuppressCRDWarnings())
 
-# Cache to track last updates and health
-update_queue = Queue()
-last_updated = {}
+# Health tracking
 last_healthy_time = time.time()
+
+# Startup timings: how long each phase took (see record_startup_phase); "total" runs
+# from process start until the first sync of the IngressRoutes has been reconciled
+PROCESS_STARTED = time.monotonic()
+startup_phases = {}
 service_watch_active = False
-# Change to support multiple services
-service_hostnames = {}  # {service_type: hostname}
+
+# Health server on the operator loop: /livez, /readyz (and /healthz as an alias of
+# /livez) and /metrics. A replica is ready once every Service watch has been seen
+# connected within READINESS_WATCH_MAX_AGE seconds, the IngressRoute cache is synced
+# and no more than READINESS_MAX_QUEUE_DEPTH routes are waiting (0 disables that check)
+HEALTH_BIND_ADDRESS = os.getenv('HEALTH_BIND_ADDRESS', '0.0.0.0')
+HEALTH_PORT = int(os.getenv('HEALTH_PORT', '8080'))
+READINESS_WATCH_MAX_AGE = float(os.getenv('READINESS_WATCH_MAX_AGE', '600'))
+READINESS_MAX_QUEUE_DEPTH = int(os.getenv('READINESS_MAX_QUEUE_DEPTH', '1000'))
+health_runner = None
 service_configs = {}    # {service_type: {namespace: ns, name: name}}
+service_index = {}      # {(namespace, name): [service types]}, see build_service_index
+
+# With SERVICES_CONFIG_FILE set, the service configuration is read from that file (a
+# mounted ConfigMap) instead of SERVICES_CONFIG and reloaded in place when it changes,
+# checked every SERVICES_CONFIG_RELOAD_INTERVAL seconds (0 only reads it at startup)
+SERVICES_CONFIG_FILE = os.getenv('SERVICES_CONFIG_FILE', '')
+SERVICES_CONFIG_RELOAD_INTERVAL = float(os.getenv('SERVICES_CONFIG_RELOAD_INTERVAL', '10'))
+services_config_text = ''
+services_config_task = None
+
+# How long a handler waits for the Service watch to report a service's targets
+# before giving up on the event (the next event or resync will retry).
+SERVICE_TARGET_WAIT_SECONDS = float(os.getenv('SERVICE_TARGET_WAIT_SECONDS', '30'))
+
+# A LoadBalancer target change is applied once the Service has kept the new targets
+# for SERVICE_SETTLE_SECONDS (each further change restarts the window, but a change
+# waits at most SERVICE_SETTLE_MAX_SECONDS); 0 applies changes immediately
+SERVICE_SETTLE_SECONDS = float(os.getenv('SERVICE_SETTLE_SECONDS', '5'))
+SERVICE_SETTLE_MAX_SECONDS = float(os.getenv('SERVICE_SETTLE_MAX_SECONDS', '30'))
+
+# Service watches reconnect with jittered exponential backoff between these bounds
+SERVICE_WATCH_BASE_BACKOFF = float(os.getenv('SERVICE_WATCH_BASE_BACKOFF', '1'))
+SERVICE_WATCH_MAX_BACKOFF = float(os.getenv('SERVICE_WATCH_MAX_BACKOFF', '60'))
+SERVICE_WATCH_TIMEOUT = 300
+service_watch_tasks = {}  # {watch_id: asyncio.Task}
+service_watch_plan = {}  # {watch_id: (list method, kwargs, covered service types)}
+service_watch_versions = {}  # {watch_id: last resourceVersion seen}
+service_watch_seen = {}  # {watch_id: monotonic time the watch was last known connected}
+
+# How configured Services are watched: one watch per Service ("service"), one per
+# namespace ("namespace") or a single cluster-wide watch on a label ("label")
+SERVICE_WATCH_MODE = os.getenv('SERVICE_WATCH_MODE', 'service').lower()
+SERVICE_WATCH_LABEL_SELECTOR = os.getenv('SERVICE_WATCH_LABEL_SELECTOR', '')
+
+# IngressRoute listing is paginated so memory stays bounded by the page size
+INGRESSROUTE_PAGE_SIZE = int(os.getenv('INGRESSROUTE_PAGE_SIZE', '500'))
+INGRESSROUTE_LIST_MAX_RESTARTS = 3
+
+# Number of worker threads patching IngressRoutes queued on the work queue
+PATCH_CONCURRENCY = int(os.getenv('PATCH_CONCURRENCY', '4'))
+
+# Connection pool of the shared synchronous API client (one connection per patch
+# worker plus headroom for the sync, drift and snapshot paths), TCP keepalive on its
+# connections and the (connect, read) timeout applied to every request
+API_POOL_SIZE = int(os.getenv('API_POOL_SIZE') or PATCH_CONCURRENCY + 4)
+API_TCP_KEEPALIVE = os.getenv('API_TCP_KEEPALIVE', 'true').lower() == 'true'
+API_REQUEST_TIMEOUT = (
+    float(os.getenv('API_CONNECT_TIMEOUT', '5')),
+    float(os.getenv('API_READ_TIMEOUT', '30')),
+)
+api_client = None
+custom_objects_api = None
+core_v1_api = None
+async_api_client = None
+
+# How IngressRoutes are patched: "merge" sends a JSON merge patch of only the managed
+# annotations, "apply" uses server-side apply with a field manager
+PATCH_MODE = os.getenv('PATCH_MODE', 'merge').lower()
+PATCH_FIELD_MANAGER = 'traefik-external-dns-controller'
+
+# Work queue retry backoff and the global rate limit on IngressRoute writes
+WORKQUEUE_BASE_DELAY = float(os.getenv('WORKQUEUE_BASE_DELAY', '1'))
+WORKQUEUE_MAX_DELAY = float(os.getenv('WORKQUEUE_MAX_DELAY', '300'))
+WORKQUEUE_MAX_RETRIES = int(os.getenv('WORKQUEUE_MAX_RETRIES', '10'))
+API_WRITE_QPS = float(os.getenv('API_WRITE_QPS', '20'))
+API_WRITE_BURST = int(os.getenv('API_WRITE_BURST', '50'))
+
+# Periodic drift reconciler: seconds between passes (0 disables it) and the cap on
+# the writes a pass may trigger per second
+DRIFT_RECONCILE_INTERVAL = float(os.getenv('DRIFT_RECONCILE_INTERVAL', '600'))
+DRIFT_MAX_WRITES_PER_SECOND = float(os.getenv('DRIFT_MAX_WRITES_PER_SECOND', '2'))
+DRIFT_MAX_PAGE_GAP = 60  # keep LIST continue tokens well inside their lifetime
+
+# Optional warm-restart snapshot, kept in a local file or in a ConfigMap in the pod's
+# namespace, rewritten every SNAPSHOT_INTERVAL seconds when it changed
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', '')
+SNAPSHOT_CONFIGMAP = os.getenv('SNAPSHOT_CONFIGMAP', '')
+SNAPSHOT_INTERVAL = float(os.getenv('SNAPSHOT_INTERVAL', '60'))
+
+# How replicas share the work: "single" (one replica does everything), "leader"
+# (Lease-based leader election) or "sharded" (namespaces split over SHARD_COUNT Leases)
+REPLICA_MODE = os.getenv('REPLICA_MODE', 'single').lower()
+REPLICA_IDENTITY = os.getenv('POD_NAME') or socket.gethostname()
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '8'))
+LEASE_NAME = os.getenv('LEASE_NAME', 'traefik-external-dns-controller')
+POD_NAMESPACE = os.getenv('POD_NAMESPACE', '')
+LEASE_MEMBER_LABEL = 'traefik-external-dns-controller/member-of'
+LEASE_DURATION_SECONDS = float(os.getenv('LEASE_DURATION_SECONDS', '15'))
+LEASE_RENEW_DEADLINE_SECONDS = float(os.getenv('LEASE_RENEW_DEADLINE_SECONDS', '10'))
+LEASE_RETRY_PERIOD_SECONDS = float(os.getenv('LEASE_RETRY_PERIOD_SECONDS', '2'))
+shard_elector = None
+lease_task = None
+
+# Which IngressRoutes this controller manages: namespace allow and deny globs
+# (comma-separated) and a label selector
+WATCH_NAMESPACES = [pattern.strip() for pattern in os.getenv('WATCH_NAMESPACES', '').split(',') if pattern.strip()]
+EXCLUDE_NAMESPACES = [pattern.strip() for pattern in os.getenv('EXCLUDE_NAMESPACES', '').split(',') if pattern.strip()]
+INGRESSROUTE_LABEL_SELECTOR = os.getenv('INGRESSROUTE_LABEL_SELECTOR', '').strip()
+ingressroute_label_requirements = []
+
+# Shared IngressRoute metadata cache
+# ==================================
+# kopf already keeps a watch open on every active API group, so its events are the
+# single source of truth for IngressRoute state. The event handlers feed this cache,
+# the startup sync primes it with one paginated LIST per group, and every other path
+# (patches, per-service resyncs) reads from it instead of issuing its own GET or LIST.
+# Only the metadata we actually need is kept, not the full objects.
+
+def resource_version_newer(version, other):
+    """Whether resourceVersion version is known to be newer than other.
+
+    resourceVersions are opaque in general, but the API server hands out etcd
+    revisions; anything that does not compare as integers is not known to be newer.
+    """
+    try:
+        return int(version) > int(other)
+    except (TypeError, ValueError):
+        return False
+
+class IngressRouteCache:
+    """Thread-safe store of IngressRoute metadata keyed by (group, namespace, name).
+
+    Each entry also records the service type the route resolves to, and the cache
+    keeps a reverse index from service type to route keys so a LoadBalancer change
+    only has to visit the routes bound to that Service.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+        self._by_service = {}   # {service_type: set of keys}
+        self.synced = threading.Event()
+
+    def _index(self, key, entry):
+        old = self._items.get(key)
+        if old is not None and old['service_type'] != entry['service_type']:
+            self._unindex(key, old)
+        self._items[key] = entry
+        self._by_service.setdefault(entry['service_type'], set()).add(key)
+
+    def _unindex(self, key, entry):
+        keys = self._by_service.get(entry['service_type'])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_service[entry['service_type']]
+
+    def upsert(self, group, metadata, synced_target=None):
+        """Store the metadata of an IngressRoute as seen by a watch event or API response.
+
+        Besides the annotations (only those ServiceMatcher.fingerprint looks at) and
+        the resolved service type, an entry keeps the route's
+        fingerprint (see ServiceMatcher.fingerprint) and synced_target: the target the
+        route was last found in step with, or None if it was not (yet) evaluated.
+        """
+        key = (group, metadata['namespace'], metadata['name'])
+        entry = self._entry(metadata, synced_target)
+        with self._lock:
+            self._index(key, entry)
+        return entry
+
+    @staticmethod
+    def _entry(metadata, synced_target=None):
+        # Only what resolving and patching the route needs: annotations such as
+        # last-applied-configuration can be as large as the object itself
+        annotations = service_matcher.relevant(metadata.get('annotations') or {})
+        return {
+            'resourceVersion': metadata.get('resourceVersion'),
+            'annotations': annotations,
+            'service_type': determine_service_type_for_annotations(annotations),
+            'fingerprint': service_matcher.fingerprint(annotations),
+            'synced_target': synced_target,
+        }
+
+    def refresh(self, group, metadata):
+        """Store the metadata returned by our own write to a cached route.
+
+        A watch event handled while the write was in flight may already have cached
+        a newer version (or dropped the route), so the response only replaces an
+        entry whose resourceVersion is missing or older. Returns the entry cached
+        afterwards, or None if the route is no longer cached.
+        """
+        key = (group, metadata['namespace'], metadata['name'])
+        entry = self._entry(metadata)
+        with self._lock:
+            current = self._items.get(key)
+            if current is None or resource_version_newer(current['resourceVersion'], entry['resourceVersion']):
+                return current
+            self._index(key, entry)
+        return entry
+
+    def mark_synced(self, group, namespace, name, fingerprint, target):
+        """Record that the route, as of fingerprint, was found in step with target."""
+        key = (group, namespace, name)
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None and entry['fingerprint'] == fingerprint:
+                self._items[key] = {**entry, 'synced_target': target}
+
+    def touch(self, group, namespace, name, resource_version):
+        """Advance the resourceVersion of a route whose relevant fields did not change."""
+        key = (group, namespace, name)
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None and entry['resourceVersion'] != resource_version:
+                self._items[key] = {**entry, 'resourceVersion': resource_version}
+
+    def delete(self, group, namespace, name):
+        key = (group, namespace, name)
+        with self._lock:
+            entry = self._items.pop(key, None)
+            if entry is not None:
+                self._unindex(key, entry)
+
+    def retain(self, keep):
+        """Drop every route whose key fails keep(key). Returns the number dropped."""
+        with self._lock:
+            dropped = [key for key in self._items if not keep(key)]
+            for key in dropped:
+                self._unindex(key, self._items.pop(key))
+        return len(dropped)
+
+    def reindex(self):
+        """Resolve every route again with the current service_matcher.
+
+        Fingerprints are recomputed for all routes, since the matcher's keys may have
+        changed. Returns the keys whose service type changed; their synced_target is
+        cleared so the next event evaluates them. Entries only keep the annotations
+        the previous matcher looked at, so this is only correct if the new matcher
+        needs no other annotation keys.
+        """
+        changed = []
+        for key, entry in self.items():
+            service_type = determine_service_type_for_annotations(entry['annotations'])
+            updated = {**entry, 'annotations': service_matcher.relevant(entry['annotations']),
+                       'service_type': service_type, 'fingerprint': service_matcher.fingerprint(entry['annotations'])}
+            if service_type != entry['service_type']:
+                updated['synced_target'] = None
+            with self._lock:
+                # An event may have replaced the entry meanwhile, already resolved anew
+                if self._items.get(key) is not entry:
+                    continue
+                self._index(key, updated)
+            if service_type != entry['service_type']:
+                changed.append(key)
+        return changed
+
+    def restore(self, group, namespace, name, resource_version, service_type, annotations):
+        """Store and return an entry saved by a snapshot; the service type is trusted as saved."""
+        entry = {
+            'resourceVersion': resource_version,
+            'annotations': annotations,
+            'service_type': service_type,
+            'fingerprint': service_matcher.fingerprint(annotations),
+            'synced_target': None,
+        }
+        with self._lock:
+            self._index((group, namespace, name), entry)
+        return entry
+
+    def discard_entry(self, key, entry):
+        """Drop a route only if entry is still what is cached for it. Returns whether it was dropped."""
+        with self._lock:
+            if self._items.get(key) is not entry:
+                return False
+            self._unindex(key, self._items.pop(key))
+        return True
+
+    def get(self, group, namespace, name):
+        """Return the cached entry for a route, or None. Entries are replaced, never mutated."""
+        with self._lock:
+            return self._items.get((group, namespace, name))
+
+    def items(self, group=None):
+        """Return a point-in-time list of ((group, namespace, name), entry) pairs."""
+        with self._lock:
+            return [(key, entry) for key, entry in self._items.items() if group is None or key[0] == group]
+
+    def items_for_service(self, service_type):
+        """Return a point-in-time list of (key, entry) pairs for routes bound to a service type."""
+        with self._lock:
+            return [(key, self._items[key]) for key in self._by_service.get(service_type, ())]
+
+    def count_by_service(self):
+        with self._lock:
+            return {service_type: len(keys) for service_type, keys in self._by_service.items()}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+ingress_route_cache = IngressRouteCache()
+
+# IngressRoute scope
+# ==================
+# WATCH_NAMESPACES and EXCLUDE_NAMESPACES are comma-separated namespace globs and
+# INGRESSROUTE_LABEL_SELECTOR is a Kubernetes label selector. They are pushed to the
+# API server wherever possible: kopf only watches the allowed namespaces and passes
+# the label selector on its watches, and the startup sync lists with the same
+# selector. The same rules are checked client-side before a route is cached, which
+# covers deny-only lists (the watch stays cluster-wide) and kopf versions without
+# server-side label selectors.
+
+# Label keys are [prefix/]name and values alphanumerics with - _ . (possibly empty)
+_SELECTOR_SET = re.compile(r'^([\w./-]+)\s+(in|notin)\s+\(\s*([\w.-]*(?:\s*,\s*[\w.-]*)*)\s*\)$')
+_SELECTOR_EQUALITY = re.compile(r'^([\w./-]+)\s*(==|=|!=)\s*([\w.-]*)$')
+_SELECTOR_EXISTS = re.compile(r'^(!?)\s*([\w./-]+)$')
+
+def parse_label_selector(selector):
+    """Parse a label selector into (key, operator, values) requirements.
+
+    Supports the equality-based (=, ==, !=) and set-based (in, notin, exists,
+    !exists) forms. Raises ValueError for anything else.
+    """
+    requirements = []
+    for term in re.split(r',(?![^(]*\))', selector or ''):
+        term = term.strip()
+        if not term:
+            continue
+        match = _SELECTOR_SET.match(term)
+        if match:
+            if not match.group(3):
+                raise ValueError(f"Invalid label selector term: {term!r} (empty set)")
+            values = frozenset(value.strip() for value in match.group(3).split(','))
+            requirements.append((match.group(1), match.group(2), values))
+            continue
+        match = _SELECTOR_EQUALITY.match(term)
+        if match:
+            operator = 'notin' if match.group(2) == '!=' else 'in'
+            requirements.append((match.group(1), operator, frozenset([match.group(3)])))
+            continue
+        match = _SELECTOR_EXISTS.match(term)
+        if match:
+            requirements.append((match.group(2), '!' if match.group(1) else 'exists', None))
+            continue
+        raise ValueError(f"Invalid label selector term: {term!r}")
+    return requirements
+
+def labels_match(requirements, labels):
+    """Whether a label dict satisfies every parsed selector requirement."""
+    labels = labels or {}
+    for key, operator, values in requirements:
+        if operator == 'exists':
+            if key not in labels:
+                return False
+        elif operator == '!':
+            if key in labels:
+                return False
+        elif operator == 'in':
+            if labels.get(key) not in values:
+                return False
+        elif key in labels and labels[key] in values:
+            return False
+    return True
+
+@functools.lru_cache(maxsize=4096)
+def namespace_in_scope(namespace):
+    if WATCH_NAMESPACES and not any(fnmatch.fnmatchcase(namespace, pattern) for pattern in WATCH_NAMESPACES):
+        return False
+    return not any(fnmatch.fnmatchcase(namespace, pattern) for pattern in EXCLUDE_NAMESPACES)
+
+def route_in_scope(metadata):
+    """Whether an IngressRoute falls inside the configured namespaces and label selector."""
+    return namespace_in_scope(metadata['namespace']) and labels_match(ingressroute_label_requirements, metadata.get('labels'))
+
+def get_watch_scope():
+    """kopf.run() arguments that restrict the IngressRoute watches to the allowed namespaces."""
+    if not WATCH_NAMESPACES:
+        return {'clusterwide': True}
+    exclusions = ''.join(f", !{pattern}" for pattern in EXCLUDE_NAMESPACES)
+    return {'namespaces': [f"{pattern}{exclusions}" for pattern in WATCH_NAMESPACES]}
+
+def get_list_namespaces():
+    """Namespaces to LIST IngressRoutes in: the allow list if it names them exactly, else cluster-wide (None)."""
+    if WATCH_NAMESPACES and not any(char in pattern for pattern in WATCH_NAMESPACES for char in '*?['):
+        return [namespace for namespace in dict.fromkeys(WATCH_NAMESPACES) if namespace_in_scope(namespace)]
+    return [None]
+
+# LoadBalancer target map
+# =======================
+# The Service watch is the only writer of LoadBalancer targets and handlers never
+# read a Service from the API themselves. A service becomes "ready" once the watch
+# (or its initial read) has observed it, whether or not it has targets yet; until
+# then handlers block on the readiness gate instead of falling back to the API.
+
+class ServiceTargetCache:
+    """Thread-safe map of service_type -> LoadBalancer targets, fed by the Service watch."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._targets = {}
+        self._ready = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _ready_event(self, service_type):
+        with self._lock:
+            return self._ready.setdefault(service_type, threading.Event())
+
+    def set(self, service_type, targets):
+        """Record the targets observed for a service and open its readiness gate."""
+        with self._lock:
+            self._targets[service_type] = targets
+        self._ready_event(service_type).set()
+
+    def mark_ready(self, service_type):
+        """Open the readiness gate for a service observed without any targets."""
+        self._ready_event(service_type).set()
+
+    def forget(self, service_type):
+        """Drop the targets of a service that was removed from (or moved in) the configuration."""
+        with self._lock:
+            self._targets.pop(service_type, None)
+            self._ready.pop(service_type, None)
+
+    def is_ready(self, service_type):
+        return self._ready_event(service_type).is_set()
+
+    def peek(self, service_type):
+        """Return the current targets without waiting or touching the counters."""
+        with self._lock:
+            return self._targets.get(service_type)
+
+    def get(self, service_type, timeout=None):
+        """Return the targets for a service, waiting up to timeout for the first observation."""
+        ready = self._ready_event(service_type).wait(timeout)
+        with self._lock:
+            targets = self._targets.get(service_type) if ready else None
+            if targets:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not ready:
+            logger.warning(f"Timed out after {timeout}s waiting for the {service_type} service to be observed")
+        return targets
+
+    def observed(self):
+        """Return {service_type: targets or None} for every service observed so far."""
+        with self._lock:
+            ready = [service_type for service_type, event in self._ready.items() if event.is_set()]
+            return {service_type: self._targets.get(service_type) for service_type in ready}
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'services': len(self._targets)}
+
+service_targets = ServiceTargetCache()
+
+# Tracing
+# =======
+# Optional spans showing where convergence time goes: one per Service event, one per
+# settled LoadBalancer target change, one per resync batch (open until its last route
+# is done), one per route reconcile and one per API call or rate limiter wait made
+# inside any of those. TRACING_EXPORTER picks "jsonl" (one span per line, appended to
+# TRACING_JSONL_PATH by a writer thread) or "otlp" (the OpenTelemetry SDK with its
+# OTLP/HTTP exporter, configured by the standard OTEL_* variables); empty disables
+# tracing, leaving a single None check on each of those paths.
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', '').lower()
+TRACING_JSONL_PATH = os.getenv('TRACING_JSONL_PATH', '/tmp/traefik-external-dns-traces.jsonl')
+TRACING_SERVICE_NAME = 'traefik-external-dns-controller'
+tracer = None
+current_span = contextvars.ContextVar('current_span', default=None)
+NO_SPAN = nullcontext()
+
+class JsonlSpan:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'attributes')
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.time_ns()
+        self.attributes = attributes
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+class JsonlTracer:
+    """Append finished spans to a file as JSON lines, written by a background thread."""
+    def __init__(self, path):
+        self._file = open(path, 'a')
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write, name="trace-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def start_span(self, name, parent, attributes):
+        return JsonlSpan(name, parent, attributes)
+
+    def end_span(self, span, error=None):
+        self._queue.put({
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'parentSpanId': span.parent_id,
+            'name': span.name,
+            'startTimeUnixNano': span.start,
+            'endTimeUnixNano': time.time_ns(),
+            'attributes': span.attributes,
+            'status': 'error' if error is not None else 'ok',
+            'error': str(error) if error is not None else None,
+        })
+
+    def _write(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            self._file.write(json.dumps(record, default=str) + '\n')
+            if self._queue.empty():
+                self._file.flush()
+        self._file.close()
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+class OtlpTracer:
+    """Spans exported over OTLP/HTTP by the OpenTelemetry SDK, imported only when enabled."""
+    def __init__(self):
+        from opentelemetry import trace as otel_trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.trace import Status, StatusCode
+        
+        provider = TracerProvider(resource=Resource.create({'service.name': TRACING_SERVICE_NAME}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        atexit.register(provider.shutdown)
+        self._tracer = provider.get_tracer(TRACING_SERVICE_NAME)
+        self._set_span_in_context = otel_trace.set_span_in_context
+        self._error_status = lambda error: Status(StatusCode.ERROR, str(error))
+
+    def start_span(self, name, parent, attributes):
+        context = self._set_span_in_context(parent) if parent is not None else None
+        return self._tracer.start_span(name, context=context, attributes=attributes)
+
+    def end_span(self, span, error=None):
+        if error is not None:
+            span.record_exception(error)
+            span.set_status(self._error_status(error))
+        span.end()
+
+def init_tracing():
+    """Create the tracer selected by TRACING_EXPORTER, if any."""
+    global tracer
+    if not TRACING_EXPORTER:
+        return
+    try:
+        if TRACING_EXPORTER == 'jsonl':
+            tracer = JsonlTracer(TRACING_JSONL_PATH)
+        elif TRACING_EXPORTER == 'otlp':
+            tracer = OtlpTracer()
+        else:
+            logger.error(f"Unknown TRACING_EXPORTER '{TRACING_EXPORTER}', tracing disabled")
+            return
+    except ImportError as e:
+        logger.error(f"TRACING_EXPORTER 'otlp' needs the opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http packages, tracing disabled: {str(e)}")
+        return
+    except OSError as e:
+        logger.error(f"Could not open {TRACING_JSONL_PATH} for traces, tracing disabled: {str(e)}")
+        return
+    logger.info(f"Tracing enabled ({TRACING_EXPORTER} exporter)")
+
+def start_span(name, parent=None, /, **attributes):
+    """Start a span under parent (by default the current span); None while tracing is off.
+
+    The span does not become the current span; see trace_span for that.
+    """
+    if tracer is None:
+        return None
+    if parent is None:
+        parent = current_span.get()
+    return tracer.start_span(name, parent, {key: value for key, value in attributes.items() if value is not None})
+
+def set_span_attributes(span, /, **attributes):
+    if span is not None:
+        for key, value in attributes.items():
+            if value is not None:
+                span.set_attribute(key, value)
+
+def end_span(span, error=None, /, **attributes):
+    if span is not None:
+        set_span_attributes(span, **attributes)
+        tracer.end_span(span, error)
+
+def trace_span(name, parent=None, /, **attributes):
+    """Context manager running its block in a new span, which is the current span meanwhile."""
+    if tracer is None:
+        return NO_SPAN
+    return _span_context(name, parent, attributes)
+
+def trace_child_span(name, /, **attributes):
+    """Like trace_span, but only traces calls made inside another span."""
+    if tracer is None or current_span.get() is None:
+        return NO_SPAN
+    return _span_context(name, None, attributes)
+
+@contextmanager
+def _span_context(name, parent, attributes):
+    span = start_span(name, parent, **attributes)
+    token = current_span.set(span)
+    error = None
+    try:
+        yield span
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        current_span.reset(token)
+        end_span(span, error)
+
+# Prometheus metrics
+# ==================
+# Served on /metrics by the health server. Latencies and API calls are recorded
+# where they happen; gauges that mirror controller state (queue depth, routes per
+# service type, target cache lookups) are read from the live objects at scrape time.
+
+METRICS_PREFIX = 'traefik_external_dns'
+
+HANDLER_LATENCY = Histogram(
+    f'{METRICS_PREFIX}_handler_duration_seconds',
+    'Time spent handling one IngressRoute event',
+)
+PATCH_LATENCY = Histogram(
+    f'{METRICS_PREFIX}_patch_duration_seconds',
+    'Latency of IngressRoute PATCH requests',
+)
+CONVERGENCE_LATENCY = Histogram(
+    f'{METRICS_PREFIX}_lb_convergence_seconds',
+    'Time from a LoadBalancer target change until all of its IngressRoutes are reconciled',
+    ['service_type'],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, float('inf')),
+)
+API_REQUESTS = Counter(
+    f'{METRICS_PREFIX}_api_requests_total',
+    'Kubernetes API requests issued by the controller',
+    ['verb', 'resource', 'result'],
+)
+WATCH_RECONNECTS = Counter(
+    f'{METRICS_PREFIX}_watch_reconnects_total',
+    'Service watch reconnects',
+    ['watch', 'reason'],
+)
+DRIFT_DETECTED = Counter(
+    f'{METRICS_PREFIX}_drift_total',
+    'IngressRoutes the drift reconciler found out of step with the desired state',
+    ['kind'],
+)
+INGRESSROUTE_EVENTS = Counter(
+    f'{METRICS_PREFIX}_ingressroute_events_total',
+    'IngressRoute watch events by outcome (skipped_* were dropped without evaluation)',
+    ['result'],
+)
+LB_TARGET_CHANGES = Counter(
+    f'{METRICS_PREFIX}_lb_target_changes_total',
+    'LoadBalancer target changes by service_type and result (deferred into the settle window, absorbed by flapping back, applied)',
+    ['service_type', 'result'],
+)
+SERVICE_CONFIG_RELOADS = Counter(
+    f'{METRICS_PREFIX}_service_config_reloads_total',
+    'Changes of SERVICES_CONFIG_FILE by result (applied, unchanged, invalid, error)',
+    ['result'],
+)
+STARTUP_PHASE_SECONDS = Gauge(
+    f'{METRICS_PREFIX}_startup_phase_seconds',
+    'Duration of each startup phase; total is the time from process start to the first converged sync',
+    ['phase'],
+)
+DRIFT_PASSES = Counter(
+    f'{METRICS_PREFIX}_drift_passes_total',
+    'Completed drift reconciler passes',
+)
+QUEUE_DEPTH = Gauge(
+    f'{METRICS_PREFIX}_queue_depth',
+    'IngressRoutes waiting on the work queue, including delayed retries',
+)
+QUEUE_DEPTH.set_function(lambda: update_queue.qsize())
+
+def api_result(error):
+    """Label value for a failed API call: the HTTP status, or "error" if there is none."""
+    return str(getattr(error, 'status', None) or 'error')
+
+@contextmanager
+def observed_api_call(verb, resource):
+    """Count one Kubernetes API call by verb, resource and result (and trace it inside a span)."""
+    # A watch stays open for minutes and belongs to no single operation
+    with trace_child_span(f"k8s.{verb}", resource=resource) if verb != 'watch' else NO_SPAN:
+        try:
+            yield
+        except Exception as e:
+            API_REQUESTS.labels(verb, resource, api_result(e)).inc()
+            raise
+        API_REQUESTS.labels(verb, resource, 'success').inc()
+
+class ControllerStateCollector:
+    """Expose cache and queue state that is already counted elsewhere."""
+    def collect(self):
+        routes = GaugeMetricFamily(
+            f'{METRICS_PREFIX}_ingressroutes',
+            'Cached IngressRoutes per resolved service type',
+            labels=['service_type'],
+        )
+        for service_type, count in ingress_route_cache.count_by_service().items():
+            routes.add_metric([service_type or ''], count)
+        yield routes
+        
+        stats = service_targets.stats()
+        lookups = CounterMetricFamily(
+            f'{METRICS_PREFIX}_service_target_lookups',
+            'LoadBalancer target lookups by handlers and workers',
+            labels=['result'],
+        )
+        lookups.add_metric(['hit'], stats['hits'])
+        lookups.add_metric(['miss'], stats['misses'])
+        yield lookups
+        
+        yield CounterMetricFamily(
+            f'{METRICS_PREFIX}_queue_coalesced',
+            'Queue adds merged into an already pending IngressRoute',
+            value=update_queue.coalesced,
+        )
+        
+        yield GaugeMetricFamily(
+            f'{METRICS_PREFIX}_shards_owned',
+            'Shard Leases held by this replica (1 when running as a single replica)',
+            value=len(shard_elector.owned) if shard_elector is not None else 1,
+        )
+        
+        if api_client is not None:
+            yield GaugeMetricFamily(
+                f'{METRICS_PREFIX}_api_pool_size',
+                'Connections the shared API client keeps pooled',
+                value=API_POOL_SIZE,
+            )
+            yield GaugeMetricFamily(
+                f'{METRICS_PREFIX}_api_requests_in_flight',
+                'Requests currently running on the shared API client',
+                value=api_client.in_flight,
+            )
+            yield CounterMetricFamily(
+                f'{METRICS_PREFIX}_api_pool_saturated',
+                'Requests started while every pooled connection was busy (each opens a throwaway connection)',
+                value=api_client.saturated,
+            )
+            yield CounterMetricFamily(
+                f'{METRICS_PREFIX}_api_connections_opened',
+                'Connections opened by the shared API client',
+                value=api_client.connections_opened(),
+            )
+
+# Shared API clients
+# ==================
+# Every synchronous call (IngressRoute LIST/GET/PATCH, group detection, snapshot
+# ConfigMaps) goes through one ApiClient, so urllib3 keeps a single connection pool
+# of API_POOL_SIZE kept-alive connections instead of a fresh client per call with the
+# default pool of 4. Requests beyond the pool size still run, but on connections
+# that are closed afterwards; the client counts those so the pool can be sized from
+# the metrics. The Service watches and the Lease elector share one asyncio client.
+
+def tcp_keepalive_options():
+    """urllib3 socket options: its defaults (no Nagle) plus TCP keepalive probes."""
+    options = list(urllib3.connection.HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    for name, value in (('TCP_KEEPIDLE', 30), ('TCP_KEEPINTVL', 10), ('TCP_KEEPCNT', 3)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+class PooledApiClient(ApiClient):
+    """ApiClient that tracks how many requests share its connection pool."""
+    def __init__(self, configuration):
+        super().__init__(configuration)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.saturated = 0
+
+    def call_api(self, *args, **kwargs):
+        with self._lock:
+            if self.in_flight >= self.configuration.connection_pool_maxsize:
+                self.saturated += 1
+            self.in_flight += 1
+        try:
+            return super().call_api(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def connections_opened(self):
+        pools = self.rest_client.pool_manager.pools
+        return sum(pools[key].num_connections for key in pools.keys() if key in pools)
+
+def init_api_clients():
+    """Create the shared synchronous API client from the loaded kube config."""
+    global api_client, custom_objects_api, core_v1_api
+    configuration = Configuration.get_default_copy()
+    configuration.connection_pool_maxsize = API_POOL_SIZE
+    if API_TCP_KEEPALIVE:
+        configuration.socket_options = tcp_keepalive_options()
+    api_client = PooledApiClient(configuration)
+    custom_objects_api = CustomObjectsApi(api_client)
+    core_v1_api = CoreV1Api(api_client)
+    logger.info(f"API client pool: {API_POOL_SIZE} connections, timeouts {API_REQUEST_TIMEOUT[0]}s connect / {API_REQUEST_TIMEOUT[1]}s read, TCP keepalive {'on' if API_TCP_KEEPALIVE else 'off'}")
+
+async def get_async_api_client():
+    """Return the asyncio ApiClient shared by the Service watches and the Lease elector."""
+    global async_api_client
+    if async_api_client is None:
+        await load_async_kube_config()
+        async_api_client = async_client.ApiClient()
+    return async_api_client
 
 def update_health():
     """Update the last healthy timestamp."""
@@ -132,26 +1040,78 @@ def update_health():
     last_healthy_time = time.time()
     logger.debug("Health timestamp updated")
 
-def detect_traefik_api_groups():
-    """Detect which Traefik API groups are available in the cluster."""
-    global active_api_groups
-    active_api_groups = []
-    
-    api = CustomObjectsApi()
-    for group in TRAEFIK_API_GROUPS:
+def discover_api_groups():
+    """Return {group: [versions]} served by the API server, or None if discovery failed.
+
+    One GET /apis lists every API group; the answer is kept for the rest of the
+    process, since the groups only change when CRDs are installed or removed.
+    """
+    global served_api_groups
+    if served_api_groups is None:
         try:
-            # Try to list IngressRoutes with this API group
-            api.list_cluster_custom_object(
+            with observed_api_call('get', 'apis'):
+                discovery = ApisApi(api_client).get_api_versions(_request_timeout=API_REQUEST_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"API discovery failed, probing the Traefik API groups instead: {str(e)}")
+            return None
+        served_api_groups = {group.name: [version.version for version in group.versions] for group in discovery.groups}
+    return served_api_groups
+
+def probe_ingress_route_uids(group):
+    """Return the UIDs of the first few IngressRoutes in a group, or None if it is not served."""
+    try:
+        with observed_api_call('list', 'ingressroutes'):
+            page = custom_objects_api.list_cluster_custom_object(
                 group=group,
                 version=TRAEFIK_VERSION,
                 plural="ingressroutes",
-                limit=1
+                limit=TRAEFIK_ALIAS_PROBE_SIZE,
+                _request_timeout=API_REQUEST_TIMEOUT
             )
+    except Exception as e:
+        logger.debug(f"API group {group}/{TRAEFIK_VERSION} not available: {str(e)}")
+        return None
+    return {item['metadata'].get('uid') for item in page.get('items', [])} - {None}
+
+def detect_traefik_api_groups():
+    """Detect which Traefik API groups are available in the cluster.
+
+    The served groups come from one discovery call. When several Traefik groups are
+    served, a page of routes is read from each (in parallel) to find groups serving
+    the same IngressRoute objects (their routes share UIDs); only the preferred one
+    of those is kept, so every route is watched, listed and patched exactly once.
+    Groups backed by separate CRDs are all kept. Without discovery every group is
+    probed that way.
+    """
+    global active_api_groups
+    active_api_groups = []
+    
+    served = discover_api_groups()
+    if served is None:
+        candidates = list(TRAEFIK_API_GROUPS)
+    else:
+        candidates = [group for group in TRAEFIK_API_GROUPS if TRAEFIK_VERSION in served.get(group, ())]
+    
+    if served is not None and len(candidates) < 2:
+        # Nothing to tell apart, no IngressRoute needs to be read
+        active_api_groups = candidates
+    else:
+        with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+            probes = dict(zip(candidates, pool.map(probe_ingress_route_uids, candidates)))
+        uids = {}
+        for group in candidates:
+            group_uids = probes[group]
+            if group_uids is None:
+                continue
+            canonical = next((other for other in active_api_groups if uids[other] & group_uids), None)
+            if canonical:
+                logger.info(f"API group {group} serves the same IngressRoutes as {canonical}, using {canonical} only")
+                continue
+            uids[group] = group_uids
             active_api_groups.append(group)
-            logger.info(f"Detected Traefik API group: {group}/{TRAEFIK_VERSION}")
-        except Exception as e:
-            logger.debug(f"API group {group}/{TRAEFIK_VERSION} not available: {str(e)}")
     
+    for group in active_api_groups:
+        logger.info(f"Detected Traefik API group: {group}/{TRAEFIK_VERSION}")
     if not active_api_groups:
         logger.error(f"No Traefik API groups detected! Make sure Traefik CRDs are installed.")
     else:
@@ -159,12 +1119,33 @@ def detect_traefik_api_groups():
     
     return active_api_groups
 
-def parse_service_config():
-    """Parse service configuration from environment variables."""
+def record_startup_phase(phase, started):
+    """Record how long a startup phase took since started (a monotonic time); only its first run counts."""
+    if phase in startup_phases:
+        return
+    elapsed = time.monotonic() - started
+    startup_phases[phase] = elapsed
+    STARTUP_PHASE_SECONDS.labels(phase).set(elapsed)
+    logger.info(f"Startup phase {phase} took {elapsed:.2f}s")
+
+def read_services_config():
+    """Return the service configuration JSON, from SERVICES_CONFIG_FILE if set."""
+    if not SERVICES_CONFIG_FILE:
+        return os.getenv('SERVICES_CONFIG', '')
+    try:
+        with open(SERVICES_CONFIG_FILE) as f:
+            return f.read()
+    except OSError as e:
+        logger.error(f"Could not read SERVICES_CONFIG_FILE: {e}")
+        return ''
+
+def parse_service_config(services_config=None):
+    """Parse the service configuration JSON (by default as read by read_services_config)."""
     configs = {}
     
     # Parse dynamic service configuration from JSON
-    services_config = os.getenv('SERVICES_CONFIG', '')
+    if services_config is None:
+        services_config = read_services_config()
     if services_config:
         try:
             services_data = json.loads(services_config)
@@ -174,9 +1155,10 @@ def parse_service_config():
                         'namespace': service_config['namespace'],
                         'name': service_config['name'],
                         'priority': service_config.get('priority', 100),
+                        'default': service_config.get('default', False),
                         'annotations': service_config.get('annotations', {})
                     }
-                    logger.info(f"Service '{service_id}' configured: {service_config['namespace']}/{service_config['name']} (priority: {configs[service_id]['priority']})")
+                    logger.info(f"Service '{service_id}' configured: {service_config['namespace']}/{service_config['name']} (priority: {configs[service_id]['priority']}, default: {configs[service_id]['default']})")
                 else:
                     logger.error(f"Invalid service configuration for '{service_id}': missing namespace or name")
         except json.JSONDecodeError as e:
@@ -188,35 +1170,39 @@ def parse_service_config():
 
 @kopf.on.startup()
 def configure(settings: kopf.OperatorSettings, **_):
-    global service_configs
+    global service_configs, service_matcher, services_config_text, ingressroute_label_requirements
     
     logger.info("Controller startup initiated")
     
     settings.persistence.finalizer = None
-    settings.watching.clusterwide = True
     settings.posting.enabled = False
     settings.watching.server_timeout = 60
     settings.watching.reconnect_backoff = 1.0
     
     try:
-        kubernetes.config.load_incluster_config()
-        logger.info("In-cluster configuration loaded")
-    except kubernetes.config.ConfigException:
-        kubernetes.config.load_kube_config()
-        logger.info("Local configuration (kubeconfig) loaded")
-    
-    # Detect available Traefik API groups
-    detect_traefik_api_groups()
+        ingressroute_label_requirements = parse_label_selector(INGRESSROUTE_LABEL_SELECTOR)
+    except ValueError as e:
+        raise kopf.PermanentError(f"INGRESSROUTE_LABEL_SELECTOR: {str(e)}")
+    if INGRESSROUTE_LABEL_SELECTOR:
+        if hasattr(settings.watching, 'label_selectors'):
+            for group in TRAEFIK_API_GROUPS:
+                settings.watching.label_selectors[group, 'ingressroutes'] = INGRESSROUTE_LABEL_SELECTOR
+        else:
+            logger.warning("This kopf version cannot filter watches by label, IngressRoutes are filtered client-side")
+    logger.info(f"IngressRoute scope: namespaces {WATCH_NAMESPACES or ['*']}, excluding {EXCLUDE_NAMESPACES or 'none'}, label selector '{INGRESSROUTE_LABEL_SELECTOR}'")
     
+    # API groups were detected by main() before the IngressRoute handlers were registered
     if not active_api_groups:
         logger.error("No Traefik API groups available! Cannot proceed.")
         return
     
-    # Parse service configurations
-    service_configs = parse_service_config()
+    # Parse service configurations and precompile them for route matching
+    services_config_text = read_services_config()
+    service_configs = parse_service_config(services_config_text)
+    service_matcher = ServiceMatcher(service_configs)
     
     if not service_configs:
-        logger.error("No service configurations found! Set SERVICES_CONFIG environment variable")
+        logger.error("No service configurations found! Set the SERVICES_CONFIG environment variable or SERVICES_CONFIG_FILE")
         return
     
     logger.info("Controller started successfully | Monitoring services: %s", 
@@ -228,378 +1214,1446 @@ def format_lb_targets(ingress_list):
     """Join every hostname/IP in a LoadBalancer ingress list into a comma-separated
     target string. external-dns natively supports comma-separated targets to create
     multiple A/CNAME records, which is what we need once a Service has more than one
-    LoadBalancer entry (e.g. one per node in a multi-node cluster)."""
+    LoadBalancer entry (e.g. one per node in a multi-node cluster).
+
+    The targets are sorted and deduplicated, so the same set of LoadBalancer entries
+    always gives the same string whatever order the API reports them in."""
     if not ingress_list:
         return None
-    targets = [ing.hostname or ing.ip for ing in ingress_list if (ing.hostname or ing.ip)]
-    return ','.join(targets) if targets else None
+    targets = {ing.hostname or ing.ip for ing in ingress_list if (ing.hostname or ing.ip)}
+    return ','.join(sorted(targets)) if targets else None
+
+def normalize_targets(targets):
+    """Sorted, deduplicated form of a comma-separated target string (None stays None)."""
+    if targets is None:
+        return None
+    return ','.join(sorted({target.strip() for target in targets.split(',') if target.strip()}))
 
 def get_lb_hostname(service_type):
-    """Get hostname(s) for a specific service type."""
+    """Get hostname(s) for a specific service type from the watch-maintained target map."""
     if service_type not in service_configs:
         logger.error(f"Service type '{service_type}' not configured")
         return None
 
-    try:
-        config = service_configs[service_type]
-        svc = CoreV1Api().read_namespaced_service(
-            name=config['name'],
-            namespace=config['namespace']
-        )
-        if svc.status.load_balancer.ingress:
-            hostname = format_lb_targets(svc.status.load_balancer.ingress)
-            logger.debug(f"Load balancer hostname obtained for {service_type}: {hostname}")
-            return hostname
-    except Exception as e:
-        logger.error(f"Error obtaining load balancer hostname for {service_type}: {str(e)}")
-    return None
+    with trace_child_span('service.target_lookup', service_type=service_type):
+        hostname = service_targets.get(service_type, timeout=SERVICE_TARGET_WAIT_SECONDS)
+    logger.debug("Load balancer hostname for %s: %s", service_type, hostname)
+    return hostname
 
-def determine_service_type(ingress_route):
-    """Determine which service type to use for an IngressRoute."""
-    annotations = ingress_route.get('metadata', {}).get('annotations', {})
-    
-    # Check for explicit load-balancer-type annotation
-    lb_type = annotations.get('traefik.io/load-balancer-type', '').lower()
-    if lb_type and lb_type in service_configs:
-        return lb_type
-    
-    # Check for service-specific annotations
-    matching_services = []
-    for service_id, service_config in service_configs.items():
-        service_annotations = service_config.get('annotations', {})
-        matches = True
+LOAD_BALANCER_TYPE_ANNOTATION = 'traefik.io/load-balancer-type'
+MANAGED_ANNOTATIONS = (
+    'external-dns.alpha.kubernetes.io/target',
+    'external-dns.alpha.kubernetes.io/cloudflare-proxied',
+    LOAD_BALANCER_TYPE_ANNOTATION,
+)
+
+class ServiceMatcher:
+    """Immutable, precompiled form of the service configuration used to pick a service per route.
+
+    Built once per configuration: an inverted index from (annotation key, lowercased
+    value) to the services requiring that pair, the number of pairs each service
+    requires, a rank per service (lowest priority number first, configuration order
+    breaking ties) and the default service. Resolving a route then costs
+    O(route annotations) instead of O(services x service annotations).
+    """
+    __slots__ = ('service_ids', 'keys', 'fingerprint_keys', 'default', '_index', '_required', '_empty_keys', '_empty_only', '_rank')
+
+    def __init__(self, configs):
+        order = sorted(configs, key=lambda service_id: configs[service_id].get('priority', 100))
+        index = {}
+        required = {}
+        empty_keys = {}
+        for service_id, config in configs.items():
+            service_annotations = config.get('annotations') or {}
+            pairs = [(key, value.lower()) for key, value in service_annotations.items() if value]
+            for key, value in pairs:
+                index.setdefault(key, {}).setdefault(value, []).append(service_id)
+            if service_annotations:
+                required[service_id] = len(pairs)
+                # An empty required value matches a missing annotation, as before
+                empty_keys[service_id] = tuple(key for key, value in service_annotations.items() if not value)
         
-        # Check if all required annotations match
-        for key, value in service_annotations.items():
-            if annotations.get(key, '').lower() != value.lower():
-                matches = False
-                break
+        self.service_ids = frozenset(configs)
+        self.keys = frozenset(key for config in configs.values() for key in (config.get('annotations') or {}))
+        self.fingerprint_keys = tuple(sorted(self.keys.union(MANAGED_ANNOTATIONS)))
+        self.default = next((service_id for service_id, config in configs.items() if config.get('default', False)),
+                            next(iter(configs), None))
+        self._index = {key: {value: tuple(ids) for value, ids in values.items()} for key, values in index.items()}
+        self._required = required
+        self._empty_keys = {service_id: keys for service_id, keys in empty_keys.items() if keys}
+        self._empty_only = tuple(service_id for service_id, count in required.items() if count == 0)
+        self._rank = {service_id: rank for rank, service_id in enumerate(order)}
+
+    def resolve(self, annotations):
+        """Return the service type for a set of IngressRoute annotations, or None."""
+        # Check for explicit load-balancer-type annotation
+        lb_type = annotations.get(LOAD_BALANCER_TYPE_ANNOTATION, '').lower()
+        if lb_type and lb_type in self.service_ids:
+            return lb_type
         
-        if matches and service_annotations:  # Only consider if there are annotations to match
-            matching_services.append(service_id)
-    
-    # If we found matching services, return the first one
-    if matching_services:
-        return matching_services[0]
-    
-    # Use default service if no specific annotations match
-    if service_configs:
-        for service_id, config in service_configs.items():
-            if config.get('default', False):
-                return service_id
+        # Count how many required annotation pairs each service has on this route
+        hits = dict.fromkeys(self._empty_only, 0)
+        index = self._index
+        for key, value in annotations.items():
+            values = index.get(key)
+            if values is not None:
+                for service_id in values.get(value.lower(), ()):
+                    hits[service_id] = hits.get(service_id, 0) + 1
         
-        # Fallback: if no default is explicitly set, use the first service
-        return list(service_configs.keys())[0]
+        # Among fully matching services the best ranked one wins
+        best = None
+        for service_id, count in hits.items():
+            if count != self._required[service_id]:
+                continue
+            if any(annotations.get(key, '') for key in self._empty_keys.get(service_id, ())):
+                continue
+            if best is None or self._rank[service_id] < self._rank[best]:
+                best = service_id
+        
+        # Use default service if no specific annotations match
+        return best if best is not None else self.default
+
+    def fingerprint(self, annotations):
+        """Hash of the only annotations that decide a route's service type and patch.
+
+        Two sets of annotations with the same fingerprint resolve to the same service
+        and need the same patch, so anything else on the route can change freely.
+        """
+        return hash(tuple(annotations.get(key) for key in self.fingerprint_keys))
+
+    def relevant(self, annotations):
+        """The annotations fingerprint() looks at; the rest never needs to be cached."""
+        return {key: annotations[key] for key in self.fingerprint_keys if key in annotations}
+
+service_matcher = ServiceMatcher({})
+
+def determine_service_type(ingress_route):
+    """Determine which service type to use for an IngressRoute."""
+    return determine_service_type_for_annotations(ingress_route.get('metadata', {}).get('annotations', {}))
+
+def determine_service_type_for_annotations(annotations):
+    """Determine which service type to use for a set of IngressRoute annotations."""
+    return service_matcher.resolve(annotations)
+
+def build_ingress_route_patch(group, namespace, name, hostname, annotations):
+    """Return (body, extra patch kwargs) setting only the annotations this controller manages.
+
+    - merge: a JSON merge patch with the target, plus cloudflare-proxied when it
+      is missing. Other annotations are left alone on the server.
+    - apply: server-side apply under PATCH_FIELD_MANAGER. Fields we own but leave
+      out of an apply are removed, so cloudflare-proxied is always sent, keeping
+      its current value if there is one.
+    Note: traefik.io/load-balancer-type is never written to avoid overriding explicit configurations.
+    """
+    managed = {'external-dns.alpha.kubernetes.io/target': hostname}
+    proxied = annotations.get('external-dns.alpha.kubernetes.io/cloudflare-proxied')
     
-    return None
+    if PATCH_MODE == 'apply':
+        managed['external-dns.alpha.kubernetes.io/cloudflare-proxied'] = proxied if proxied is not None else 'true'
+        body = {
+            'apiVersion': f"{group}/{TRAEFIK_VERSION}",
+            'kind': 'IngressRoute',
+            'metadata': {'name': name, 'namespace': namespace, 'annotations': managed}
+        }
+        # The client sends structured bodies as JSON, which is valid YAML
+        return body, {
+            'field_manager': PATCH_FIELD_MANAGER,
+            'force': True,
+            '_content_type': 'application/apply-patch+yaml'
+        }
+    
+    # Add cloudflare-proxied annotation if it doesn't exist
+    if proxied is None:
+        managed['external-dns.alpha.kubernetes.io/cloudflare-proxied'] = 'true'
+    return {'metadata': {'annotations': managed}}, {'_content_type': 'application/merge-patch+json'}
+
+def update_ingress_route(group, namespace, name, hostname, service_type, log_level=logging.INFO):
+    """Update IngressRoute with hostname and service type information.
 
-def update_ingress_route(name, namespace, hostname, service_type):
-    """Update IngressRoute with hostname and service type information."""
-    api = CustomObjectsApi()
+    The patch goes straight to the API group the route was cached under. Only the
+    managed annotations are sent (see build_ingress_route_patch), so no GET is
+    needed and annotations written by anyone else are never touched. Returns False
+    if the route no longer exists; any other API failure is raised so the work
+    queue can retry the key with backoff.
+    """
+    cached = ingress_route_cache.get(group, namespace, name)
+    if cached is None:
+        return False
     
-    # Try each active API group until one succeeds
-    for group in active_api_groups:
-        try:
-            current = api.get_namespaced_custom_object(
-                group=group,
-                version=TRAEFIK_VERSION,
-                namespace=namespace,
-                plural="ingressroutes",
-                name=name
-            )
-            
-            resource_key = f"{namespace}/{name}"
-            current_time = time.time()
-            if resource_key in last_updated and (current_time - last_updated[resource_key]) < 5:
-                logger.debug(f"Ignoring redundant update for {resource_key}")
-                return False
-            
-            # Build annotations
-            annotations = current.get('metadata', {}).get('annotations', {})
-            annotations['external-dns.alpha.kubernetes.io/target'] = hostname
-            # Add cloudflare-proxied annotation if it doesn't exist
-            if 'external-dns.alpha.kubernetes.io/cloudflare-proxied' not in annotations:
-                annotations['external-dns.alpha.kubernetes.io/cloudflare-proxied'] = 'true'
-            # Note: Do not add traefik.io/load-balancer-type to avoid overriding explicit configurations
-            
-            patch = {
-                'metadata': {
-                    'annotations': annotations
-                }
-            }
-            
-            response = api.patch_namespaced_custom_object(
+    body, patch_options = build_ingress_route_patch(group, namespace, name, hostname, cached['annotations'])
+    
+    with trace_child_span('ratelimit.wait'):
+        api_write_limiter.acquire()
+    try:
+        with PATCH_LATENCY.time(), observed_api_call('patch', 'ingressroutes'):
+            response = custom_objects_api.patch_namespaced_custom_object(
                 group=group,
                 version=TRAEFIK_VERSION,
                 namespace=namespace,
                 plural="ingressroutes",
                 name=name,
-                body=patch
-            )
-            
-            last_updated[resource_key] = current_time
-            logger.info(f"IngressRoute {namespace}/{name} updated with {service_type} hostname: {hostname} (API group: {group})")
-            update_health()
-            return True
-        except Exception as e:
-            error_str = str(e)
-            # Check if it's a 404 error (resource not found) - try next API group or silently ignore
-            if "Not Found" in error_str or "not found" in error_str or "404" in error_str or "(404)" in error_str:
-                continue  # Try next API group
-            else:
-                logger.error(f"Failed to update IngressRoute {namespace}/{name} with API group {group}: {error_str}")
-                continue  # Try next API group
-    
-    # If we get here, all API groups failed
-    return False
-
-def sync_all_ingress_routes(service_type, new_hostname):
-    """Sync all IngressRoutes of a specific service type with the new hostname."""
-    api = CustomObjectsApi()
-    updated_count = 0
-    
-    # Try each active API group
-    for group in active_api_groups:
-        try:
-            ingress_routes = api.list_cluster_custom_object(
-                group=group,
-                version=TRAEFIK_VERSION,
-                plural="ingressroutes"
+                body=body,
+                _request_timeout=API_REQUEST_TIMEOUT,
+                **patch_options
             )
-            
-            for item in ingress_routes.get('items', []):
-                name = item['metadata']['name']
-                namespace = item['metadata']['namespace']
-                
-                # Determine if this IngressRoute should use this service type
-                determined_type = determine_service_type(item)
-                if determined_type != service_type:
-                    continue
-                    
-                current_target = item['metadata'].get('annotations', {}).get('external-dns.alpha.kubernetes.io/target')
-                if current_target != new_hostname:
-                    logger.info(f"Updating via sync IngressRoute {namespace}/{name} ({service_type}) from {current_target} to {new_hostname}")
-                    if update_ingress_route(name, namespace, new_hostname, service_type):
-                        updated_count += 1
-        except Exception as e:
-            logger.error(f"Failed to sync IngressRoutes for {service_type} with API group {group}: {str(e)}")
-            continue
+    except ApiException as e:
+        if e.status == 404:
+            # Deleted since we cached it - the DELETED event may still be in flight
+            ingress_route_cache.delete(group, namespace, name)
+            return False
+        raise
     
-    logger.info(f"Synchronized {updated_count} IngressRoutes for {service_type} LoadBalancer")
+    entry = ingress_route_cache.refresh(group, response['metadata'])
+    if entry is not None and not get_drift(entry['annotations'], hostname, service_type):
+        # The echo of this patch on the watch can then be dropped unevaluated
+        ingress_route_cache.mark_synced(group, namespace, name, entry['fingerprint'], hostname)
+    logger.log(log_level, "IngressRoute %s/%s updated with %s hostname: %s (API group: %s)", namespace, name, service_type, hostname, group,
+               extra={'namespace': namespace, 'ingressroute': name, 'service_type': service_type})
     update_health()
+    return True
 
-def handle_ingressroute_event(name, namespace, body, api_group):
-    """Handle IngressRoute events (common logic for all API groups)."""
-    # Skip if this API group is not active
-    if api_group not in active_api_groups:
-        return
+def get_drift(annotations, hostname, service_type):
+    """Return (kind, reason) if an IngressRoute with these annotations needs patching, else None."""
+    current_target = annotations.get('external-dns.alpha.kubernetes.io/target')
+    current_type = annotations.get('traefik.io/load-balancer-type')
     
-    logger.debug(f"Event received for IngressRoute: {namespace}/{name} (API group: {api_group})")
+    # Check if hostname needs to be updated; the same targets in another order (as
+    # written before targets were normalized) are not a mismatch
+    if current_target != hostname and normalize_targets(current_target) != hostname:
+        return 'target', f"hostname mismatch (current: {current_target}, expected: {hostname})"
     
-    # Determine which service type this IngressRoute should use
-    service_type = determine_service_type(body)
-    if not service_type:
-        logger.warning(f"Could not determine service type for IngressRoute {namespace}/{name}")
-        return
+    # Check if cloudflare-proxied annotation is missing
+    if annotations.get('external-dns.alpha.kubernetes.io/cloudflare-proxied') is None:
+        return 'proxied', "cloudflare-proxied annotation missing"
+    
+    # Only check load-balancer-type if it's explicitly set and different
+    if current_type is not None and current_type != service_type:
+        return 'load_balancer_type', f"explicit load-balancer-type mismatch (current: {current_type}, expected: {service_type})"
+    
+    return None
+
+def get_update_reason(annotations, hostname, service_type):
+    """Return why an IngressRoute with these annotations needs patching, or None."""
+    drift = get_drift(annotations, hostname, service_type)
+    return drift[1] if drift else None
+
+def reconcile_ingress_route(group, namespace, name, bulk=False):
+    """Bring one cached IngressRoute in line with its service's current targets.
+
+    Work is level-triggered: the route and target are read when the item is
+    processed, so a route queued twice or behind a second LB flip converges to the
+    latest state. Returns True if the route was patched. Routes patched as part of
+    a bulk resync (bulk=True) are logged at info level only when sampled.
+    """
+    cached = ingress_route_cache.get(group, namespace, name)
+    if cached is None or not owns_namespace(namespace):
+        return False
+    
+    service_type = cached['service_type']
+    if not service_type:
+        return False
     
-    # Get hostname for the determined service type
     hostname = get_lb_hostname(service_type)
     if not hostname:
-        logger.warning(f"No hostname available for {service_type} LoadBalancer for IngressRoute {namespace}/{name}")
+        return False
+    
+    update_reason = get_update_reason(cached['annotations'], hostname, service_type)
+    if not update_reason:
+        return False
+    
+    log_level = logging.DEBUG if bulk and not route_log_sampler.sample() else logging.INFO
+    logger.log(log_level, "Updating IngressRoute %s/%s (%s): %s", namespace, name, service_type, update_reason,
+               extra={'namespace': namespace, 'ingressroute': name, 'service_type': service_type})
+    return update_ingress_route(group, namespace, name, hostname, service_type, log_level)
+
+# Work queue and patch executor
+# =============================
+# Every path that wants a route reconciled (kopf events, the initial sync and
+# per-service resyncs) puts its key on update_queue and returns. The queue follows
+# controller-runtime's workqueue semantics: a key is pending at most once, a key
+# re-added while a worker holds it is queued again only when that worker is done,
+# and failed keys come back after an exponential per-key delay. A fixed pool of
+# PATCH_CONCURRENCY workers drains it, taking namespaces in turn so one busy
+# namespace cannot starve the rest, and all IngressRoute writes share one
+# token bucket so a mass resync cannot flood the API server.
+
+class TokenBucket:
+    """Blocking token bucket rate limiter; a rate of 0 disables limiting."""
+    def __init__(self, rate, burst):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def acquire(self):
+        """Take one token, sleeping until it is available."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the token even if it is not there yet; callers queue up behind each other
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+class RateLimitedWorkQueue:
+    """Deduplicating, namespace-fair work queue of IngressRoute keys with retry backoff."""
+    def __init__(self, base_delay, max_delay):
+        lock = threading.Lock()
+        self._cond = threading.Condition(lock)      # a key became ready
+        self._finished = threading.Condition(lock)  # a worker released a key
+        self._queues = {}       # {namespace: deque of keys}
+        self._order = deque()   # namespaces with queued keys, in turn order
+        self._size = 0
+        self._dirty = set()     # keys waiting to be processed
+        self._processing = set()
+        self._progress = {}     # {key: [ResyncProgress]} batches waiting on a key
+        self._failures = {}     # {key: consecutive failures}
+        self._delayed = []      # heap of (ready_at, seq, key)
+        self._seq = itertools.count()
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.coalesced = 0
+
+    def _push(self, key):
+        namespace = key[1]
+        queue = self._queues.get(namespace)
+        if queue is None:
+            queue = self._queues[namespace] = deque()
+            self._order.append(namespace)
+        queue.append(key)
+        self._size += 1
+        self._cond.notify()
+
+    def _add(self, key):
+        if key in self._dirty:
+            self.coalesced += 1
+            return
+        self._dirty.add(key)
+        if key not in self._processing:
+            self._push(key)
+
+    def _attach(self, key, progress):
+        if progress:
+            waiting = self._progress.setdefault(key, [])
+            waiting.extend(batch for batch in progress if batch not in waiting)
+
+    def add(self, key, progress=()):
+        """Queue a key unless it is already pending; progress batches are carried along."""
+        with self._cond:
+            self._attach(key, progress)
+            self._add(key)
+
+    def add_rate_limited(self, key, progress=()):
+        """Queue a failed key again after its exponential backoff delay."""
+        with self._cond:
+            failures = self._failures.get(key, 0)
+            self._failures[key] = failures + 1
+            delay = min(self.base_delay * 2 ** failures, self.max_delay)
+            self._attach(key, progress)
+            heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), key))
+            # Wake idle workers so they recompute how long to sleep
+            self._cond.notify_all()
+        return delay
+
+    def forget(self, key):
+        """Reset the backoff of a key after it was processed successfully."""
+        with self._cond:
+            self._failures.pop(key, None)
+
+    def num_requeues(self, key):
+        with self._cond:
+            return self._failures.get(key, 0)
+
+    def get(self):
+        """Block until a key is ready and return (key, progress batches waiting on it)."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    self._add(heapq.heappop(self._delayed)[2])
+                if self._size:
+                    break
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._cond.wait(timeout)
+            namespace = self._order.popleft()
+            queue = self._queues[namespace]
+            key = queue.popleft()
+            self._size -= 1
+            if queue:
+                self._order.append(namespace)
+            else:
+                del self._queues[namespace]
+            self._dirty.discard(key)
+            self._processing.add(key)
+            return key, self._progress.pop(key, [])
+
+    def done(self, key):
+        """Release a key; if it was re-added while being processed it is queued again."""
+        with self._cond:
+            self._processing.discard(key)
+            if key in self._dirty:
+                self._push(key)
+            self._finished.notify_all()
+
+    def discard(self, predicate):
+        """Drop every queued or delayed key matching predicate.
+
+        Returns {key: progress batches that were waiting on it} for the dropped
+        keys, so the caller can count them as done.
+        """
+        with self._cond:
+            dropped = {key for key in self._dirty if predicate(key)}
+            dropped.update(key for _, _, key in self._delayed if predicate(key))
+            for namespace in list(self._queues):
+                queue = self._queues[namespace]
+                kept = deque(key for key in queue if key not in dropped)
+                self._size -= len(queue) - len(kept)
+                if kept:
+                    self._queues[namespace] = kept
+                else:
+                    del self._queues[namespace]
+                    self._order.remove(namespace)
+            self._delayed = [entry for entry in self._delayed if entry[2] not in dropped]
+            heapq.heapify(self._delayed)
+            self._dirty -= dropped
+            for key in dropped:
+                self._failures.pop(key, None)
+            return {key: self._progress.pop(key, []) for key in dropped}
+
+    def wait_processing(self, predicate, timeout=None):
+        """Block until no key matching predicate is being processed; False on timeout."""
+        with self._finished:
+            return self._finished.wait_for(lambda: not any(predicate(key) for key in self._processing), timeout)
+
+    def qsize(self):
+        with self._cond:
+            return self._size + len(self._delayed)
+
+class ResyncProgress:
+    """Progress of one batch of queued IngressRoute reconciles.
+
+    Batches started by a LoadBalancer change pass their service_type so the time
+    to converge is recorded in the convergence histogram, from started (the
+    monotonic time the change was first seen) if given; on_complete, if given, is
+    called once the last route is done.
+    """
+    def __init__(self, label, total, service_type=None, on_complete=None, started=None):
+        self._lock = threading.Lock()
+        self.label = label
+        self.total = total
+        self.service_type = service_type
+        self.on_complete = on_complete
+        self.done = 0
+        self.updated = 0
+        self.started = time.monotonic() if started is None else started
+        self._next_report = 0.1
+        self.span = start_span('resync', label=label, routes=total, service_type=service_type)
+        if total == 0:
+            self._complete()
+
+    def item_done(self, updated):
+        with self._lock:
+            self.done += 1
+            if updated:
+                self.updated += 1
+            done = self.done
+            report = self.total and done / self.total >= self._next_report and done < self.total
+            if report:
+                self._next_report = (done * 10 // self.total + 1) / 10
+        if report:
+            logger.info(f"{self.label}: {done}/{self.total} IngressRoutes processed")
+        if done == self.total:
+            self._complete()
+
+    def _complete(self):
+        elapsed = time.monotonic() - self.started
+        end_span(self.span, updated=self.updated)
+        logger.info(f"{self.label} completed in {elapsed:.2f}s: {self.updated} of {self.total} IngressRoutes updated")
+        if self.service_type:
+            CONVERGENCE_LATENCY.labels(self.service_type).observe(elapsed)
+        if self.on_complete:
+            self.on_complete()
+        update_health()
+
+update_queue = RateLimitedWorkQueue(WORKQUEUE_BASE_DELAY, WORKQUEUE_MAX_DELAY)
+api_write_limiter = TokenBucket(API_WRITE_QPS, API_WRITE_BURST)
+REGISTRY.register(ControllerStateCollector())
+
+def enqueue_ingress_route(group, namespace, name, progress=None):
+    """Queue an IngressRoute for reconciliation by the patch workers."""
+    update_queue.add((group, namespace, name), [progress] if progress else ())
+
+def patch_worker():
+    """Drain update_queue forever, reconciling one IngressRoute at a time."""
+    while True:
+        key, progress = update_queue.get()
+        group, namespace, name = key
+        updated = False
+        finished = True
+        try:
+            # Routes queued by a resync are traced under it, so its span covers them all
+            with trace_span('ingressroute.reconcile', progress[0].span if progress else None,
+                            group=group, namespace=namespace, name=name, retries=update_queue.num_requeues(key)) as span:
+                updated = reconcile_ingress_route(group, namespace, name, bulk=bool(progress))
+                set_span_attributes(span, updated=updated)
+            update_queue.forget(key)
+        except Exception as e:
+            if update_queue.num_requeues(key) < WORKQUEUE_MAX_RETRIES:
+                delay = update_queue.add_rate_limited(key, progress)
+                finished = False
+                logger.warning(f"Error reconciling IngressRoute {namespace}/{name} ({group}), retrying in {delay:.1f}s: {str(e)}")
+            else:
+                update_queue.forget(key)
+                logger.error(f"Giving up on IngressRoute {namespace}/{name} ({group}) after {WORKQUEUE_MAX_RETRIES} retries: {str(e)}")
+        finally:
+            update_queue.done(key)
+            if finished:
+                for batch in progress:
+                    batch.item_done(updated)
+
+patch_workers = []
+
+def start_patch_workers():
+    """Start the pool of patch worker threads."""
+    for i in range(PATCH_CONCURRENCY):
+        worker = threading.Thread(target=patch_worker, name=f"patch-worker-{i}", daemon=True)
+        worker.start()
+        patch_workers.append(worker)
+    logger.info(f"Started {PATCH_CONCURRENCY} IngressRoute patch workers")
+
+def sync_all_ingress_routes(service_type, new_hostname, changed_at=None):
+    """Queue every IngressRoute of a specific service type that is not on the new hostname.
+
+    changed_at is the monotonic time the change was first observed; convergence
+    is measured from it (defaults to now).
+    """
+    keys = []
+    
+    # Only the routes bound to this service type, via the cache's reverse index
+    for (group, namespace, name), cached in ingress_route_cache.items_for_service(service_type):
+        if group not in active_api_groups:
+            continue
+            
+        current_target = cached['annotations'].get('external-dns.alpha.kubernetes.io/target')
+        if current_target != new_hostname:
+            keys.append((group, namespace, name))
+    
+    progress = ResyncProgress(f"Resync of {service_type} LoadBalancer to {new_hostname}", len(keys), service_type,
+                              started=changed_at)
+    for key in keys:
+        enqueue_ingress_route(*key, progress=progress)
+    
+    logger.info(f"Queued {len(keys)} IngressRoutes for {service_type} LoadBalancer (queue depth: {update_queue.qsize()})")
+
+def unchanged_event_reason(entry, metadata):
+    """Return why an event for a cached route cannot change anything, or None.
+
+    - fingerprint: the decision-relevant annotations are those the route was last
+      found in step with, for the service's current target. This drops our own
+      patches echoing back, status-only updates, edits of unrelated annotations
+      and relists without evaluating the route.
+    - resource_version: the route was not modified since it was cached (e.g.
+      restored from the snapshot) and is on the current target.
+    """
+    target = service_targets.peek(entry['service_type'])
+    if target is None:
+        return None
+    if (entry['synced_target'] == target
+            and entry['fingerprint'] == service_matcher.fingerprint(metadata.get('annotations') or {})):
+        return 'fingerprint'
+    if (entry['resourceVersion'] == metadata.get('resourceVersion')
+            and not get_drift(entry['annotations'], target, entry['service_type'])):
+        return 'resource_version'
+    return None
+
+@HANDLER_LATENCY.time()
+def handle_ingressroute_event(name, namespace, body, api_group, event_type=None):
+    """Handle IngressRoute events (common logic for all API groups)."""
+    # Skip if this API group is not active
+    if api_group not in active_api_groups:
+        INGRESSROUTE_EVENTS.labels('ignored').inc()
         return
     
-    # Check current state
-    annotations = body['metadata'].get('annotations', {})
-    current_target = annotations.get('external-dns.alpha.kubernetes.io/target')
-    current_type = annotations.get('traefik.io/load-balancer-type')
-    current_cloudflare_proxied = annotations.get('external-dns.alpha.kubernetes.io/cloudflare-proxied')
+    # Routes out of scope or owned by another replica are neither cached nor patched;
+    # a route that just left the scope (e.g. lost its label) is forgotten
+    metadata = body['metadata']
+    if not owns_namespace(namespace) or not route_in_scope(metadata):
+        ingress_route_cache.delete(api_group, namespace, name)
+        INGRESSROUTE_EVENTS.labels('ignored').inc()
+        return
+    
+    logger.debug("Event received for IngressRoute: %s/%s (API group: %s, type: %s)", namespace, name, api_group, event_type)
     
-    # Determine if update is actually needed
-    needs_update = False
-    update_reason = ""
+    # Keep the shared cache in step with the watch before anything reads from it
+    if event_type == 'DELETED':
+        ingress_route_cache.delete(api_group, namespace, name)
+        INGRESSROUTE_EVENTS.labels('deleted').inc()
+        return
     
-    # Check if hostname needs to be updated
-    if current_target != hostname:
-        needs_update = True
-        update_reason = f"hostname mismatch (current: {current_target}, expected: {hostname})"
+    # Drop events that cannot change the outcome before resolving anything
+    previous = ingress_route_cache.get(api_group, namespace, name)
+    skipped = unchanged_event_reason(previous, metadata) if previous is not None else None
+    if skipped == 'fingerprint':
+        ingress_route_cache.touch(api_group, namespace, name, metadata.get('resourceVersion'))
+    elif skipped == 'resource_version':
+        # Re-cache the annotations so later events can use the fingerprint
+        ingress_route_cache.upsert(api_group, metadata, synced_target=service_targets.peek(previous['service_type']))
+    if skipped:
+        INGRESSROUTE_EVENTS.labels(f"skipped_{skipped}").inc()
+        return
     
-    # Check if cloudflare-proxied annotation is missing
-    elif current_cloudflare_proxied is None:
-        needs_update = True
-        update_reason = "cloudflare-proxied annotation missing"
+    cached = ingress_route_cache.upsert(api_group, metadata)
     
-    # Only check load-balancer-type if it's explicitly set and different
-    elif current_type is not None and current_type != service_type:
-        needs_update = True
-        update_reason = f"explicit load-balancer-type mismatch (current: {current_type}, expected: {service_type})"
+    # The cache resolved which service type this IngressRoute should use
+    service_type = cached['service_type']
+    if not service_type:
+        logger.warning(f"Could not determine service type for IngressRoute {namespace}/{name}")
+        INGRESSROUTE_EVENTS.labels('unresolved').inc()
+        return
+    
+    # Get hostname for the determined service type
+    hostname = get_lb_hostname(service_type)
+    if not hostname:
+        logger.warning(f"No hostname available for {service_type} LoadBalancer for IngressRoute {namespace}/{name}")
+        INGRESSROUTE_EVENTS.labels('unresolved').inc()
+        return
     
     # Perform update only if actually needed
-    if needs_update:
-        logger.info(f"Updating via event IngressRoute {namespace}/{name} with {service_type} hostname: {hostname} (reason: {update_reason})")
-        update_ingress_route(name, namespace, hostname, service_type)
+    update_reason = get_update_reason(cached['annotations'], hostname, service_type)
+    if update_reason:
+        logger.debug("Queueing IngressRoute %s/%s for %s hostname: %s (reason: %s)", namespace, name, service_type, hostname, update_reason)
+        enqueue_ingress_route(api_group, namespace, name)
+        INGRESSROUTE_EVENTS.labels('queued').inc()
     else:
-        logger.debug(f"IngressRoute {namespace}/{name} already correctly configured for {service_type}")
+        logger.debug("IngressRoute %s/%s already correctly configured for %s", namespace, name, service_type)
+        ingress_route_cache.mark_synced(api_group, namespace, name, cached['fingerprint'], hostname)
+        INGRESSROUTE_EVENTS.labels('in_sync').inc()
 
-@kopf.on.event('traefik.io', 'v1alpha1', 'ingressroutes')
-def on_ingressroute_event_traefik_io(name, namespace, body, **_):
-    """Handle IngressRoute events for traefik.io API group."""
-    handle_ingressroute_event(name, namespace, body, 'traefik.io')
+def on_ingressroute_event(name, namespace, body, event, resource, **_):
+    """Handle IngressRoute events for whichever API group the watch is on."""
+    handle_ingressroute_event(name, namespace, body, resource.group, event.get('type'))
+
+def register_ingressroute_handlers():
+    """Watch IngressRoutes in the active API groups only (one group when they alias)."""
+    for group in active_api_groups:
+        kopf.on.event(group, TRAEFIK_VERSION, 'ingressroutes', id=f"ingressroutes-{group}")(on_ingressroute_event)
 
-@kopf.on.event('traefik.containo.us', 'v1alpha1', 'ingressroutes')
-def on_ingressroute_event_traefik_containo_us(name, namespace, body, **_):
-    """Handle IngressRoute events for traefik.containo.us API group."""
-    handle_ingressroute_event(name, namespace, body, 'traefik.containo.us')
+class TargetSettler:
+    """Debounce LoadBalancer target changes per service type.
 
-def watch_service():
-    """Watch multiple services for changes in real-time."""
-    global service_watch_active, service_hostnames
+    A changed target is held for settle seconds and only applied (recorded and
+    resynced) if nothing else changed meanwhile. A newer target restarts the window,
+    so a burst of Service events collapses into one resync to the final state, and a
+    target that flips back before the window ends (a node briefly leaving a
+    multi-node LoadBalancer) is dropped without touching any IngressRoute. A pending
+    change is applied no later than max_delay after it was first seen; apply is
+    called with (service_type, targets, first seen) so convergence can be measured
+    from the first event rather than the end of the window.
+    """
+    def __init__(self, apply, settle, max_delay):
+        self.apply = apply
+        self.settle = settle
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._pending = {}   # {service_type: (targets, first seen, Timer)}
+
+    def observe(self, service_type, targets, current):
+        """Handle an observed target; returns "applied", "pending", "absorbed" or "unchanged"."""
+        with self._lock:
+            pending = self._pending.pop(service_type, None)
+            if pending is not None:
+                pending[2].cancel()
+            if targets == current:
+                return 'absorbed' if pending is not None else 'unchanged'
+            first_seen = pending[1] if pending is not None else time.monotonic()
+            if self.settle <= 0 or current is None:
+                apply_now = True
+            else:
+                apply_now = False
+                delay = min(self.settle, max(0.0, first_seen + self.max_delay - time.monotonic()))
+                timer = threading.Timer(delay, self._fire, args=(service_type, targets))
+                timer.daemon = True
+                self._pending[service_type] = (targets, first_seen, timer)
+                timer.start()
+        if apply_now:
+            self.apply(service_type, targets, first_seen)
+            return 'applied'
+        return 'pending'
+
+    def cancel(self, service_type):
+        """Drop a pending change, e.g. of a service that is no longer configured."""
+        with self._lock:
+            pending = self._pending.pop(service_type, None)
+        if pending is not None:
+            pending[2].cancel()
+
+    def _fire(self, service_type, targets):
+        with self._lock:
+            pending = self._pending.get(service_type)
+            if pending is None or pending[0] != targets:
+                return
+            del self._pending[service_type]
+        self.apply(service_type, targets, pending[1])
+
+def apply_service_targets(service_type, hostname, changed_at=None):
+    """Record settled LoadBalancer targets and resync the routes bound to them."""
+    logger.info(f"Applying {service_type} LoadBalancer targets: {hostname}")
+    with trace_span('service.change', service_type=service_type, targets=hostname):
+        service_targets.set(service_type, hostname)
+        LB_TARGET_CHANGES.labels(service_type, 'applied').inc()
+        sync_all_ingress_routes(service_type, hostname, changed_at)
+
+target_settler = TargetSettler(apply_service_targets, SERVICE_SETTLE_SECONDS, SERVICE_SETTLE_MAX_SECONDS)
+
+def apply_service_status(service_type, svc):
+    """Record the LoadBalancer targets of an observed Service and resync its routes once they settle."""
+    ns = svc.metadata.namespace
+    name = svc.metadata.name
+    
+    if svc.status and svc.status.load_balancer and svc.status.load_balancer.ingress:
+        hostname = format_lb_targets(svc.status.load_balancer.ingress)
+        current_hostname = service_targets.peek(service_type)
+        
+        result = target_settler.observe(service_type, hostname, current_hostname)
+        set_span_attributes(current_span.get(), result=result, targets=hostname)
+        if result == 'pending':
+            logger.info(f"Service {ns}/{name} ({service_type}) hostname changing from {current_hostname} to: {hostname}, applying it if it holds for {target_settler.settle:.0f}s")
+            LB_TARGET_CHANGES.labels(service_type, 'deferred').inc()
+        elif result == 'absorbed':
+            logger.info(f"Service {ns}/{name} ({service_type}) hostname back to {hostname} before settling, no resync needed")
+            LB_TARGET_CHANGES.labels(service_type, 'absorbed').inc()
+        elif result == 'unchanged':
+            logger.debug("Service %s/%s (%s) hostname unchanged: %s", ns, name, service_type, hostname)
+    else:
+        service_targets.mark_ready(service_type)
+        logger.debug("No ingress hostname available yet for %s service %s/%s", service_type, ns, name)
+    update_health()
+
+async def load_async_kube_config():
+    """Load configuration for the asyncio Kubernetes client used by the Service watch."""
+    try:
+        async_config.load_incluster_config()
+    except async_config.ConfigException:
+        await async_config.load_kube_config()
+
+def build_service_index(configs):
+    """Map the (namespace, name) of every configured Service to the service types using it."""
+    index = {}
+    for service_type, config in configs.items():
+        index.setdefault((config['namespace'], config['name']), []).append(service_type)
+    return index
+
+def plan_service_watches(configs, mode, label_selector=''):
+    """Return {watch_id: (list method, kwargs, covered service types)} for a watch mode.
+
+    - service:   one watch per configured Service (field selector on its name)
+    - namespace: one watch per namespace holding configured Services
+    - label:     a single cluster-wide watch on the opt-in label selector
+    """
+    if mode == 'label':
+        return {'cluster': ('list_service_for_all_namespaces', {'label_selector': label_selector}, list(configs))}
+    
+    if mode == 'namespace':
+        plan = {}
+        for service_type, config in configs.items():
+            watch_id = f"namespace/{config['namespace']}"
+            if watch_id not in plan:
+                kwargs = {'namespace': config['namespace']}
+                if label_selector:
+                    kwargs['label_selector'] = label_selector
+                plan[watch_id] = ('list_namespaced_service', kwargs, [])
+            plan[watch_id][2].append(service_type)
+        return plan
+    
+    return {
+        service_type: ('list_namespaced_service', {
+            'namespace': config['namespace'],
+            'field_selector': f"metadata.name={config['name']}"
+        }, [service_type])
+        for service_type, config in configs.items()
+    }
+
+def route_service_event(svc):
+    """Apply an observed Service to every service type configured for it; others are ignored."""
+    for service_type in service_index.get((svc.metadata.namespace, svc.metadata.name), ()):
+        with trace_span('service.event', service_type=service_type, namespace=svc.metadata.namespace, name=svc.metadata.name):
+            apply_service_status(service_type, svc)
+
+def get_service_watch_mode():
+    """Return the effective Service watch mode, falling back if its settings are unusable."""
+    mode = SERVICE_WATCH_MODE
+    if mode not in ('service', 'namespace', 'label'):
+        logger.error(f"Unknown SERVICE_WATCH_MODE '{mode}', using 'service'")
+        return 'service'
+    if mode == 'label' and not SERVICE_WATCH_LABEL_SELECTOR:
+        logger.error("SERVICE_WATCH_MODE 'label' requires SERVICE_WATCH_LABEL_SELECTOR, using 'namespace'")
+        return 'namespace'
+    return mode
+
+async def watch_service(resume_versions=None):
+    """List the configured services once, then start the Service watch tasks on kopf's loop.
+
+    resume_versions maps watch ids to resourceVersions restored from a snapshot. A
+    watch whose services were all restored resumes from there without a LIST; if
+    the version has been compacted meanwhile, the watch falls back to a full
+    re-read on its own (410 handling in watch_services).
+    """
+    global service_watch_active, service_index, service_watch_plan
     
     if not service_configs:
         logger.error("No service configurations found, cannot watch services")
         return
 
-    v1 = CoreV1Api()
+    v1 = async_client.CoreV1Api(await get_async_api_client())
     
-    # Initialize service hostnames to avoid unnecessary sync on startup
-    logger.info("Initializing current service hostnames...")
-    for service_type, config in service_configs.items():
-        try:
-            svc = v1.read_namespaced_service(
-                name=config['name'], 
-                namespace=config['namespace']
-            )
-            if svc.status and svc.status.load_balancer and svc.status.load_balancer.ingress:
-                hostname = format_lb_targets(svc.status.load_balancer.ingress)
-                service_hostnames[service_type] = hostname
-                logger.info(f"Initialized {service_type} service hostname: {hostname}")
-            else:
-                logger.info(f"No hostname available yet for {service_type} service")
-        except Exception as e:
-            logger.warning(f"Could not initialize hostname for {service_type} service: {str(e)}")
+    mode = get_service_watch_mode()
+    service_index = build_service_index(service_configs)
+    service_watch_plan = plan = plan_service_watches(service_configs, mode, SERVICE_WATCH_LABEL_SELECTOR)
     
-    logger.info(f"Starting watch for {len(service_configs)} services")
+    # Initialize service hostnames to avoid unnecessary sync on startup. Each watch
+    # is primed with a LIST using its own selectors; the list resourceVersion is
+    # where the watch starts, so nothing is replayed or missed in between. The
+    # watches are primed concurrently and each starts as soon as its LIST is back.
+    logger.info(f"Initializing current service hostnames ({mode} watch mode, {len(plan)} watches)...")
+    await asyncio.gather(*(
+        start_service_watch_task(v1, watch_id, method, kwargs, covered, (resume_versions or {}).get(watch_id))
+        for watch_id, (method, kwargs, covered) in plan.items()
+    ))
     
+    service_watch_active = True
+    logger.info(f"Started {len(plan)} watches for {len(service_configs)} services")
+
+async def start_service_watch_task(v1, watch_id, method, kwargs, covered, resource_version=None):
+    """Prime one planned watch with a LIST (unless it can resume) and start its task."""
+    service_watch_seen[watch_id] = time.monotonic()
+    if resource_version and all(service_targets.is_ready(service_type) for service_type in covered):
+        logger.info(f"Resuming service watch {watch_id} from snapshot resourceVersion {resource_version}")
+        service_watch_tasks[watch_id] = asyncio.create_task(
+            watch_services(watch_id, v1, method, kwargs, resource_version),
+            name=f"service-watch-{watch_id}"
+        )
+        return
+    resource_version = None
     try:
-        service_watch_active = True
-        logger.debug("Multi-service watch starting")
-        
-        # Watch each service in parallel using threads
-        threads = []
-        for service_type, config in service_configs.items():
-            thread = threading.Thread(
-                target=watch_single_service,
-                args=(service_type, config, v1),
-                daemon=True
-            )
-            thread.start()
-            threads.append(thread)
-            logger.debug(f"Started watch thread for {service_type} service")
-        
-        # Wait for all threads to complete (they should run indefinitely)
-        for thread in threads:
-            thread.join()
-            
-        logger.warning("All service watch threads have ended unexpectedly")
+        with observed_api_call('list', 'services'):
+            services = await getattr(v1, method)(**kwargs)
+        resource_version = services.metadata.resource_version
+        for svc in services.items:
+            for service_type in service_index.get((svc.metadata.namespace, svc.metadata.name), ()):
+                if svc.status and svc.status.load_balancer and svc.status.load_balancer.ingress:
+                    hostname = format_lb_targets(svc.status.load_balancer.ingress)
+                    service_targets.set(service_type, hostname)
+                    logger.info(f"Initialized {service_type} service hostname: {hostname}")
+                else:
+                    service_targets.mark_ready(service_type)
+                    logger.info(f"No hostname available yet for {service_type} service")
+    except Exception as e:
+        logger.warning(f"Could not initialize service hostnames for watch {watch_id}: {str(e)}")
+    
+    # Services this watch covers but did not (or could not) list count as observed,
+    # so handlers don't block on them; the watch picks them up if they appear
+    for service_type in covered:
+        if not service_targets.is_ready(service_type):
+            if resource_version:
+                config = service_configs[service_type]
+                logger.warning(f"Service {config['namespace']}/{config['name']} ({service_type}) not found by watch {watch_id}")
+            service_targets.mark_ready(service_type)
+    
+    service_watch_tasks[watch_id] = asyncio.create_task(
+        watch_services(watch_id, v1, method, kwargs, resource_version),
+        name=f"service-watch-{watch_id}"
+    )
+
+def service_watch_backoff(attempt):
+    """Jittered exponential delay before reconnect attempt number attempt (0-based)."""
+    delay = min(SERVICE_WATCH_MAX_BACKOFF, SERVICE_WATCH_BASE_BACKOFF * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+async def watch_services(watch_id, v1_client, method, kwargs, resource_version=None):
+    """Run one Service watch, resuming from the last seen resourceVersion."""
+    attempt = 0
+    
+    logger.info(f"Starting service watch {watch_id}: {kwargs}")
+    
+    while True:
+        try:
+            with observed_api_call('watch', 'services'):
+                async with async_watch.Watch() as w:
+                    async for event in w.stream(
+                        getattr(v1_client, method),
+                        resource_version=resource_version,
+                        allow_watch_bookmarks=True,
+                        timeout_seconds=SERVICE_WATCH_TIMEOUT,
+                        **kwargs
+                    ):
+                        attempt = 0
+                        resource_version = w.resource_version
+                        service_watch_versions[watch_id] = resource_version
+                        service_watch_seen[watch_id] = time.monotonic()
+                        if event['type'] == 'BOOKMARK':
+                            continue
+                        svc = event['object']
+                        logger.debug("Service event received: %s for %s/%s (watch %s)", event['type'], svc.metadata.namespace, svc.metadata.name, watch_id)
+                        # Resyncs walk the route cache; keep that off the event loop
+                        await asyncio.to_thread(route_service_event, svc)
+            # Server-side timeout: reconnect straight away from where we left off
+            service_watch_seen[watch_id] = time.monotonic()
+            WATCH_RECONNECTS.labels(watch_id, 'timeout').inc()
+            continue
+        except asyncio.CancelledError:
+            raise
+        except AsyncApiException as e:
+            if e.status == 410:
+                # Our resourceVersion was compacted away; the fresh watch starts
+                # with synthetic ADDED events carrying the current state
+                logger.info(f"Resource version of service watch {watch_id} expired, restarting from current state")
+                WATCH_RECONNECTS.labels(watch_id, 'expired').inc()
+                resource_version = None
+                service_watch_versions.pop(watch_id, None)
+                continue
+            error = e
+        except Exception as e:
+            error = e
         
+        delay = service_watch_backoff(attempt)
+        attempt += 1
+        WATCH_RECONNECTS.labels(watch_id, 'error').inc()
+        logger.warning(f"Service watch {watch_id} connection lost: {str(error)}, reconnecting in {delay:.1f} seconds")
+        await asyncio.sleep(delay)
+
+# Service configuration reload
+# ============================
+# SERVICES_CONFIG_FILE is polled for changes (a mounted ConfigMap is updated in place
+# by the kubelet). A new configuration is swapped in as a whole: Services that were
+# added, or now point at another Service, are read first so their targets are known
+# before any route resolves to them; then the configuration, matcher and Service
+# index change together. Only the watches whose plan entry changed are started or
+# cancelled, and only the IngressRoutes whose service type changed are re-resolved.
+
+async def prime_service_target(v1, service_type, config):
+    """Read a newly configured Service once and record its LoadBalancer targets."""
+    service_targets.forget(service_type)
+    target_settler.cancel(service_type)
+    hostname = None
+    try:
+        with observed_api_call('get', 'services'):
+            svc = await v1.read_namespaced_service(config['name'], config['namespace'])
+        if svc.status and svc.status.load_balancer:
+            hostname = format_lb_targets(svc.status.load_balancer.ingress)
+    except AsyncApiException as e:
+        if e.status != 404:
+            logger.warning(f"Could not read service {config['namespace']}/{config['name']} ({service_type}): {str(e)}")
     except Exception as e:
-        logger.error(f"Error in multi-service watch: {str(e)}")
-        service_watch_active = False
-        raise
+        logger.warning(f"Could not read service {config['namespace']}/{config['name']} ({service_type}): {str(e)}")
+    if hostname:
+        service_targets.set(service_type, hostname)
+        logger.info(f"Initialized {service_type} service hostname: {hostname}")
+    else:
+        service_targets.mark_ready(service_type)
+        logger.info(f"No hostname available yet for {service_type} service")
+    return hostname
+
+async def apply_service_watch_plan(v1, plan):
+    """Cancel the watches that left the plan or changed, and start the new ones.
+
+    This also marks the Service watches as started, for a controller that came up
+    without a valid configuration and only got one through a reload.
+    """
+    global service_watch_plan, service_watch_active
+    stale = [watch_id for watch_id, entry in service_watch_plan.items()
+             if watch_id not in plan or plan[watch_id][:2] != entry[:2]]
+    tasks = [service_watch_tasks.pop(watch_id) for watch_id in stale if watch_id in service_watch_tasks]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for watch_id in stale:
+        service_watch_versions.pop(watch_id, None)
+        service_watch_seen.pop(watch_id, None)
+        logger.info(f"Stopped service watch {watch_id}")
+    
+    # New watches start without a resourceVersion: the synthetic ADDED events of the
+    # current Services match the targets just primed, so they change nothing
+    for watch_id, (method, kwargs, _) in plan.items():
+        if watch_id not in service_watch_tasks:
+            service_watch_seen[watch_id] = time.monotonic()
+            service_watch_tasks[watch_id] = asyncio.create_task(
+                watch_services(watch_id, v1, method, kwargs),
+                name=f"service-watch-{watch_id}"
+            )
+    service_watch_plan = plan
+    service_watch_active = True
 
-def watch_single_service(service_type, config, v1_client):
-    """Watch a single service for changes."""
-    global service_hostnames
+async def reload_service_config(configs):
+    """Swap in a new service configuration and re-resolve the IngressRoutes it moves."""
+    global service_configs, service_matcher, service_index
+    
+    if configs == service_configs:
+        SERVICE_CONFIG_RELOADS.labels('unchanged').inc()
+        logger.info("Service configuration reloaded, nothing changed")
+        return
+    
+    old_configs, old_matcher = service_configs, service_matcher
+    moved = {service_type for service_type, config in configs.items()
+             if service_type in old_configs
+             and (old_configs[service_type]['namespace'], old_configs[service_type]['name']) != (config['namespace'], config['name'])}
+    added = [service_type for service_type in configs if service_type not in old_configs or service_type in moved]
+    removed = [service_type for service_type in old_configs if service_type not in configs]
+    previous = {service_type: service_targets.peek(service_type) for service_type in moved}
     
-    ns = config['namespace']
-    name = config['name']
+    v1 = async_client.CoreV1Api(await get_async_api_client())
+    hostnames = {}
+    for service_type in added:
+        hostnames[service_type] = await prime_service_target(v1, service_type, configs[service_type])
     
-    logger.info(f"Starting watch for {service_type} service: {ns}/{name}")
+    service_configs, service_matcher, service_index = configs, ServiceMatcher(configs), build_service_index(configs)
+    await apply_service_watch_plan(v1, plan_service_watches(configs, get_service_watch_mode(), SERVICE_WATCH_LABEL_SELECTOR))
+    for service_type in removed:
+        target_settler.cancel(service_type)
+        service_targets.forget(service_type)
     
+    if service_matcher.keys <= old_matcher.keys:
+        changed = await asyncio.to_thread(ingress_route_cache.reindex)
+        keys = [key for key in changed if key[0] in active_api_groups]
+        progress = ResyncProgress("Service configuration reload", len(keys))
+        for key in keys:
+            enqueue_ingress_route(*key, progress=progress)
+        routes = f"{len(keys)} IngressRoutes changed service"
+    else:
+        # The cache does not hold the annotations the new services match on
+        routes = "IngressRoutes listed again"
+        logger.info(f"New services match on {sorted(service_matcher.keys - old_matcher.keys)}, listing IngressRoutes again")
+        await asyncio.to_thread(sync_all_existing_ingress_routes, "Service configuration reload")
+    
+    # Routes that kept their service type, but whose Service was swapped for another
+    for service_type in moved:
+        if hostnames[service_type] and hostnames[service_type] != previous[service_type]:
+            await asyncio.to_thread(sync_all_ingress_routes, service_type, hostnames[service_type])
+    
+    SERVICE_CONFIG_RELOADS.labels('applied').inc()
+    logger.info(f"Service configuration reloaded: added {sorted(set(added) - moved) or 'none'}, "
+                f"removed {removed or 'none'}, moved {sorted(moved) or 'none'}, {routes}")
+
+async def watch_services_config():
+    """Poll SERVICES_CONFIG_FILE and reload the service configuration when it changes."""
+    global services_config_text
+    logger.info(f"Watching {SERVICES_CONFIG_FILE} for service configuration changes every {SERVICES_CONFIG_RELOAD_INTERVAL}s")
     while True:
+        await asyncio.sleep(SERVICES_CONFIG_RELOAD_INTERVAL)
         try:
-            w = watch.Watch()
-            
-            for event in w.stream(
-                v1_client.list_namespaced_service,
-                namespace=ns,
-                field_selector=f"metadata.name={name}",
-                timeout_seconds=60
-            ):
-                event_type = event['type']
-                svc = event['object']
-                logger.debug(f"Service event received: {event_type} for {service_type} service {ns}/{name}")
+            text = await asyncio.to_thread(read_services_config)
+            if text == services_config_text:
+                continue
+            services_config_text = text
+            configs = parse_service_config(text)
+            if not configs:
+                SERVICE_CONFIG_RELOADS.labels('invalid').inc()
+                logger.error("New service configuration has no valid services, keeping the current one")
+                continue
+            await reload_service_config(configs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            SERVICE_CONFIG_RELOADS.labels('error').inc()
+            logger.error(f"Could not reload the service configuration: {str(e)}")
 
-                if svc.status and svc.status.load_balancer and svc.status.load_balancer.ingress:
-                    hostname = format_lb_targets(svc.status.load_balancer.ingress)
-                    current_hostname = service_hostnames.get(service_type)
-                    
-                    if hostname != current_hostname:
-                        logger.info(f"Service {ns}/{name} ({service_type}) hostname changed from {current_hostname} to: {hostname}")
-                        service_hostnames[service_type] = hostname
-                        sync_all_ingress_routes(service_type, hostname)
-                    else:
-                        logger.debug(f"Service {ns}/{name} ({service_type}) hostname unchanged: {hostname}")
-                else:
-                    logger.debug(f"No ingress hostname available yet for {service_type} service {ns}/{name}")
-                update_health()
-                
+# Leader election and sharding
+# ============================
+# In "single" mode (the default) one replica owns every namespace. In "leader" mode
+# replicas compete for one coordination.k8s.io Lease and only the holder reconciles
+# IngressRoutes; the others keep their Service watches warm and take over when the
+# Lease expires. In "sharded" mode namespaces are split over SHARD_COUNT shards by a
+# jump consistent hash, every shard has its own Lease, and each replica heartbeats a
+# member Lease so shards can be spread over the live replicas by rendezvous hashing.
+# A replica only writes IngressRoutes in namespaces whose shard Lease it holds, and
+# only caches those routes, so memory and write load divide across the replicas.
+
+def namespace_shard(namespace, shard_count):
+    """Map a namespace onto one of shard_count shards with a jump consistent hash."""
+    return _jump_hash(namespace, shard_count)
+
+@functools.lru_cache(maxsize=4096)
+def _jump_hash(namespace, shard_count):
+    key = int.from_bytes(hashlib.blake2b(namespace.encode(), digest_size=8).digest(), 'big')
+    shard, candidate = -1, 0
+    while candidate < shard_count:
+        shard = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((shard + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return shard
+
+def assign_shards(shard_count, members):
+    """Spread shards over members by rendezvous (highest random weight) hashing.
+
+    Each member takes at most an even share, so N shards over M replicas differ by
+    at most one per replica. Returns {shard: member}.
+    """
+    capacity = -(-shard_count // len(members))
+    load = dict.fromkeys(members, 0)
+    assignment = {}
+    for shard in range(shard_count):
+        ranked = sorted(members, key=lambda member: hashlib.blake2b(f"{shard}/{member}".encode(), digest_size=8).digest(), reverse=True)
+        owner = next(member for member in ranked if load[member] < capacity)
+        load[owner] += 1
+        assignment[shard] = owner
+    return assignment
+
+class ShardElector:
+    """Acquire, renew and release the shard Leases this replica is responsible for.
+
+    The elector talks to the API through a coordination.k8s.io/v1 client (anything
+    with the CoordinationV1Api lease methods), so it can be driven by a fake. Lease
+    expiry is judged against our own clock from when a record was first observed,
+    like client-go, so clock skew between replicas does not matter.
+
+    Shards we give up are dropped from owned (calling on_release) before their
+    Leases are released, and on_drain, if given, is run in a thread in between so
+    writes already in flight finish before another replica can take over.
+    """
+    def __init__(self, api, namespace, identity, shard_count, on_acquire=None, on_release=None,
+                 on_drain=None, lease_name=None, duration=None, renew_deadline=None, retry_period=None):
+        self.api = api
+        self.namespace = namespace
+        self.identity = identity
+        self.shard_count = shard_count
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+        self.on_drain = on_drain
+        self.lease_name = lease_name or LEASE_NAME
+        self.duration = duration or LEASE_DURATION_SECONDS
+        self.renew_deadline = renew_deadline or LEASE_RENEW_DEADLINE_SECONDS
+        self.retry_period = retry_period or LEASE_RETRY_PERIOD_SECONDS
+        self.owned = frozenset()
+        self._renewed = {}    # {lease name: monotonic time of our last successful renew}
+        self._observed = {}   # {lease name: ((holder, renewTime), monotonic time first seen)}
+
+    def owns(self, namespace):
+        return namespace_shard(namespace, self.shard_count) in self.owned
+
+    def shard_lease(self, shard):
+        return f"{self.lease_name}-shard-{shard}" if self.shard_count > 1 else self.lease_name
+
+    def member_lease(self):
+        return f"{self.lease_name}-member-{self.identity}"
+
+    def _expired(self, lease):
+        if not lease.spec.holder_identity:
+            return True
+        record = (lease.spec.holder_identity, lease.spec.renew_time)
+        now = time.monotonic()
+        seen = self._observed.get(lease.metadata.name)
+        if seen is None or seen[0] != record:
+            self._observed[lease.metadata.name] = (record, now)
+            return False
+        return now - seen[1] > (lease.spec.lease_duration_seconds or self.duration)
+
+    def _lease_spec(self, lease=None):
+        now = datetime.now(timezone.utc)
+        spec = async_client.V1LeaseSpec(
+            holder_identity=self.identity,
+            lease_duration_seconds=int(self.duration),
+            acquire_time=now,
+            renew_time=now,
+            lease_transitions=0,
+        )
+        if lease is not None and lease.spec.holder_identity == self.identity:
+            spec.acquire_time = lease.spec.acquire_time
+            spec.lease_transitions = lease.spec.lease_transitions
+        elif lease is not None:
+            spec.lease_transitions = (lease.spec.lease_transitions or 0) + 1
+        return spec
+
+    async def _hold(self, name, labels=None):
+        """Create, renew or take over a Lease. Returns whether we hold it afterwards."""
+        try:
+            with observed_api_call('get', 'leases'):
+                lease = await self.api.read_namespaced_lease(name, self.namespace)
+        except AsyncApiException as e:
+            if e.status != 404:
+                raise
+            lease = async_client.V1Lease(
+                metadata=async_client.V1ObjectMeta(name=name, labels=labels),
+                spec=self._lease_spec(),
+            )
+            try:
+                with observed_api_call('create', 'leases'):
+                    await self.api.create_namespaced_lease(self.namespace, lease)
+            except AsyncApiException as e:
+                if e.status == 409:
+                    return False
+                raise
+            return True
+        
+        if lease.spec.holder_identity != self.identity and not self._expired(lease):
+            return False
+        # The read resourceVersion makes this a compare-and-swap against other replicas
+        lease.spec = self._lease_spec(lease)
+        try:
+            with observed_api_call('update', 'leases'):
+                await self.api.replace_namespaced_lease(name, self.namespace, lease)
+        except AsyncApiException as e:
+            if e.status == 409:
+                return False
+            raise
+        return True
+
+    async def _release(self, name):
+        """Clear our holder identity so the next owner does not wait for the Lease to expire."""
+        try:
+            with observed_api_call('get', 'leases'):
+                lease = await self.api.read_namespaced_lease(name, self.namespace)
+            if lease.spec.holder_identity == self.identity:
+                lease.spec.holder_identity = None
+                with observed_api_call('update', 'leases'):
+                    await self.api.replace_namespaced_lease(name, self.namespace, lease)
         except Exception as e:
-            logger.warning(f"Watch connection lost for {service_type} service {ns}/{name}: {str(e)}, reconnecting in 5 seconds")
-            time.sleep(5)
-            # Continue the while loop to reconnect
-
-class HealthCheckHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        global last_healthy_time, service_watch_active
-        if self.path == '/healthz':
-            current_time = time.time()
-            if service_watch_active or (current_time - last_healthy_time) < 60:
-                self.send_response(200)
-                self.send_header("Content-type", "text/plain")
-                self.end_headers()
-                self.wfile.write(b"OK")
+            logger.debug(f"Could not release Lease {self.namespace}/{name}: {str(e)}")
+        self._renewed.pop(name, None)
+
+    async def _live_members(self):
+        """Heartbeat our member Lease and return the identities of all live members."""
+        await self._hold(self.member_lease(), {LEASE_MEMBER_LABEL: self.lease_name})
+        with observed_api_call('list', 'leases'):
+            leases = await self.api.list_namespaced_lease(
+                self.namespace, label_selector=f"{LEASE_MEMBER_LABEL}={self.lease_name}"
+            )
+        members = {self.identity}
+        for lease in leases.items:
+            if not self._expired(lease):
+                members.add(lease.spec.holder_identity)
+            elif 0 in self.owned:
+                # One replica garbage-collects the member Leases of replicas that are gone
+                try:
+                    with observed_api_call('delete', 'leases'):
+                        await self.api.delete_namespaced_lease(lease.metadata.name, self.namespace)
+                    self._observed.pop(lease.metadata.name, None)
+                except AsyncApiException as e:
+                    logger.debug(f"Could not delete stale Lease {lease.metadata.name}: {str(e)}")
+        return members
+
+    async def step(self):
+        """Run one election round: work out our shards, then release, acquire and renew Leases."""
+        owned = set(self.owned)
+        if self.shard_count == 1:
+            # Plain leader election: everybody competes for the single Lease
+            desired = {0}
+        else:
+            try:
+                members = await self._live_members()
+                assignment = assign_shards(self.shard_count, sorted(members))
+                desired = {shard for shard, owner in assignment.items() if owner == self.identity}
+            except Exception as e:
+                logger.warning(f"Could not refresh replica membership, keeping current shards: {str(e)}")
+                desired = set(owned)
+        
+        released = owned - desired
+        if released:
+            owned -= released
+            self._set_owned(owned)
+            await self._drain(released)
+            for shard in sorted(released):
+                await self._release(self.shard_lease(shard))
+        
+        for shard in sorted(desired):
+            name = self.shard_lease(shard)
+            now = time.monotonic()
+            try:
+                held = await self._hold(name)
+            except Exception as e:
+                # Keep a shard through transient API errors until the renew deadline passes
+                held = shard in owned and now - self._renewed.get(name, now) < self.renew_deadline
+                logger.warning(f"Could not renew Lease {self.namespace}/{name}: {str(e)}")
             else:
-                self.send_response(503)
-                self.send_header("Content-type", "text/plain")
-                self.end_headers()
-                self.wfile.write(b"Service Unhealthy")
-                logger.warning(f"Health check failed: Service unhealthy (last healthy time: {time.ctime(last_healthy_time)})")
+                if held:
+                    self._renewed[name] = now
+            if held:
+                owned.add(shard)
+            else:
+                owned.discard(shard)
+                self._renewed.pop(name, None)
+        
+        self._set_owned(owned)
+
+    def _set_owned(self, owned):
+        gained = owned - self.owned
+        lost = self.owned - owned
+        if not gained and not lost:
+            return
+        self.owned = frozenset(owned)
+        if self.shard_count == 1:
+            logger.info(f"{'Acquired' if gained else 'Lost'} leadership as {self.identity}")
         else:
-            self.send_response(404)
-            self.end_headers()
-    
-    def log_request(self, code='-', size='-'):
-        """Override default logging to only log failures."""
-        if str(code) == '503':
-            self.log_message('"%s" %s %s', self.requestline, str(code), str(size))
-        # Otherwise, do nothing (silence 200 OK)
-
-def start_health_server():
-    """Start the health check server in a separate thread."""
-    server = HTTPServer(('0.0.0.0', 8080), HealthCheckHandler)
-    logger.info("Starting health check server on port 8080")
-    server.serve_forever()
-
-def sync_all_existing_ingress_routes():
-    """Sync all existing IngressRoutes on startup to ensure all annotations are present."""
-    logger.info("Starting initial sync of all existing IngressRoutes...")
-    api = CustomObjectsApi()
-    total_synced = 0
+            logger.info(f"Replica {self.identity} now owns shards {sorted(self.owned)} of {self.shard_count} (gained {sorted(gained)}, lost {sorted(lost)})")
+        if lost and self.on_release:
+            self.on_release(lost)
+        if gained and self.on_acquire:
+            self.on_acquire(gained)
+
+    async def run(self):
+        while True:
+            try:
+                await self.step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Leader election round failed: {str(e)}")
+            await asyncio.sleep(self.retry_period * random.uniform(1.0, 1.2))
+
+    async def _drain(self, shards):
+        if self.on_drain:
+            try:
+                await asyncio.to_thread(self.on_drain, shards)
+            except Exception as e:
+                logger.warning(f"Could not drain shards {sorted(shards)}: {str(e)}")
+
+    async def stop(self):
+        """Release every Lease we hold so the remaining replicas take over straight away."""
+        released = self.owned
+        self._set_owned(set())
+        await self._drain(released)
+        for shard in sorted(released):
+            await self._release(self.shard_lease(shard))
+        if self.shard_count > 1:
+            try:
+                with observed_api_call('delete', 'leases'):
+                    await self.api.delete_namespaced_lease(self.member_lease(), self.namespace)
+            except Exception as e:
+                logger.debug(f"Could not delete member Lease: {str(e)}")
+
+def owns_namespace(namespace):
+    """Whether this replica is responsible for the IngressRoutes of a namespace."""
+    return shard_elector is None or shard_elector.owns(namespace)
+
+def get_pod_namespace():
+    """The pod's own namespace, where the Leases and the snapshot ConfigMap live."""
+    if POD_NAMESPACE:
+        return POD_NAMESPACE
+    try:
+        with open('/var/run/secrets/kubernetes.io/serviceaccount/namespace') as f:
+            return f.read().strip()
+    except OSError:
+        return 'default'
+
+def on_shards_released(shards):
+    """Forget the routes and drop the queued keys of namespaces we no longer own."""
+    dropped = ingress_route_cache.retain(lambda key: owns_namespace(key[1]))
+    discarded = update_queue.discard(lambda key: not owns_namespace(key[1]))
+    for batches in discarded.values():
+        for batch in batches:
+            batch.item_done(False)
+    logger.info(f"Dropped {dropped} cached and {len(discarded)} queued IngressRoutes after releasing shards {sorted(shards)}")
+
+def drain_released_shards(shards):
+    """Wait for patches still running in namespaces we gave up, before their Leases go."""
+    if not update_queue.wait_processing(lambda key: not owns_namespace(key[1]), LEASE_RENEW_DEADLINE_SECONDS):
+        logger.warning(f"Patches for shards {sorted(shards)} still running after {LEASE_RENEW_DEADLINE_SECONDS}s, releasing anyway")
+
+def on_shards_acquired(shards):
+    """List and reconcile the routes of newly owned namespaces in the background."""
+    label = "Initial sync" if shard_elector.shard_count == 1 else f"Sync of shards {sorted(shards)}"
+    threading.Thread(target=sync_all_existing_ingress_routes, args=(label,), daemon=True).start()
+
+async def start_shard_elector():
+    """Start leader election or shard ownership on the operator loop."""
+    global shard_elector, lease_task
     
-    for group in active_api_groups:
+    shard_count = 1 if REPLICA_MODE == 'leader' else max(1, SHARD_COUNT)
+    shard_elector = ShardElector(
+        async_client.CoordinationV1Api(await get_async_api_client()),
+        get_pod_namespace(),
+        REPLICA_IDENTITY,
+        shard_count,
+        on_acquire=on_shards_acquired,
+        on_release=on_shards_released,
+        on_drain=drain_released_shards,
+    )
+    # Nothing is owned yet, so the (empty) cache is complete until a shard is acquired
+    ingress_route_cache.synced.set()
+    lease_task = asyncio.create_task(shard_elector.run(), name="shard-elector")
+    logger.info(f"Started {REPLICA_MODE} mode as {REPLICA_IDENTITY} with {shard_count} Lease(s) in namespace {shard_elector.namespace}")
+
+async def stop_shard_elector():
+    if lease_task is not None:
+        lease_task.cancel()
+        await asyncio.gather(lease_task, return_exceptions=True)
+    if shard_elector is not None:
+        await shard_elector.stop()
+
+def iter_ingress_routes(api, group, page_size=None, namespace=None):
+    """Yield every IngressRoute of an API group, fetching one page at a time.
+
+    Only a single page is ever deserialized at once, so peak memory is bounded by
+    the page size rather than by the number of routes in the cluster. If the
+    continue token expires mid-listing (410 Gone) the listing restarts from a fresh
+    resourceVersion; callers must therefore tolerate seeing a route twice.
+    Listing is cluster-wide unless a namespace is given, and always filtered by
+    INGRESSROUTE_LABEL_SELECTOR on the server.
+    """
+    page_size = page_size or INGRESSROUTE_PAGE_SIZE
+    scope = {'namespace': namespace} if namespace else {}
+    list_method = api.list_namespaced_custom_object if namespace else api.list_cluster_custom_object
+    continue_token = None
+    restarts = 0
+    
+    while True:
         try:
-            ingress_routes = api.list_cluster_custom_object(
-                group=group,
-                version=TRAEFIK_VERSION,
-                plural="ingressroutes"
-            )
-            
-            for item in ingress_routes.get('items', []):
-                name = item['metadata']['name']
-                namespace = item['metadata']['namespace']
+            with observed_api_call('list', 'ingressroutes'):
+                page = list_method(
+                    group=group,
+                    version=TRAEFIK_VERSION,
+                    plural="ingressroutes",
+                    label_selector=INGRESSROUTE_LABEL_SELECTOR,
+                    limit=page_size,
+                    _continue=continue_token,
+                    _request_timeout=API_REQUEST_TIMEOUT,
+                    **scope
+                )
+        except ApiException as e:
+            if e.status != 410 or continue_token is None or restarts >= INGRESSROUTE_LIST_MAX_RESTARTS:
+                raise
+            restarts += 1
+            logger.warning(f"Continue token expired while listing IngressRoutes ({group}), restarting from a fresh resourceVersion ({restarts}/{INGRESSROUTE_LIST_MAX_RESTARTS})")
+            continue_token = None
+            continue
+        
+        items = page.get('items', [])
+        logger.debug("Fetched page of %d IngressRoutes (%s)", len(items), group)
+        yield from items
+        
+        continue_token = page.get('metadata', {}).get('continue')
+        if not continue_token:
+            return
+
+def sync_all_existing_ingress_routes(label="Initial sync"):
+    """Sync all existing IngressRoutes on startup to ensure all annotations are present.
+
+    The routes are streamed page by page: each item primes the IngressRoute cache
+    and, if it needs an update, is queued for the patch workers. This is the only
+    LIST the controller issues for IngressRoutes (besides re-running it when a
+    replica takes over shards); from then on the cache is kept current by the
+    kopf watch. Routes in namespaces owned by another replica are skipped.
+    """
+    logger.info(f"Starting {label.lower()} of all existing IngressRoutes...")
+    started = time.monotonic()
+    api = custom_objects_api
+    # An ordered set: a listing restarted after a 410 yields routes again, and the
+    # work queue attaches a batch to a key only once, so a repeated key would keep
+    # the batch from ever completing
+    keys = {}
+    
+    for group, namespace in itertools.product(active_api_groups, get_list_namespaces()):
+        try:
+            for item in iter_ingress_routes(api, group, namespace=namespace):
+                if not owns_namespace(item['metadata']['namespace']) or not route_in_scope(item['metadata']):
+                    continue
+                cached = ingress_route_cache.upsert(group, item['metadata'])
                 
-                # Determine which service type this IngressRoute should use
-                service_type = determine_service_type(item)
+                # The cache resolved which service type this IngressRoute should use
+                service_type = cached['service_type']
                 if not service_type:
                     continue
                 
@@ -608,51 +2662,520 @@ def sync_all_existing_ingress_routes():
                 if not hostname:
                     continue
                 
-                # Check if cloudflare-proxied annotation is missing
-                annotations = item['metadata'].get('annotations', {})
-                cloudflare_proxied = annotations.get('external-dns.alpha.kubernetes.io/cloudflare-proxied')
-                current_target = annotations.get('external-dns.alpha.kubernetes.io/target')
-                
-                # Update if annotation is missing or hostname doesn't match
-                if cloudflare_proxied is None or current_target != hostname:
-                    logger.info(f"Initial sync: updating IngressRoute {namespace}/{name} ({service_type})")
-                    if update_ingress_route(name, namespace, hostname, service_type):
-                        total_synced += 1
+                # Queue the route if an annotation is missing or the hostname doesn't match
+                key = (group, item['metadata']['namespace'], item['metadata']['name'])
+                if get_update_reason(cached['annotations'], hostname, service_type):
+                    keys[key] = None
+                else:
+                    keys.pop(key, None)
+                    ingress_route_cache.mark_synced(*key, cached['fingerprint'], hostname)
                         
         except Exception as e:
-            logger.error(f"Error during initial sync with API group {group}: {str(e)}")
+            logger.error(f"Error during {label.lower()} with API group {group}: {str(e)}")
             continue
     
-    logger.info(f"Initial sync completed: {total_synced} IngressRoutes updated")
-    update_health()
+    ingress_route_cache.synced.set()
+    logger.info(f"{label} cached {len(ingress_route_cache)} IngressRoutes, queueing {len(keys)} for update")
+    logger.info(f"Service target cache stats: {service_targets.stats()}")
+    
+    progress = ResyncProgress(label, len(keys), on_complete=lambda: record_first_sync(started))
+    for key in keys:
+        enqueue_ingress_route(*key, progress=progress)
+
+def record_first_sync(started):
+    """Record the startup phases that end when the first sync of this replica has converged."""
+    record_startup_phase('initial_sync', started)
+    record_startup_phase('total', PROCESS_STARTED)
+
+# Health and metrics server
+# =========================
+# Served by aiohttp on kopf's event loop, so a slow client only holds its own
+# request and never the other probes. Liveness only fails when something that is
+# never restarted has died (a Service watch task or a patch worker); everything
+# that recovers on its own (a watch in backoff, the initial sync, a queue backlog)
+# only takes the replica out of readiness. Both answer with one line per check.
+
+def liveness_checks():
+    """Return [(check, ok, detail)] for /livez."""
+    checks = []
+    for watch_id, task in service_watch_tasks.items():
+        dead = task.done() and not task.cancelled()
+        checks.append((f"service-watch {watch_id}", not dead, "task exited" if dead else "running"))
+    alive = sum(1 for worker in patch_workers if worker.is_alive())
+    checks.append(("patch-workers", alive == len(patch_workers), f"{alive}/{len(patch_workers)} alive"))
+    checks.append(("activity", True, f"last update {time.time() - last_healthy_time:.0f}s ago"))
+    return checks
+
+def readiness_checks():
+    """Return [(check, ok, detail)] for /readyz."""
+    checks = [("service-watches", service_watch_active, "started" if service_watch_active else "not started")]
+    now = time.monotonic()
+    for watch_id in service_watch_tasks:
+        age = now - service_watch_seen.get(watch_id, float('-inf'))
+        checks.append((f"service-watch {watch_id}", age <= READINESS_WATCH_MAX_AGE, f"last seen {age:.0f}s ago"))
+    synced = ingress_route_cache.synced.is_set()
+    checks.append(("ingressroute-cache", synced, "synced" if synced else "initial sync running"))
+    depth = update_queue.qsize()
+    backlog_ok = READINESS_MAX_QUEUE_DEPTH <= 0 or depth <= READINESS_MAX_QUEUE_DEPTH
+    checks.append(("queue", backlog_ok, f"{depth} pending"))
+    return checks
+
+def health_response(checks):
+    ok = all(passed for _, passed, _ in checks)
+    body = "".join(f"[{'+' if passed else '-'}]{check} {detail}\n" for check, passed, detail in checks)
+    return web.Response(text=body + ("ok\n" if ok else "failed\n"), status=200 if ok else 503)
+
+async def handle_livez(request):
+    checks = liveness_checks()
+    failed = [f"{check} ({detail})" for check, passed, detail in checks if not passed]
+    if failed:
+        logger.warning(f"Liveness check failed: {', '.join(failed)}")
+    return health_response(checks)
+
+async def handle_readyz(request):
+    return health_response(readiness_checks())
+
+async def handle_metrics(request):
+    # Collectors take the cache and queue locks; keep that off the event loop
+    output = await asyncio.to_thread(generate_latest)
+    return web.Response(body=output, headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+async def start_health_server():
+    """Serve the health and metrics endpoints on the operator event loop."""
+    global health_runner
+    app = web.Application()
+    app.add_routes([
+        web.get('/livez', handle_livez),
+        web.get('/healthz', handle_livez),
+        web.get('/readyz', handle_readyz),
+        web.get('/metrics', handle_metrics),
+    ])
+    health_runner = web.AppRunner(app, access_log=None)
+    await health_runner.setup()
+    await web.TCPSite(health_runner, HEALTH_BIND_ADDRESS, HEALTH_PORT).start()
+    logger.info(f"Health check and metrics server listening on {HEALTH_BIND_ADDRESS}:{HEALTH_PORT}")
+
+async def stop_health_server():
+    if health_runner is not None:
+        await health_runner.cleanup()
+
+# Drift reconciler
+# ================
+# The cache follows the kopf watch, but a watch can miss changes (a compacted
+# resourceVersion, a relist race, someone editing annotations by hand) and the
+# startup sync only runs once. Every DRIFT_RECONCILE_INTERVAL seconds a pass lists
+# the managed IngressRoutes again, paced so the listing is spread over the interval
+# (or at most DRIFT_MAX_PAGE_GAP seconds between pages), and compares what is actually
+# on each route with the desired target computed from the local Service state.
+# Drifted routes are re-read into the cache and queued at no more than
+# DRIFT_MAX_WRITES_PER_SECOND, so a pass that finds a lot of drift trickles its
+# fixes out instead of producing a burst. Cached routes the cluster no longer has
+# are dropped.
+
+drift_write_limiter = TokenBucket(DRIFT_MAX_WRITES_PER_SECOND, 1)
+
+def refresh_ingress_route(api, group, namespace, name):
+    """Re-read one IngressRoute into the cache. Returns False if it no longer exists."""
+    try:
+        with observed_api_call('get', 'ingressroutes'):
+            item = api.get_namespaced_custom_object(
+                group=group,
+                version=TRAEFIK_VERSION,
+                namespace=namespace,
+                plural="ingressroutes",
+                name=name,
+                _request_timeout=API_REQUEST_TIMEOUT
+            )
+    except ApiException as e:
+        if e.status == 404:
+            ingress_route_cache.delete(group, namespace, name)
+            return False
+        raise
+    ingress_route_cache.upsert(group, item['metadata'])
+    return True
+
+def reconcile_drift(pass_seconds):
+    """Run one drift pass over the managed IngressRoutes and return the drift found by kind."""
+    api = custom_objects_api
+    drift = {}
+    seen = set()
+    cached_before = {key for key, _ in ingress_route_cache.items()}
+    item_gap = min(pass_seconds / max(len(cached_before), 1), DRIFT_MAX_PAGE_GAP / INGRESSROUTE_PAGE_SIZE)
+    started = time.monotonic()
+    # Namespaces listed by name are only listed if this replica owns them
+    namespaces = [namespace for namespace in get_list_namespaces() if namespace is None or owns_namespace(namespace)]
+    
+    for group, namespace in itertools.product(active_api_groups, namespaces):
+        for item in iter_ingress_routes(api, group, namespace=namespace):
+            metadata = item['metadata']
+            if not owns_namespace(metadata['namespace']) or not route_in_scope(metadata):
+                continue
+            key = (group, metadata['namespace'], metadata['name'])
+            seen.add(key)
+            
+            delay = started + len(seen) * item_gap - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            
+            if ingress_route_cache.get(*key) is None:
+                kind = 'missing'
+            else:
+                annotations = metadata.get('annotations') or {}
+                service_type = determine_service_type_for_annotations(annotations)
+                hostname = service_targets.peek(service_type) if service_type else None
+                found = get_drift(annotations, hostname, service_type) if hostname else None
+                if not found:
+                    continue
+                kind = found[0]
+            
+            drift[kind] = drift.get(kind, 0) + 1
+            DRIFT_DETECTED.labels(kind).inc()
+            drift_write_limiter.acquire()
+            if refresh_ingress_route(api, *key):
+                enqueue_ingress_route(*key)
+    
+    # Routes created during the pass are not in cached_before; the GET confirms the rest
+    for key in cached_before - seen:
+        if ingress_route_cache.get(*key) is not None and not refresh_ingress_route(api, *key):
+            drift['deleted'] = drift.get('deleted', 0) + 1
+            DRIFT_DETECTED.labels('deleted').inc()
+    
+    DRIFT_PASSES.inc()
+    return drift, len(seen)
+
+def drift_reconciler():
+    """Run drift passes forever, one every DRIFT_RECONCILE_INTERVAL seconds."""
+    if DRIFT_RECONCILE_INTERVAL <= 0:
+        return
+    ingress_route_cache.synced.wait()
+    # Start somewhere in the first interval so restarts and replicas do not line up
+    time.sleep(random.uniform(0.5, 1.0) * DRIFT_RECONCILE_INTERVAL)
+    
+    while True:
+        started = time.monotonic()
+        # A standby replica (or one without shards) has no routes to check
+        if shard_elector is not None and not shard_elector.owned:
+            logger.debug("Skipping drift pass: this replica owns no shards")
+            time.sleep(DRIFT_RECONCILE_INTERVAL)
+            continue
+        try:
+            drift, checked = reconcile_drift(DRIFT_RECONCILE_INTERVAL)
+            elapsed = time.monotonic() - started
+            details = ', '.join(f"{kind}: {count}" for kind, count in sorted(drift.items())) or 'none'
+            logger.info(f"Drift pass checked {checked} IngressRoutes in {elapsed:.1f}s, {sum(drift.values())} drifted ({details})")
+        except Exception as e:
+            logger.error(f"Drift pass failed: {str(e)}")
+        time.sleep(max(DRIFT_RECONCILE_INTERVAL - (time.monotonic() - started), 0))
+
+# Warm-restart snapshot
+# =====================
+# Without a snapshot every restart re-reads all configured Services and re-lists
+# every IngressRoute before the controller is useful. With SNAPSHOT_PATH (a file,
+# e.g. on an emptyDir) or SNAPSHOT_CONFIGMAP set, the last-known Service targets,
+# the Service watch resourceVersions and each route's resourceVersion, service type
+# and managed annotations are saved periodically and on shutdown. At startup the
+# targets are restored (so handlers never wait on the Services), the watches resume
+# where they left off, and a single replica restores its route cache instead of
+# listing. kopf's own initial listing then delivers every route once, and routes
+# whose resourceVersion and target are unchanged are skipped without evaluation.
+# Routes deleted while the controller was down produce no event, so one LIST in the
+# background drops restored routes that no longer exist. A snapshot taken under a
+# different configuration is ignored.
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_CONFIGMAP_KEY = 'snapshot.json.gz'
+# The API server rejects objects over 1 MiB; leave room for the ConfigMap's metadata
+SNAPSHOT_CONFIGMAP_MAX_BYTES = 1000 * 1024
+
+class FileSnapshotStore:
+    """Snapshot store backed by a file; save() returns whether the snapshot was written."""
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return f"file {self.path}"
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, data):
+        # Write then rename so a crash mid-write never leaves a torn snapshot
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        return True
+
+class ConfigMapSnapshotStore:
+    """Snapshot store backed by the binaryData of a ConfigMap.
+
+    A snapshot too large for a ConfigMap is not written; the stored one is cleared
+    instead (once, with a warning) so the next start goes cold rather than
+    restoring an outdated snapshot.
+    """
+    def __init__(self, namespace, name):
+        self.namespace = namespace
+        self.name = name
+        self.too_large = False
+
+    def __str__(self):
+        return f"ConfigMap {self.namespace}/{self.name}"
+
+    def load(self):
+        try:
+            with observed_api_call('get', 'configmaps'):
+                config_map = core_v1_api.read_namespaced_config_map(self.name, self.namespace, _request_timeout=API_REQUEST_TIMEOUT)
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+        data = (config_map.binary_data or {}).get(SNAPSHOT_CONFIGMAP_KEY)
+        return base64.b64decode(data) if data else None
+
+    def save(self, data):
+        encoded = base64.b64encode(data).decode()
+        if len(encoded) > SNAPSHOT_CONFIGMAP_MAX_BYTES:
+            if self.too_large:
+                return False
+            logger.warning(f"Snapshot of {len(encoded)} bytes does not fit in {self} "
+                           f"(limit {SNAPSHOT_CONFIGMAP_MAX_BYTES}), use SNAPSHOT_PATH instead; clearing the stored snapshot")
+            self._write({})
+            self.too_large = True
+            return False
+        self._write({SNAPSHOT_CONFIGMAP_KEY: encoded})
+        self.too_large = False
+        return True
+
+    def _write(self, binary_data):
+        body = {
+            'metadata': {'name': self.name},
+            'binaryData': binary_data,
+        }
+        try:
+            with observed_api_call('update', 'configmaps'):
+                core_v1_api.replace_namespaced_config_map(self.name, self.namespace, body, _request_timeout=API_REQUEST_TIMEOUT)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            with observed_api_call('create', 'configmaps'):
+                core_v1_api.create_namespaced_config_map(self.namespace, body, _request_timeout=API_REQUEST_TIMEOUT)
+
+def get_snapshot_store():
+    if SNAPSHOT_PATH:
+        return FileSnapshotStore(SNAPSHOT_PATH)
+    if SNAPSHOT_CONFIGMAP:
+        return ConfigMapSnapshotStore(get_pod_namespace(), SNAPSHOT_CONFIGMAP)
+    return None
+
+snapshot_store = None
+last_snapshot_digest = None
+
+def snapshot_fingerprint():
+    """Hash of every setting that decides which routes we cache and how they resolve."""
+    settings = [
+        SNAPSHOT_FORMAT, service_configs, active_api_groups, WATCH_NAMESPACES, EXCLUDE_NAMESPACES,
+        INGRESSROUTE_LABEL_SELECTOR, SERVICE_WATCH_MODE, SERVICE_WATCH_LABEL_SELECTOR,
+    ]
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+def build_snapshot():
+    routes = []
+    for (group, namespace, name), entry in ingress_route_cache.items():
+        annotations = {key: entry['annotations'][key] for key in MANAGED_ANNOTATIONS if key in entry['annotations']}
+        routes.append([group, namespace, name, entry['resourceVersion'], entry['service_type'], annotations])
+    return {
+        'fingerprint': snapshot_fingerprint(),
+        'targets': service_targets.observed(),
+        'service_watches': dict(service_watch_versions),
+        'routes': routes,
+    }
+
+def save_snapshot():
+    """Write the snapshot if anything in it changed since the last write."""
+    global last_snapshot_digest
+    snapshot = build_snapshot()
+    payload = json.dumps(snapshot, sort_keys=True, separators=(',', ':')).encode()
+    digest = hashlib.sha256(payload).hexdigest()
+    if digest == last_snapshot_digest:
+        return
+    snapshot['saved'] = time.time()
+    data = gzip.compress(json.dumps(snapshot, separators=(',', ':')).encode())
+    saved = snapshot_store.save(data)
+    last_snapshot_digest = digest
+    if saved:
+        logger.debug("Saved snapshot to %s: %d IngressRoutes, %d bytes", snapshot_store, len(snapshot['routes']), len(data))
+
+def load_snapshot():
+    """Return the stored snapshot if it was taken under the current configuration."""
+    try:
+        data = snapshot_store.load()
+        if data is None:
+            logger.info(f"No snapshot found in {snapshot_store}, starting cold")
+            return None
+        snapshot = json.loads(gzip.decompress(data))
+    except Exception as e:
+        logger.warning(f"Could not read snapshot from {snapshot_store}, starting cold: {str(e)}")
+        return None
+    if snapshot.get('fingerprint') != snapshot_fingerprint():
+        logger.info("Snapshot was taken with a different configuration, starting cold")
+        return None
+    age = time.time() - snapshot.get('saved', 0)
+    logger.info(f"Loaded snapshot from {snapshot_store} taken {age:.0f}s ago: {len(snapshot['targets'])} services, {len(snapshot['routes'])} IngressRoutes")
+    return snapshot
+
+def restore_service_targets(snapshot):
+    for service_type, targets in snapshot['targets'].items():
+        if service_type not in service_configs:
+            continue
+        if targets:
+            service_targets.set(service_type, targets)
+        else:
+            service_targets.mark_ready(service_type)
+
+def restore_ingress_routes(snapshot):
+    """Restore the route cache from a snapshot; returns {key: restored entry}."""
+    restored = {}
+    for group, namespace, name, resource_version, service_type, annotations in snapshot['routes']:
+        if group in active_api_groups and owns_namespace(namespace) and namespace_in_scope(namespace):
+            key = (group, namespace, name)
+            restored[key] = ingress_route_cache.restore(*key, resource_version, service_type, annotations)
+    ingress_route_cache.synced.set()
+    logger.info(f"Restored {len(restored)} IngressRoutes from the snapshot, skipping the initial sync")
+    record_startup_phase('total', PROCESS_STARTED)
+    return restored
+
+def verify_restored_routes(restored):
+    """List the IngressRoutes once and drop the restored ones deleted while we were down.
+
+    Only entries no event has replaced since the restore are dropped, so a route
+    created or updated after the LIST started is never lost. If the LIST fails
+    nothing is dropped; the drift reconciler, if enabled, catches the rest.
+    """
+    seen = set()
+    try:
+        for group, namespace in itertools.product(active_api_groups, get_list_namespaces()):
+            for item in iter_ingress_routes(custom_objects_api, group, namespace=namespace):
+                seen.add((group, item['metadata']['namespace'], item['metadata']['name']))
+    except Exception as e:
+        logger.warning(f"Could not verify the IngressRoutes restored from the snapshot: {str(e)}")
+        return 0
+    dropped = sum(ingress_route_cache.discard_entry(key, entry) for key, entry in restored.items() if key not in seen)
+    logger.info(f"Verified {len(restored)} restored IngressRoutes, dropped {dropped} deleted since the snapshot")
+    return dropped
+
+def snapshot_writer():
+    ingress_route_cache.synced.wait()
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL)
+        try:
+            save_snapshot()
+        except Exception as e:
+            logger.warning(f"Could not save snapshot to {snapshot_store}: {str(e)}")
 
 @kopf.on.startup()
-def start_service_watch(**_):
-    logger.info("Starting service watch in background thread")
-    watch_thread = threading.Thread(target=watch_service, daemon=True)
-    watch_thread.start()
+async def start_service_watch(**_):
+    global snapshot_store, services_config_task
+    await start_health_server()
+    start_patch_workers()
+    
+    snapshot = None
+    snapshot_store = get_snapshot_store()
+    if snapshot_store is not None:
+        started = time.monotonic()
+        snapshot = await asyncio.to_thread(load_snapshot)
+        if snapshot:
+            restore_service_targets(snapshot)
+        record_startup_phase('snapshot_load', started)
+        threading.Thread(target=snapshot_writer, name="snapshot-writer", daemon=True).start()
+    
+    sharded = REPLICA_MODE in ('leader', 'sharded')
+    if not sharded and REPLICA_MODE != 'single':
+        logger.warning(f"Unknown REPLICA_MODE '{REPLICA_MODE}', running as a single replica")
+    
+    # Listing the IngressRoutes doesn't need the Service targets, only reconciling
+    # them does (routes wait on the readiness gate of their service), so a single
+    # replica runs its initial sync in the background alongside the Service LISTs
+    if not sharded and not snapshot:
+        logger.info("Starting initial sync in background thread")
+        sync_thread = threading.Thread(target=sync_all_existing_ingress_routes, daemon=True)
+        sync_thread.start()
+    
+    logger.info("Starting service watch on the operator event loop")
+    started = time.monotonic()
+    await watch_service(snapshot['service_watches'] if snapshot else None)
+    record_startup_phase('service_init', started)
+    if SERVICES_CONFIG_FILE and SERVICES_CONFIG_RELOAD_INTERVAL > 0:
+        services_config_task = asyncio.create_task(watch_services_config(), name="services-config-watch")
     
-    logger.info("Starting health check server in background thread")
-    health_thread = threading.Thread(target=start_health_server, daemon=True)
-    health_thread.start()
+    threading.Thread(target=drift_reconciler, name="drift-reconciler", daemon=True).start()
     
-    # Perform initial sync of all IngressRoutes in background
-    logger.info("Starting initial sync in background thread")
-    sync_thread = threading.Thread(target=sync_all_existing_ingress_routes, daemon=True)
-    sync_thread.start()
+    if sharded:
+        # The initial sync runs once this replica acquires its Lease(s)
+        await start_shard_elector()
+        return
+    
+    # Only a single replica restores routes: in the other modes the Lease holder may
+    # change while the snapshot ages, and a new owner always lists its routes
+    if snapshot:
+        restored = restore_ingress_routes(snapshot)
+        threading.Thread(target=verify_restored_routes, args=(restored,), name="snapshot-verify", daemon=True).start()
+
+@kopf.on.cleanup()
+async def stop_service_watch(**_):
+    """Release our Leases, cancel the Service watch tasks and save the snapshot on shutdown."""
+    await stop_shard_elector()
+    if services_config_task is not None:
+        services_config_task.cancel()
+        await asyncio.gather(services_config_task, return_exceptions=True)
+    for task in service_watch_tasks.values():
+        task.cancel()
+    await asyncio.gather(*service_watch_tasks.values(), return_exceptions=True)
+    service_watch_tasks.clear()
+    if async_api_client is not None:
+        await async_api_client.close()
+    await stop_health_server()
+    if snapshot_store is not None and ingress_route_cache.synced.is_set():
+        try:
+            await asyncio.to_thread(save_snapshot)
+        except Exception as e:
+            logger.warning(f"Could not save snapshot to {snapshot_store}: {str(e)}")
+
+def load_kube_config():
+    try:
+        kubernetes.config.load_incluster_config()
+        logger.info("In-cluster configuration loaded")
+    except kubernetes.config.ConfigException:
+        kubernetes.config.load_kube_config()
+        logger.info("Local configuration (kubeconfig) loaded")
+    init_api_clients()
 
 def main():
     """Main entry point for the controller."""
     logger.info("Traefik External DNS Controller starting...")
+    init_tracing()
     
     # Set environment variable to avoid user detection issues
     os.environ['KOPF_IDENTITY'] = 'traefik-external-dns-controller'
     
+    # kopf watches every resource that has a handler, so the API groups have to be
+    # known (and aliases collapsed) before the handlers are registered
+    started = time.monotonic()
+    load_kube_config()
+    record_startup_phase('kube_config', started)
+    started = time.monotonic()
+    detect_traefik_api_groups()
+    record_startup_phase('api_discovery', started)
+    register_ingressroute_handlers()
+    
     # Run the kopf operator
     try:
         kopf.run(
-            clusterwide=True,
-            standalone=True
+            standalone=True,
+            **get_watch_scope()
         )
     except KeyboardInterrupt:
         logger.info("Controller shutting down gracefully")
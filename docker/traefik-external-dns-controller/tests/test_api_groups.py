@@ -0,0 +1,100 @@
+"""Traefik API group detection: discovery, then telling aliased groups apart by route UIDs."""
+from collections import Counter
+from types import SimpleNamespace
+
+import controller
+import pytest
+from kubernetes.client.exceptions import ApiException
+
+IO, CONTAINOUS = 'traefik.io', 'traefik.containo.us'
+
+
+class FakeApisApi:
+    def __init__(self, served, calls):
+        self.served = served
+        self.calls = calls
+
+    def get_api_versions(self, **_):
+        self.calls['discovery'] += 1
+        if self.served is None:
+            raise ApiException(status=503)
+        return SimpleNamespace(groups=[
+            SimpleNamespace(name=group, versions=[SimpleNamespace(version=version) for version in versions])
+            for group, versions in self.served.items()
+        ])
+
+
+class FakeCustomObjectsApi:
+    def __init__(self, uids, calls):
+        self.uids = uids   # {group: [route UIDs]}; groups missing here are not served
+        self.calls = calls
+
+    def list_cluster_custom_object(self, group, version, plural, limit=None, **_):
+        self.calls[f'list {group}'] += 1
+        if group not in self.uids:
+            raise ApiException(status=404)
+        return {'items': [{'metadata': {'uid': uid}} for uid in self.uids[group][:limit]]}
+
+
+@pytest.fixture
+def cluster(monkeypatch):
+    calls = Counter()
+    monkeypatch.setattr(controller, 'served_api_groups', None)
+    monkeypatch.setattr(controller, 'active_api_groups', [])
+
+    def serve(discovery, uids):
+        monkeypatch.setattr(controller, 'ApisApi', lambda api_client: FakeApisApi(discovery, calls))
+        monkeypatch.setattr(controller, 'custom_objects_api', FakeCustomObjectsApi(uids, calls))
+        return calls
+    return serve
+
+
+def test_separate_groups_are_both_kept(cluster):
+    calls = cluster({IO: ['v1alpha1'], CONTAINOUS: ['v1alpha1'], 'apps': ['v1']},
+                    {IO: ['a', 'b'], CONTAINOUS: ['c']})
+
+    assert controller.detect_traefik_api_groups() == [IO, CONTAINOUS]
+    assert calls == {'discovery': 1, f'list {IO}': 1, f'list {CONTAINOUS}': 1}
+
+
+def test_aliased_groups_keep_only_the_preferred_one(cluster):
+    cluster({IO: ['v1alpha1'], CONTAINOUS: ['v1alpha1']}, {IO: ['a', 'b'], CONTAINOUS: ['b', 'a']})
+
+    assert controller.detect_traefik_api_groups() == [IO]
+    assert controller.active_api_groups == [IO]
+
+
+def test_single_served_group_is_used_without_listing(cluster):
+    calls = cluster({CONTAINOUS: ['v1alpha1'], 'apps': ['v1']}, {})
+
+    assert controller.detect_traefik_api_groups() == [CONTAINOUS]
+    assert calls == {'discovery': 1}
+
+
+def test_group_without_the_traefik_version_is_not_served(cluster):
+    cluster({IO: ['v1'], CONTAINOUS: ['v1alpha1']}, {})
+
+    assert controller.detect_traefik_api_groups() == [CONTAINOUS]
+
+
+def test_no_traefik_groups(cluster):
+    cluster({'apps': ['v1']}, {})
+    assert controller.detect_traefik_api_groups() == []
+
+
+def test_failed_discovery_probes_every_group(cluster):
+    calls = cluster(None, {CONTAINOUS: ['a']})
+
+    assert controller.detect_traefik_api_groups() == [CONTAINOUS]
+    assert calls[f'list {IO}'] == calls[f'list {CONTAINOUS}'] == 1
+    # A failed discovery is not cached, so the next detection asks again
+    controller.detect_traefik_api_groups()
+    assert calls['discovery'] == 2
+
+
+def test_discovery_is_cached(cluster):
+    calls = cluster({IO: ['v1alpha1']}, {})
+
+    assert controller.discover_api_groups() == {IO: ['v1alpha1']}
+    controller.detect_traefik_api_groups()
+    assert calls['discovery'] == 1
@@ -0,0 +1,191 @@
+"""Reloading the service configuration in place."""
+import asyncio
+from types import SimpleNamespace
+
+import controller
+import pytest
+from fake_api import FakeCustomObjectsApi
+
+GROUP = 'traefik.io'
+ZONE = 'example.com/zone'
+TARGET = 'external-dns.alpha.kubernetes.io/target'
+PROXIED = 'external-dns.alpha.kubernetes.io/cloudflare-proxied'
+
+
+def service(name, annotations=None, default=False):
+    return {'namespace': 'traefik', 'name': name, 'priority': 100, 'default': default, 'annotations': annotations or {}}
+
+
+PUBLIC = service('public', default=True)
+EU = service('eu', {ZONE: 'eu'})
+DE = service('eu-2', {ZONE: 'de'})
+
+
+class FakeCoreApi:
+    def __init__(self, hostnames):
+        self.hostnames = hostnames   # {service name: LoadBalancer hostname}
+
+    async def read_namespaced_service(self, name, namespace):
+        if name not in self.hostnames:
+            raise controller.AsyncApiException(status=404)
+        ingress = [SimpleNamespace(hostname=self.hostnames[name], ip=None)]
+        return SimpleNamespace(status=SimpleNamespace(load_balancer=SimpleNamespace(ingress=ingress)))
+
+
+async def idle_watch(*_):
+    await asyncio.sleep(0)
+
+
+async def no_api_client():
+    return None
+
+
+def reload_metric(result):
+    return controller.REGISTRY.get_sample_value(
+        f'{controller.METRICS_PREFIX}_service_config_reloads_total', {'result': result}) or 0
+
+
+@pytest.fixture
+def cluster(monkeypatch):
+    core = FakeCoreApi({'public': 'public.lb.example.com', 'eu': 'eu.lb.example.com', 'eu-2': 'eu-2.lb.example.com'})
+    monkeypatch.setattr(controller, 'get_async_api_client', no_api_client)
+    monkeypatch.setattr(controller.async_client, 'CoreV1Api', lambda api_client: core)
+    monkeypatch.setattr(controller, 'watch_services', idle_watch)
+    monkeypatch.setattr(controller, 'active_api_groups', [GROUP])
+    monkeypatch.setattr(controller, 'service_targets', controller.ServiceTargetCache())
+    monkeypatch.setattr(controller, 'ingress_route_cache', controller.IngressRouteCache())
+    monkeypatch.setattr(controller, 'update_queue', controller.RateLimitedWorkQueue(0.01, 0.1))
+    monkeypatch.setattr(controller, 'service_watch_plan', {})
+    monkeypatch.setattr(controller, 'service_watch_tasks', {})
+    monkeypatch.setattr(controller, 'service_watch_seen', {})
+    monkeypatch.setattr(controller, 'service_watch_versions', {})
+    monkeypatch.setattr(controller, 'service_watch_active', False)
+    monkeypatch.setattr(controller, 'SERVICE_WATCH_MODE', 'service')
+    monkeypatch.setattr(controller, 'custom_objects_api', FakeCustomObjectsApi())
+    monkeypatch.setattr(controller, 'WATCH_NAMESPACES', [])
+    monkeypatch.setattr(controller, 'shard_elector', None)
+    monkeypatch.setattr(controller, 'startup_phases', {})
+
+    def configure(configs):
+        monkeypatch.setattr(controller, 'service_configs', configs)
+        monkeypatch.setattr(controller, 'service_matcher', controller.ServiceMatcher(configs))
+        monkeypatch.setattr(controller, 'service_index', controller.build_service_index(configs))
+        for service_type, config in configs.items():
+            controller.service_targets.set(service_type, core.hostnames[config['name']])
+    return configure
+
+
+def add_route(name, annotations):
+    controller.custom_objects_api.add(GROUP, 'apps', name, annotations)
+    return controller.ingress_route_cache.upsert(GROUP, {'namespace': 'apps', 'name': name, 'annotations': annotations})
+
+
+def queued():
+    keys = []
+    while controller.update_queue.qsize():
+        key, _ = controller.update_queue.get()
+        controller.update_queue.done(key)
+        keys.append(key)
+    return keys
+
+
+def reload(configs):
+    async def run():
+        await controller.reload_service_config(configs)
+        await asyncio.gather(*controller.service_watch_tasks.values())
+    asyncio.run(run())
+
+
+def test_added_service_is_primed_and_takes_over_its_routes(cluster):
+    cluster({'public': PUBLIC})
+    add_route('eu-app', {ZONE: 'eu', TARGET: 'public.lb.example.com', PROXIED: 'true'})
+    add_route('other-app', {TARGET: 'public.lb.example.com', PROXIED: 'true'})
+
+    reload({'public': PUBLIC, 'eu': EU})
+
+    # The cache did not keep the zone annotation, so the routes were listed again
+    assert controller.custom_objects_api.calls['list'] == 1
+    assert controller.service_targets.peek('eu') == 'eu.lb.example.com'
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'eu-app')['service_type'] == 'eu'
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'other-app')['service_type'] == 'public'
+    assert queued() == [(GROUP, 'apps', 'eu-app')]
+    assert set(controller.service_watch_plan) == {'public', 'eu'}
+
+
+def test_added_service_on_known_annotations_is_resolved_from_the_cache(cluster):
+    cluster({'public': PUBLIC, 'eu': EU})
+    add_route('de-app', {ZONE: 'de'})
+
+    reload({'public': PUBLIC, 'eu': EU, 'de': DE})
+
+    assert controller.custom_objects_api.calls['list'] == 0
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'de-app')['service_type'] == 'de'
+    assert queued() == [(GROUP, 'apps', 'de-app')]
+
+
+def test_removed_service_is_forgotten_and_its_routes_fall_back(cluster):
+    cluster({'public': PUBLIC, 'eu': EU})
+    add_route('eu-app', {ZONE: 'eu'})
+
+    reload({'public': PUBLIC})
+
+    assert controller.service_targets.peek('eu') is None
+    assert not controller.service_targets.is_ready('eu')
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'eu-app')['service_type'] == 'public'
+    assert queued() == [(GROUP, 'apps', 'eu-app')]
+    assert set(controller.service_watch_plan) == {'public'}
+
+
+def test_moved_service_resyncs_its_routes_to_the_new_target(cluster):
+    cluster({'public': PUBLIC, 'eu': EU})
+    add_route('eu-app', {ZONE: 'eu', TARGET: 'eu.lb.example.com'})
+
+    reload({'public': PUBLIC, 'eu': {**EU, 'name': 'eu-2'}})
+
+    assert controller.service_targets.peek('eu') == 'eu-2.lb.example.com'
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'eu-app')['service_type'] == 'eu'
+    assert queued() == [(GROUP, 'apps', 'eu-app')]
+    assert controller.service_watch_plan['eu'][1]['field_selector'] == 'metadata.name=eu-2'
+
+
+def test_unchanged_configuration_does_nothing(cluster):
+    cluster({'public': PUBLIC})
+    before = reload_metric('unchanged')
+
+    reload({'public': dict(PUBLIC)})
+
+    assert reload_metric('unchanged') == before + 1
+    assert controller.service_watch_plan == {}
+
+
+@pytest.mark.parametrize('text', ['{not json', '{"broken": {"name": "no-namespace"}}', '{}'])
+def test_invalid_configuration_keeps_the_current_one(cluster, monkeypatch, text):
+    cluster({'public': PUBLIC})
+    monkeypatch.setattr(controller, 'read_services_config', lambda: text)
+    monkeypatch.setattr(controller, 'services_config_text', '')
+    monkeypatch.setattr(controller, 'SERVICES_CONFIG_RELOAD_INTERVAL', 0)
+    before = reload_metric('invalid')
+
+    async def poll():
+        task = asyncio.create_task(controller.watch_services_config())
+        for _ in range(10):
+            await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    asyncio.run(poll())
+
+    # Read once: the same broken text is not reported again on every poll
+    assert reload_metric('invalid') == before + 1
+    assert controller.service_configs == {'public': PUBLIC}
+    assert controller.service_targets.peek('public') == 'public.lb.example.com'
+
+
+def test_first_valid_configuration_starts_the_service_watches(cluster):
+    cluster({})
+    asyncio.run(controller.watch_service())
+    assert not controller.readiness_checks()[0][1]
+
+    reload({'public': PUBLIC})
+
+    assert controller.readiness_checks()[0] == ('service-watches', True, 'started')
+    assert controller.service_targets.peek('public') == 'public.lb.example.com'
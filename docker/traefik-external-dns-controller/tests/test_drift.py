@@ -0,0 +1,64 @@
+"""Drift passes only list what this replica owns."""
+import controller
+import pytest
+from fake_api import FakeCustomObjectsApi
+
+GROUP = 'traefik.io'
+
+
+class StubElector:
+    def __init__(self, owned_namespaces):
+        self.owned = frozenset(owned_namespaces)
+
+    def owns(self, namespace):
+        return namespace in self.owned
+
+
+class StopLoop(Exception):
+    pass
+
+
+@pytest.fixture
+def cluster(monkeypatch):
+    api = FakeCustomObjectsApi()
+    for namespace in ('ns-0', 'ns-1'):
+        api.add(GROUP, namespace, 'route', {})
+    cache = controller.IngressRouteCache()
+    cache.synced.set()
+    monkeypatch.setattr(controller, 'custom_objects_api', api)
+    monkeypatch.setattr(controller, 'active_api_groups', [GROUP])
+    monkeypatch.setattr(controller, 'ingress_route_cache', cache)
+    monkeypatch.setattr(controller, 'service_targets', controller.ServiceTargetCache())
+    monkeypatch.setattr(controller, 'WATCH_NAMESPACES', ['ns-0', 'ns-1'])
+    return api
+
+
+def test_namespaces_of_other_replicas_are_not_listed(cluster, monkeypatch):
+    listed = []
+    list_namespaced = cluster.list_namespaced_custom_object
+    monkeypatch.setattr(cluster, 'list_namespaced_custom_object',
+                        lambda **kwargs: listed.append(kwargs['namespace']) or list_namespaced(**kwargs))
+    monkeypatch.setattr(controller, 'shard_elector', StubElector(['ns-1']))
+
+    _, checked = controller.reconcile_drift(0)
+
+    assert listed == ['ns-1']
+    assert checked == 1
+
+
+def test_replica_without_shards_skips_the_pass(cluster, monkeypatch):
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) > 2:
+            raise StopLoop
+    monkeypatch.setattr(controller.time, 'sleep', sleep)
+    monkeypatch.setattr(controller, 'DRIFT_RECONCILE_INTERVAL', 60)
+    monkeypatch.setattr(controller, 'WATCH_NAMESPACES', [])
+    monkeypatch.setattr(controller, 'shard_elector', StubElector([]))
+
+    with pytest.raises(StopLoop):
+        controller.drift_reconciler()
+
+    assert cluster.calls['list'] == 0
@@ -0,0 +1,133 @@
+"""Which IngressRoute events are dropped unevaluated, and which must still be evaluated."""
+import controller
+import pytest
+
+GROUP = 'traefik.io'
+ZONE = 'example.com/zone'
+TARGET = 'external-dns.alpha.kubernetes.io/target'
+PROXIED = 'external-dns.alpha.kubernetes.io/cloudflare-proxied'
+LB_TYPE = 'traefik.io/load-balancer-type'
+PUBLIC = 'public.lb.example.com'
+EU = 'eu.lb.example.com'
+CONFIGS = {
+    'public': {'namespace': 'traefik', 'name': 'public', 'priority': 100, 'default': True, 'annotations': {}},
+    'eu': {'namespace': 'traefik', 'name': 'eu', 'priority': 100, 'default': False, 'annotations': {ZONE: 'eu'}},
+}
+IN_SYNC = {TARGET: PUBLIC, PROXIED: 'true'}
+
+
+class StubElector:
+    def __init__(self, namespaces):
+        self.namespaces = set(namespaces)
+
+    def owns(self, namespace):
+        return namespace in self.namespaces
+
+
+@pytest.fixture(autouse=True)
+def state(monkeypatch):
+    monkeypatch.setattr(controller, 'service_configs', CONFIGS)
+    monkeypatch.setattr(controller, 'service_matcher', controller.ServiceMatcher(CONFIGS))
+    monkeypatch.setattr(controller, 'active_api_groups', [GROUP])
+    monkeypatch.setattr(controller, 'WATCH_NAMESPACES', [])
+    monkeypatch.setattr(controller, 'shard_elector', None)
+    monkeypatch.setattr(controller, 'ingressroute_label_requirements', [])
+    monkeypatch.setattr(controller, 'service_targets', controller.ServiceTargetCache())
+    monkeypatch.setattr(controller, 'ingress_route_cache', controller.IngressRouteCache())
+    monkeypatch.setattr(controller, 'update_queue', controller.RateLimitedWorkQueue(0.01, 0.1))
+    controller.service_targets.set('public', PUBLIC)
+    controller.service_targets.set('eu', EU)
+
+
+def results():
+    return {sample.labels['result']: sample.value
+            for metric in controller.INGRESSROUTE_EVENTS.collect() for sample in metric.samples
+            if sample.name.endswith('_total')}
+
+
+def event(annotations, resource_version, labels=None, event_type='MODIFIED', namespace='apps'):
+    """Deliver one event for apps/web and return its outcome."""
+    before = results()
+    body = {'metadata': {'namespace': namespace, 'name': 'web', 'resourceVersion': resource_version,
+                         'annotations': dict(annotations), 'labels': labels or {}}}
+    controller.handle_ingressroute_event('web', namespace, body, GROUP, event_type)
+    [outcome] = [result for result, value in results().items() if value != before.get(result, 0)]
+    return outcome
+
+
+def cached():
+    return controller.ingress_route_cache.get(GROUP, 'apps', 'web')
+
+
+def test_echoes_and_unrelated_edits_are_dropped_by_fingerprint():
+    assert event(IN_SYNC, '1') == 'in_sync'
+
+    assert event(IN_SYNC, '2') == 'skipped_fingerprint'
+    assert event({**IN_SYNC, 'unrelated/annotation': 'x'}, '3') == 'skipped_fingerprint'
+    assert cached()['resourceVersion'] == '3'
+
+
+def test_changed_decision_annotation_is_evaluated():
+    event(IN_SYNC, '1')
+
+    assert event({**IN_SYNC, ZONE: 'eu'}, '2') == 'queued'
+    assert cached()['service_type'] == 'eu'
+
+
+def test_changed_managed_annotation_is_evaluated():
+    event(IN_SYNC, '1')
+
+    assert event({**IN_SYNC, TARGET: 'edited.example.com'}, '2') == 'queued'
+    assert event({TARGET: PUBLIC}, '3') == 'queued'
+    assert event({**IN_SYNC, LB_TYPE: 'eu'}, '4') == 'queued'
+
+
+def test_changed_service_target_is_evaluated():
+    event(IN_SYNC, '1')
+    controller.service_targets.set('public', 'new.lb.example.com')
+
+    assert event(IN_SYNC, '2') == 'queued'
+    assert controller.update_queue.qsize() == 1
+
+
+def test_unchanged_resource_version_of_a_restored_route_is_skipped_only_on_its_target():
+    controller.ingress_route_cache.restore(GROUP, 'apps', 'web', '5', 'public', IN_SYNC)
+    assert event({**IN_SYNC, 'other': 'x'}, '5') == 'skipped_resource_version'
+    # The annotations were cached, so the fingerprint path works from now on
+    assert cached()['annotations'] == IN_SYNC
+    assert event({**IN_SYNC, 'other': 'x'}, '6') == 'skipped_fingerprint'
+
+    controller.ingress_route_cache.restore(GROUP, 'apps', 'web', '7', 'public', {TARGET: 'old.lb.example.com', PROXIED: 'true'})
+    assert event({TARGET: 'old.lb.example.com', PROXIED: 'true'}, '7') == 'queued'
+
+
+def test_route_leaving_the_label_scope_is_forgotten(monkeypatch):
+    monkeypatch.setattr(controller, 'ingressroute_label_requirements', controller.parse_label_selector('dns=managed'))
+    assert event(IN_SYNC, '1', labels={'dns': 'managed'}) == 'in_sync'
+
+    assert event(IN_SYNC, '2', labels={}) == 'ignored'
+    assert cached() is None
+    assert event(IN_SYNC, '3', labels={'dns': 'managed'}) == 'in_sync'
+
+
+def test_route_in_a_namespace_we_no_longer_own_is_forgotten(monkeypatch):
+    monkeypatch.setattr(controller, 'shard_elector', StubElector(['apps']))
+    assert event(IN_SYNC, '1') == 'in_sync'
+
+    controller.shard_elector.namespaces.clear()
+    assert event(IN_SYNC, '2') == 'ignored'
+    assert cached() is None
+
+
+def test_only_decision_annotations_are_cached():
+    last_applied = 'kubectl.kubernetes.io/last-applied-configuration'
+    event({**IN_SYNC, ZONE: 'us', last_applied: '{"large": "object"}'}, '1')
+
+    assert cached()['annotations'] == {**IN_SYNC, ZONE: 'us'}
+
+
+def test_deleted_route_is_dropped_from_the_cache():
+    event(IN_SYNC, '1')
+
+    assert event(IN_SYNC, '2', event_type='DELETED') == 'deleted'
+    assert cached() is None
@@ -0,0 +1,94 @@
+"""/livez and /readyz verdicts."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import controller
+import pytest
+
+
+def task(done=False, cancelled=False):
+    return SimpleNamespace(done=lambda: done, cancelled=lambda: cancelled)
+
+
+def worker(alive=True):
+    return SimpleNamespace(is_alive=lambda: alive)
+
+
+def probe(handler):
+    response = asyncio.run(handler(None))
+    return response.status, response.text
+
+
+@pytest.fixture(autouse=True)
+def healthy(monkeypatch):
+    cache = controller.IngressRouteCache()
+    cache.synced.set()
+    monkeypatch.setattr(controller, 'service_watch_tasks', {'public': task()})
+    monkeypatch.setattr(controller, 'service_watch_seen', {'public': time.monotonic()})
+    monkeypatch.setattr(controller, 'service_watch_active', True)
+    monkeypatch.setattr(controller, 'patch_workers', [worker(), worker()])
+    monkeypatch.setattr(controller, 'ingress_route_cache', cache)
+    monkeypatch.setattr(controller, 'update_queue', controller.RateLimitedWorkQueue(1, 1))
+    monkeypatch.setattr(controller, 'READINESS_WATCH_MAX_AGE', 600)
+    monkeypatch.setattr(controller, 'READINESS_MAX_QUEUE_DEPTH', 2)
+
+
+def test_healthy_replica_is_live_and_ready():
+    status, text = probe(controller.handle_livez)
+    assert status == 200
+    assert text.endswith("ok\n")
+    assert "[+]patch-workers 2/2 alive\n" in text
+
+    status, text = probe(controller.handle_readyz)
+    assert status == 200
+    assert text.splitlines()[0] == "[+]service-watches started"
+
+
+@pytest.mark.parametrize('broken', [
+    lambda: controller.service_watch_tasks.update(public=task(done=True)),
+    lambda: controller.patch_workers.append(worker(alive=False)),
+])
+def test_dead_watch_task_or_worker_fails_liveness(broken):
+    broken()
+
+    status, text = probe(controller.handle_livez)
+
+    assert status == 503
+    assert text.endswith("failed\n")
+
+
+def test_cancelled_watch_task_is_not_dead():
+    controller.service_watch_tasks['public'] = task(done=True, cancelled=True)
+
+    assert probe(controller.handle_livez)[0] == 200
+
+
+def test_recoverable_problems_only_fail_readiness(monkeypatch):
+    monkeypatch.setattr(controller, 'service_watch_seen', {'public': time.monotonic() - 601})
+    controller.ingress_route_cache.synced.clear()
+    for name in ('a', 'b', 'c'):
+        controller.update_queue.add(('traefik.io', 'apps', name))
+
+    assert probe(controller.handle_livez)[0] == 200
+    status, text = probe(controller.handle_readyz)
+    assert status == 503
+    assert "[-]service-watch public last seen 601s ago\n" in text
+    assert "[-]ingressroute-cache initial sync running\n" in text
+    assert "[-]queue 3 pending\n" in text
+
+
+def test_service_watches_not_started(monkeypatch):
+    monkeypatch.setattr(controller, 'service_watch_active', False)
+
+    status, text = probe(controller.handle_readyz)
+    assert status == 503
+    assert "[-]service-watches not started\n" in text
+
+
+def test_queue_depth_check_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(controller, 'READINESS_MAX_QUEUE_DEPTH', 0)
+    for name in ('a', 'b', 'c'):
+        controller.update_queue.add(('traefik.io', 'apps', name))
+
+    assert probe(controller.handle_readyz)[0] == 200
@@ -0,0 +1,78 @@
+"""The initial sync must complete its batch even if the listing returns a route twice."""
+import controller
+import pytest
+from fake_api import FakeCustomObjectsApi
+from kubernetes.client.exceptions import ApiException
+
+GROUP = 'traefik.io'
+SELECTOR = 'test.example.com/lb'
+TARGET = 'external-dns.alpha.kubernetes.io/target'
+
+
+class ExpiringContinueApi(FakeCustomObjectsApi):
+    """Answers 410 Gone the first time the listing asks for the page at expire_at."""
+    def __init__(self, expire_at):
+        super().__init__()
+        self.expire_at = expire_at
+        self.expired = False
+
+    def _list(self, group, namespace, limit, continue_token):
+        if continue_token == self.expire_at and not self.expired:
+            self.expired = True
+            raise ApiException(status=410, reason='Gone')
+        return super()._list(group, namespace, limit, continue_token)
+
+
+@pytest.fixture
+def cluster(monkeypatch):
+    api = ExpiringContinueApi(expire_at='4')
+    for i in range(6):
+        api.add(GROUP, f"ns-{i % 2}", f"route-{i}", {SELECTOR: 'public', TARGET: 'old.lb.example.com'})
+
+    service_targets = controller.ServiceTargetCache()
+    service_targets.set('public', 'public.lb.example.com')
+    configs = {'public': {'namespace': 'traefik', 'name': 'lb', 'priority': 100, 'default': False,
+                          'annotations': {SELECTOR: 'public'}}}
+    monkeypatch.setattr(controller, 'custom_objects_api', api)
+    monkeypatch.setattr(controller, 'active_api_groups', [GROUP])
+    monkeypatch.setattr(controller, 'service_configs', configs)
+    monkeypatch.setattr(controller, 'service_matcher', controller.ServiceMatcher(configs))
+    monkeypatch.setattr(controller, 'service_targets', service_targets)
+    monkeypatch.setattr(controller, 'ingress_route_cache', controller.IngressRouteCache())
+    monkeypatch.setattr(controller, 'update_queue', controller.RateLimitedWorkQueue(0.01, 0.1))
+    monkeypatch.setattr(controller, 'startup_phases', {})
+    monkeypatch.setattr(controller, 'INGRESSROUTE_PAGE_SIZE', 2)
+    monkeypatch.setattr(controller, 'WATCH_NAMESPACES', [])
+    return api
+
+
+def drain(queue):
+    batches = set()
+    while queue.qsize():
+        key, progress = queue.get()
+        for batch in progress:
+            batch.item_done(False)
+            batches.add(batch)
+        queue.done(key)
+    return batches
+
+
+def test_restarted_listing_completes_the_batch(cluster):
+    controller.sync_all_existing_ingress_routes()
+
+    assert cluster.expired
+    [batch] = drain(controller.update_queue)
+    assert batch.total == 6
+    assert batch.done == batch.total
+    assert {'initial_sync', 'total'} <= set(controller.startup_phases)
+
+
+def test_duplicate_namespaces_are_listed_once(cluster, monkeypatch):
+    monkeypatch.setattr(controller, 'WATCH_NAMESPACES', ['ns-0', 'ns-1', 'ns-0'])
+    assert controller.get_list_namespaces() == ['ns-0', 'ns-1']
+
+    controller.sync_all_existing_ingress_routes()
+
+    [batch] = drain(controller.update_queue)
+    assert batch.done == batch.total == 6
+    assert 'initial_sync' in controller.startup_phases
@@ -0,0 +1,72 @@
+"""parse_label_selector and labels_match follow Kubernetes label selector semantics."""
+import controller
+import pytest
+
+
+def matches(selector, labels):
+    return controller.labels_match(controller.parse_label_selector(selector), labels)
+
+
+@pytest.mark.parametrize('selector, labels, expected', [
+    # Equality: = and == need the key with that value, != also matches a missing key
+    ('tier=web', {'tier': 'web'}, True),
+    ('tier==web', {'tier': 'web'}, True),
+    ('tier=web', {'tier': 'db'}, False),
+    ('tier=web', {}, False),
+    ('tier!=web', {'tier': 'db'}, True),
+    ('tier!=web', {'tier': 'web'}, False),
+    ('tier!=web', {}, True),
+    ('tier=', {'tier': ''}, True),
+    ('tier=', {}, False),
+    # Set: in needs the key, notin also matches a missing key
+    ('env in (prod, staging)', {'env': 'staging'}, True),
+    ('env in (prod,staging)', {'env': 'dev'}, False),
+    ('env in (prod)', {}, False),
+    ('env notin (prod, staging)', {'env': 'dev'}, True),
+    ('env notin (prod, staging)', {'env': 'prod'}, False),
+    ('env notin (prod)', {}, True),
+    # Exists and does not exist, whatever the value
+    ('public', {'public': ''}, True),
+    ('public', {'other': 'x'}, False),
+    ('!public', {'public': 'false'}, False),
+    ('!public', {}, True),
+    # Requirements are ANDed; commas inside a set do not split terms
+    ('env in (prod, staging),tier!=db,public', {'env': 'prod', 'tier': 'web', 'public': 'true'}, True),
+    ('env in (prod, staging),tier!=db,public', {'env': 'prod', 'tier': 'db', 'public': 'true'}, False),
+    ('example.com/team=core, !example.com/legacy', {'example.com/team': 'core'}, True),
+    # An empty selector selects everything
+    ('', {}, True),
+    (None, {'any': 'thing'}, True),
+])
+def test_labels_match(selector, labels, expected):
+    assert matches(selector, labels) is expected
+
+
+def test_labels_none_is_empty():
+    assert matches('!public', None)
+    assert not matches('public', None)
+
+
+def test_parsed_requirements():
+    assert controller.parse_label_selector('a=b, c notin (x, y), d, !e') == [
+        ('a', 'in', frozenset(['b'])),
+        ('c', 'notin', frozenset(['x', 'y'])),
+        ('d', 'exists', None),
+        ('e', '!', None),
+    ]
+
+
+@pytest.mark.parametrize('selector', [
+    'a in ()',
+    'a notin ( )',
+    'a in',
+    'a in (b',
+    'a in (b c)',
+    '=b',
+    'a b',
+    'a=b=c',
+    'a>1',
+])
+def test_invalid_selectors_are_rejected(selector):
+    with pytest.raises(ValueError):
+        controller.parse_label_selector(selector)
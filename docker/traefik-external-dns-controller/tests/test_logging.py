@@ -0,0 +1,66 @@
+"""JSON log records and sampling of bulk route updates."""
+import json
+import logging
+import sys
+
+import controller
+
+
+def record(message, *args, exc_info=None, **extra):
+    return logging.getLogger('external-dns-controller').makeRecord(
+        'external-dns-controller', logging.INFO, __file__, 1, message, args, exc_info, extra=extra)
+
+
+def test_json_record_has_the_standard_fields_and_extras():
+    formatter = controller.JsonFormatter(datefmt='%Y-%m-%dT%H:%M:%S%z')
+
+    entry = json.loads(formatter.format(record("Updating %s/%s", 'apps', 'web', namespace='apps', ingressroute='web',
+                                               service_type='public')))
+
+    assert set(entry) == {'time', 'level', 'logger', 'message', 'namespace', 'ingressroute', 'service_type'}
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'external-dns-controller'
+    assert entry['message'] == 'Updating apps/web'
+    assert (entry['namespace'], entry['ingressroute'], entry['service_type']) == ('apps', 'web', 'public')
+
+
+def test_json_record_includes_exceptions_and_stringifies_other_values():
+    formatter = controller.JsonFormatter()
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        exc_info = sys.exc_info()
+
+    entry = json.loads(formatter.format(record("Failed", exc_info=exc_info, targets={'a'})))
+
+    assert 'ValueError: boom' in entry['exception']
+    assert entry['targets'] == "{'a'}"
+
+
+def test_sampler_lets_through_the_first_of_every_n():
+    sampler = controller.LogSampler(3)
+
+    assert [sampler.sample() for _ in range(7)] == [True, False, False, True, False, False, True]
+
+
+def test_bulk_updates_are_logged_at_info_only_when_sampled(monkeypatch):
+    cache = controller.IngressRouteCache()
+    cache.upsert('traefik.io', {'namespace': 'apps', 'name': 'web', 'annotations': {}})
+    service_targets = controller.ServiceTargetCache()
+    service_targets.set('public', 'lb.example.com')
+    configs = {'public': {'namespace': 'traefik', 'name': 'lb', 'priority': 100, 'default': True, 'annotations': {}}}
+    monkeypatch.setattr(controller, 'service_configs', configs)
+    monkeypatch.setattr(controller, 'service_matcher', controller.ServiceMatcher(configs))
+    monkeypatch.setattr(controller, 'ingress_route_cache', cache)
+    cache.reindex()
+    monkeypatch.setattr(controller, 'service_targets', service_targets)
+    monkeypatch.setattr(controller, 'shard_elector', None)
+    monkeypatch.setattr(controller, 'route_log_sampler', controller.LogSampler(2))
+    levels = []
+    monkeypatch.setattr(controller, 'update_ingress_route',
+                        lambda group, namespace, name, hostname, service_type, log_level: levels.append(log_level))
+
+    for bulk in (True, True, True, False, False):
+        controller.reconcile_ingress_route('traefik.io', 'apps', 'web', bulk=bulk)
+
+    assert levels == [logging.INFO, logging.DEBUG, logging.INFO, logging.INFO, logging.INFO]
@@ -0,0 +1,127 @@
+"""IngressRoute patch bodies and caching of the PATCH response."""
+import controller
+import pytest
+from kubernetes.client.exceptions import ApiException
+
+GROUP = 'traefik.io'
+TARGET = 'external-dns.alpha.kubernetes.io/target'
+PROXIED = 'external-dns.alpha.kubernetes.io/cloudflare-proxied'
+LB_TYPE = 'traefik.io/load-balancer-type'
+HOSTNAME = 'lb.example.com'
+
+
+def test_merge_patch_sets_target_and_missing_proxied(monkeypatch):
+    monkeypatch.setattr(controller, 'PATCH_MODE', 'merge')
+
+    body, options = controller.build_ingress_route_patch(GROUP, 'apps', 'web', HOSTNAME, {LB_TYPE: 'public'})
+
+    assert body == {'metadata': {'annotations': {TARGET: HOSTNAME, PROXIED: 'true'}}}
+    assert options == {'_content_type': 'application/merge-patch+json'}
+
+
+def test_merge_patch_leaves_existing_proxied_alone(monkeypatch):
+    monkeypatch.setattr(controller, 'PATCH_MODE', 'merge')
+
+    body, _ = controller.build_ingress_route_patch(GROUP, 'apps', 'web', HOSTNAME, {PROXIED: 'false', TARGET: 'old'})
+
+    assert body == {'metadata': {'annotations': {TARGET: HOSTNAME}}}
+
+
+@pytest.mark.parametrize('annotations, proxied', [({}, 'true'), ({PROXIED: 'false'}, 'false')])
+def test_apply_patch_always_sends_every_managed_annotation(monkeypatch, annotations, proxied):
+    monkeypatch.setattr(controller, 'PATCH_MODE', 'apply')
+
+    body, options = controller.build_ingress_route_patch(GROUP, 'apps', 'web', HOSTNAME, {LB_TYPE: 'public', **annotations})
+
+    assert body == {
+        'apiVersion': f"{GROUP}/{controller.TRAEFIK_VERSION}",
+        'kind': 'IngressRoute',
+        'metadata': {'name': 'web', 'namespace': 'apps', 'annotations': {TARGET: HOSTNAME, PROXIED: proxied}},
+    }
+    assert options == {'field_manager': controller.PATCH_FIELD_MANAGER, 'force': True,
+                       '_content_type': 'application/apply-patch+yaml'}
+
+
+@pytest.mark.parametrize('version, other, newer', [
+    ('11', '9', True), ('9', '11', False), ('10', '10', False), (None, '10', False), ('10', None, False), ('abc', '1', False),
+])
+def test_resource_version_newer(version, other, newer):
+    assert controller.resource_version_newer(version, other) is newer
+
+
+class PatchApi:
+    """Answers a PATCH with the patched metadata at resource_version, running during() first."""
+    def __init__(self, resource_version, during=None, status=None):
+        self.annotations = {TARGET: 'old'}
+        self.resource_version = resource_version
+        self.during = during
+        self.status = status
+
+    def patch_namespaced_custom_object(self, group, version, namespace, plural, name, body, **_):
+        if self.during:
+            self.during()
+        if self.status:
+            raise ApiException(status=self.status)
+        annotations = {**self.annotations, **body['metadata']['annotations']}
+        return {'metadata': {'namespace': namespace, 'name': name, 'resourceVersion': self.resource_version, 'annotations': annotations}}
+
+
+@pytest.fixture
+def cached(monkeypatch):
+    monkeypatch.setattr(controller, 'PATCH_MODE', 'merge')
+    monkeypatch.setattr(controller, 'ingress_route_cache', controller.IngressRouteCache())
+    monkeypatch.setattr(controller, 'api_write_limiter', controller.TokenBucket(0, 1))
+    return controller.ingress_route_cache.upsert(
+        GROUP, {'namespace': 'apps', 'name': 'web', 'resourceVersion': '5', 'annotations': {TARGET: 'old'}})
+
+
+def patch(monkeypatch, api):
+    monkeypatch.setattr(controller, 'custom_objects_api', api)
+    return controller.update_ingress_route(GROUP, 'apps', 'web', HOSTNAME, 'public')
+
+
+def watch_event(resource_version, annotations):
+    return lambda: controller.ingress_route_cache.upsert(
+        GROUP, {'namespace': 'apps', 'name': 'web', 'resourceVersion': resource_version, 'annotations': annotations})
+
+
+def test_response_replaces_older_entry_and_marks_it_synced(cached, monkeypatch):
+    assert patch(monkeypatch, PatchApi('6'))
+
+    entry = controller.ingress_route_cache.get(GROUP, 'apps', 'web')
+    assert entry['resourceVersion'] == '6'
+    assert entry['annotations'] == {TARGET: HOSTNAME, PROXIED: 'true'}
+    assert entry['synced_target'] == HOSTNAME
+
+
+def test_newer_watch_event_is_not_overwritten_by_the_response(cached, monkeypatch):
+    # Someone edits the route after our PATCH; the watch delivers it before the response is handled
+    edited = {TARGET: HOSTNAME, PROXIED: 'false', 'owner': 'someone'}
+    api = PatchApi('6', during=watch_event('7', edited))
+
+    assert patch(monkeypatch, api)
+
+    entry = controller.ingress_route_cache.get(GROUP, 'apps', 'web')
+    assert entry['resourceVersion'] == '7'
+    assert entry['annotations'] == {TARGET: HOSTNAME, PROXIED: 'false'}
+
+
+def test_route_deleted_meanwhile_is_not_brought_back(cached, monkeypatch):
+    api = PatchApi('6', during=lambda: controller.ingress_route_cache.delete(GROUP, 'apps', 'web'))
+
+    assert patch(monkeypatch, api)
+
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'web') is None
+
+
+def test_route_gone_on_the_server_is_dropped(cached, monkeypatch):
+    assert not patch(monkeypatch, PatchApi('6', status=404))
+
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'web') is None
+
+
+def test_other_api_errors_are_raised_for_retry(cached, monkeypatch):
+    with pytest.raises(ApiException):
+        patch(monkeypatch, PatchApi('6', status=409))
+
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'web') is cached
@@ -0,0 +1,67 @@
+"""ServiceMatcher resolves routes exactly like the per-route scan it replaced."""
+import random
+
+import controller
+import pytest
+from bench_matcher import legacy_determine_service_type, make_configs, make_routes
+
+
+def config(annotations=None, priority=100, default=False):
+    return {'namespace': 'traefik', 'name': 'lb', 'priority': priority, 'default': default,
+            'annotations': annotations or {}}
+
+
+@pytest.mark.parametrize('services', [1, 5, 50])
+def test_equivalent_to_legacy_scan(services):
+    configs = make_configs(services)
+    routes = make_routes(2000, configs, random.Random(services))
+    matcher = controller.ServiceMatcher(configs)
+
+    for annotations in routes:
+        assert matcher.resolve(annotations) == legacy_determine_service_type(annotations, configs), annotations
+
+
+def test_lower_priority_number_wins():
+    configs = {'internal': config({'example.com/zone': 'eu'}, 200),
+               'public': config({'example.com/zone': 'eu'}, 10)}
+
+    assert controller.ServiceMatcher(configs).resolve({'example.com/zone': 'eu'}) == 'public'
+
+
+def test_configuration_order_breaks_priority_ties():
+    configs = {'internal': config({'example.com/zone': 'eu'}),
+               'public': config({'example.com/zone': 'eu'})}
+
+    assert controller.ServiceMatcher(configs).resolve({'example.com/zone': 'eu'}) == 'internal'
+
+
+def test_every_required_annotation_must_match_case_insensitively():
+    configs = {'public': config(default=True),
+               'internal': config({'example.com/zone': 'EU', 'example.com/tier': 'internal'})}
+    matcher = controller.ServiceMatcher(configs)
+
+    assert matcher.resolve({'example.com/zone': 'eu', 'example.com/tier': 'Internal'}) == 'internal'
+    assert matcher.resolve({'example.com/zone': 'eu'}) == 'public'
+
+
+def test_explicit_load_balancer_type_overrides_annotations():
+    configs = {'public': config(default=True), 'internal': config({'example.com/zone': 'eu'})}
+    matcher = controller.ServiceMatcher(configs)
+
+    assert matcher.resolve({'traefik.io/load-balancer-type': 'Public', 'example.com/zone': 'eu'}) == 'public'
+    assert matcher.resolve({'traefik.io/load-balancer-type': 'unknown', 'example.com/zone': 'eu'}) == 'internal'
+
+
+def test_empty_required_value_matches_missing_annotation():
+    configs = {'public': config(default=True), 'plain': config({'example.com/proxied': ''})}
+
+    for annotations in ({}, {'example.com/proxied': ''}, {'example.com/proxied': 'true'}):
+        assert (controller.ServiceMatcher(configs).resolve(annotations)
+                == legacy_determine_service_type(annotations, configs))
+
+
+def test_fallbacks():
+    no_default = {'first': config({'example.com/zone': 'eu'}), 'second': config({'example.com/zone': 'us'})}
+
+    assert controller.ServiceMatcher(no_default).resolve({}) == 'first'
+    assert controller.ServiceMatcher({}).resolve({}) is None
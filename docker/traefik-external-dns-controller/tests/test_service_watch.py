@@ -0,0 +1,37 @@
+"""Readiness gates of the services a Service watch covers."""
+import asyncio
+
+import controller
+import pytest
+
+
+class FailingCoreApi:
+    async def list_namespaced_service(self, **_):
+        raise ConnectionError('connection refused')
+
+
+async def idle_watch(*_):
+    await asyncio.sleep(0)
+
+
+@pytest.fixture
+def watch_state(monkeypatch):
+    configs = {'public': {'namespace': 'traefik', 'name': 'lb', 'priority': 100, 'default': True, 'annotations': {}}}
+    monkeypatch.setattr(controller, 'service_configs', configs)
+    monkeypatch.setattr(controller, 'service_index', {('traefik', 'lb'): ['public']})
+    monkeypatch.setattr(controller, 'service_targets', controller.ServiceTargetCache())
+    monkeypatch.setattr(controller, 'service_watch_tasks', {})
+    monkeypatch.setattr(controller, 'service_watch_seen', {})
+    monkeypatch.setattr(controller, 'watch_services', idle_watch)
+
+
+def test_failed_initial_list_opens_the_gates(watch_state):
+    async def start():
+        await controller.start_service_watch_task(
+            FailingCoreApi(), 'traefik', 'list_namespaced_service', {'namespace': 'traefik'}, ['public'])
+        await controller.service_watch_tasks['traefik']
+
+    asyncio.run(start())
+
+    assert controller.service_targets.is_ready('public')
+    assert controller.service_targets.get('public', timeout=0) is None
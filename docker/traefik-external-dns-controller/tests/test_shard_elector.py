@@ -0,0 +1,175 @@
+"""Leader election and shard ownership against an in-process Lease API."""
+import asyncio
+import threading
+
+import controller
+import pytest
+from bench_sharding import FakeCoordinationV1Api
+
+LEASE = 'test-lease'
+
+
+def elector(api, identity, shard_count=1, **callbacks):
+    return controller.ShardElector(api, 'default', identity, shard_count, lease_name=LEASE,
+                                   duration=15, renew_deadline=10, retry_period=2, **callbacks)
+
+
+def age_observations(*electors):
+    """Pretend every Lease record these electors have seen went unrenewed for longer than its duration."""
+    for e in electors:
+        for name, (record, seen) in e._observed.items():
+            e._observed[name] = (record, seen - 1000)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_acquire_creates_the_lease():
+    api = FakeCoordinationV1Api()
+    acquired = []
+    a = elector(api, 'a', on_acquire=acquired.append)
+
+    run(a.step())
+
+    assert a.owned == {0}
+    assert acquired == [{0}]
+    assert api.leases[LEASE].spec.holder_identity == 'a'
+    assert a.owns('any-namespace')
+
+
+def test_renew_keeps_the_lease_without_a_transition():
+    api = FakeCoordinationV1Api()
+    a = elector(api, 'a')
+    run(a.step())
+    acquired_at = api.leases[LEASE].spec.acquire_time
+    version = api.leases[LEASE].metadata.resource_version
+
+    run(a.step())
+
+    lease = api.leases[LEASE]
+    assert a.owned == {0}
+    assert lease.metadata.resource_version != version
+    assert lease.spec.acquire_time == acquired_at
+    assert lease.spec.lease_transitions == 0
+
+
+def test_held_lease_is_taken_over_only_after_it_expires():
+    api = FakeCoordinationV1Api()
+    released = []
+    a = elector(api, 'a', on_release=released.append)
+    b = elector(api, 'b')
+    run(a.step())
+
+    run(b.step())
+    run(b.step())
+    assert b.owned == frozenset()
+
+    # a stops renewing; b judges expiry from when it first saw the unchanged record
+    age_observations(b)
+    run(b.step())
+    assert b.owned == {0}
+    assert api.leases[LEASE].spec.holder_identity == 'b'
+    assert api.leases[LEASE].spec.lease_transitions == 1
+
+    run(a.step())
+    assert a.owned == frozenset()
+    assert released == [{0}]
+
+
+def test_conflicting_update_loses_the_race():
+    api = FakeCoordinationV1Api()
+    a, b = elector(api, 'a'), elector(api, 'b')
+    run(a.step())
+    run(b.step())
+    age_observations(b)
+
+    stale = api.read_namespaced_lease
+    async def read_then_renew(name, namespace):
+        lease = await stale(name, namespace)
+        await a.step()  # a renews between b's read and b's update
+        return lease
+    api.read_namespaced_lease = read_then_renew
+    run(b.step())
+
+    assert b.owned == frozenset()
+    assert api.leases[LEASE].spec.holder_identity == 'a'
+
+
+def test_stop_drains_then_releases_so_the_next_replica_takes_over_at_once():
+    api = FakeCoordinationV1Api()
+    events = []
+    a = elector(api, 'a',
+                on_release=lambda shards: events.append(('release', set(shards))),
+                on_drain=lambda shards: events.append(('drain', api.leases[LEASE].spec.holder_identity)))
+    b = elector(api, 'b')
+    run(a.step())
+
+    run(a.stop())
+
+    assert a.owned == frozenset()
+    assert events == [('release', {0}), ('drain', 'a')]
+    assert api.leases[LEASE].spec.holder_identity is None
+    run(b.step())
+    assert b.owned == {0}
+
+
+def test_shards_are_split_and_handed_over_when_a_replica_joins():
+    api = FakeCoordinationV1Api()
+    drained = []
+    a = elector(api, 'a', shard_count=4, on_drain=lambda shards: drained.append(
+        {shard: api.leases[a.shard_lease(shard)].spec.holder_identity for shard in shards}))
+    run(a.step())
+    assert a.owned == {0, 1, 2, 3}
+
+    b = elector(api, 'b', shard_count=4)
+    run(b.step())  # b joins the members; a still holds every shard
+    run(a.step())  # a sees b and gives up b's share
+    run(b.step())
+
+    assert len(a.owned) == len(b.owned) == 2
+    assert a.owned | b.owned == {0, 1, 2, 3}
+    # Each shard was drained while a still held its Lease
+    assert drained == [{shard: 'a' for shard in b.owned}]
+
+
+@pytest.fixture
+def sharded(monkeypatch):
+    owned = {'shard': True}
+    stub = type('Elector', (), {'owns': lambda self, namespace: namespace == 'kept' or owned['shard']})()
+    queue = controller.RateLimitedWorkQueue(0.01, 0.1)
+    monkeypatch.setattr(controller, 'shard_elector', stub)
+    monkeypatch.setattr(controller, 'update_queue', queue)
+    monkeypatch.setattr(controller, 'ingress_route_cache', controller.IngressRouteCache())
+    monkeypatch.setattr(controller, 'LEASE_RENEW_DEADLINE_SECONDS', 2)
+    return owned, queue
+
+
+def test_released_shards_drop_their_queued_keys(sharded):
+    owned, queue = sharded
+    progress = controller.ResyncProgress('test', 3)
+    for namespace in ('gone', 'kept'):
+        queue.add(('traefik.io', namespace, 'route'), [progress])
+    queue.add_rate_limited(('traefik.io', 'gone', 'retried'), [progress])
+
+    owned['shard'] = False
+    controller.on_shards_released({1})
+
+    assert queue.qsize() == 1
+    assert queue.get()[0] == ('traefik.io', 'kept', 'route')
+    assert progress.done == 2
+
+
+def test_drain_waits_for_patches_in_flight(sharded):
+    owned, queue = sharded
+    key = ('traefik.io', 'gone', 'route')
+    queue.add(key)
+    queue.get()
+    owned['shard'] = False
+
+    drained = threading.Event()
+    threading.Thread(target=lambda: controller.drain_released_shards({1}) or drained.set(), daemon=True).start()
+    assert not drained.wait(0.1)
+
+    queue.done(key)
+    assert drained.wait(1)
@@ -0,0 +1,201 @@
+"""Warm-restart snapshots: save/load round trips, stores and verification of restored routes."""
+import base64
+import gzip
+import json
+import logging
+from types import SimpleNamespace
+
+import controller
+import pytest
+from fake_api import FakeCustomObjectsApi
+from kubernetes.client.exceptions import ApiException
+
+GROUP = 'traefik.io'
+ZONE = 'example.com/zone'
+TARGET = 'external-dns.alpha.kubernetes.io/target'
+PROXIED = 'external-dns.alpha.kubernetes.io/cloudflare-proxied'
+CONFIGS = {
+    'public': {'namespace': 'traefik', 'name': 'public', 'priority': 100, 'default': True, 'annotations': {}},
+    'eu': {'namespace': 'traefik', 'name': 'eu', 'priority': 100, 'default': False, 'annotations': {ZONE: 'eu'}},
+}
+
+
+@pytest.fixture
+def state(monkeypatch, tmp_path):
+    monkeypatch.setattr(controller, 'service_configs', CONFIGS)
+    monkeypatch.setattr(controller, 'service_matcher', controller.ServiceMatcher(CONFIGS))
+    monkeypatch.setattr(controller, 'active_api_groups', [GROUP])
+    monkeypatch.setattr(controller, 'WATCH_NAMESPACES', [])
+    monkeypatch.setattr(controller, 'shard_elector', None)
+    monkeypatch.setattr(controller, 'service_targets', controller.ServiceTargetCache())
+    monkeypatch.setattr(controller, 'ingress_route_cache', controller.IngressRouteCache())
+    monkeypatch.setattr(controller, 'service_watch_versions', {'public': '100', 'eu': '101'})
+    monkeypatch.setattr(controller, 'startup_phases', {})
+    monkeypatch.setattr(controller, 'last_snapshot_digest', None)
+    monkeypatch.setattr(controller, 'snapshot_store', controller.FileSnapshotStore(str(tmp_path / 'snapshot')))
+    controller.service_targets.set('public', 'public.lb.example.com')
+    controller.service_targets.mark_ready('eu')
+    return tmp_path
+
+
+def add_route(name, annotations, resource_version='1'):
+    metadata = {'namespace': 'apps', 'name': name, 'resourceVersion': resource_version, 'annotations': annotations}
+    return controller.ingress_route_cache.upsert(GROUP, metadata)
+
+
+def restart(monkeypatch):
+    """Forget everything a restarted process would not know."""
+    monkeypatch.setattr(controller, 'service_targets', controller.ServiceTargetCache())
+    monkeypatch.setattr(controller, 'ingress_route_cache', controller.IngressRouteCache())
+    monkeypatch.setattr(controller, 'last_snapshot_digest', None)
+
+
+def test_round_trip_restores_targets_watch_versions_and_routes(state, monkeypatch):
+    add_route('web', {TARGET: 'public.lb.example.com', PROXIED: 'true', 'kubectl.kubernetes.io/last-applied-configuration': '{}'}, '7')
+    add_route('eu-app', {ZONE: 'eu'}, '8')
+    controller.save_snapshot()
+
+    restart(monkeypatch)
+    snapshot = controller.load_snapshot()
+    controller.restore_service_targets(snapshot)
+    restored = controller.restore_ingress_routes(snapshot)
+
+    assert snapshot['service_watches'] == {'public': '100', 'eu': '101'}
+    assert controller.service_targets.peek('public') == 'public.lb.example.com'
+    assert controller.service_targets.is_ready('eu') and controller.service_targets.peek('eu') is None
+    assert set(restored) == {(GROUP, 'apps', 'web'), (GROUP, 'apps', 'eu-app')}
+    web = controller.ingress_route_cache.get(GROUP, 'apps', 'web')
+    assert (web['resourceVersion'], web['service_type']) == ('7', 'public')
+    # Only the managed annotations are saved
+    assert web['annotations'] == {TARGET: 'public.lb.example.com', PROXIED: 'true'}
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'eu-app')['service_type'] == 'eu'
+    assert controller.ingress_route_cache.synced.is_set()
+    assert 'total' in controller.startup_phases
+
+
+def test_unchanged_snapshot_is_not_written_again(state):
+    writes = []
+    save = controller.snapshot_store.save
+    controller.snapshot_store.save = lambda data: writes.append(data) or save(data)
+    add_route('web', {})
+
+    controller.save_snapshot()
+    controller.save_snapshot()
+    add_route('web', {}, '2')
+    controller.save_snapshot()
+
+    assert len(writes) == 2
+
+
+def test_snapshot_of_another_configuration_is_ignored(state, monkeypatch):
+    controller.save_snapshot()
+    monkeypatch.setattr(controller, 'service_configs', {'public': CONFIGS['public']})
+
+    assert controller.load_snapshot() is None
+
+
+def test_missing_or_corrupt_snapshot_starts_cold(state):
+    assert controller.load_snapshot() is None
+    (state / 'snapshot').write_bytes(b'not gzip')
+    assert controller.load_snapshot() is None
+
+
+def test_verification_drops_only_routes_deleted_while_down(state, monkeypatch):
+    add_route('kept', {})
+    add_route('deleted', {})
+    add_route('recreated', {})
+    controller.save_snapshot()
+    restart(monkeypatch)
+    restored = controller.restore_ingress_routes(controller.load_snapshot())
+
+    api = FakeCustomObjectsApi()
+    api.add(GROUP, 'apps', 'kept', {})
+    monkeypatch.setattr(controller, 'custom_objects_api', api)
+    # An event for a route the LIST does not include (created after it started)
+    add_route('recreated', {}, '9')
+
+    assert controller.verify_restored_routes(restored) == 1
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'kept') is not None
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'deleted') is None
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'recreated')['resourceVersion'] == '9'
+
+
+def test_failed_verification_drops_nothing(state, monkeypatch):
+    add_route('web', {})
+    controller.save_snapshot()
+    restart(monkeypatch)
+    restored = controller.restore_ingress_routes(controller.load_snapshot())
+
+    class FailingApi:
+        def list_cluster_custom_object(self, **_):
+            raise ApiException(status=500)
+    monkeypatch.setattr(controller, 'custom_objects_api', FailingApi())
+
+    assert controller.verify_restored_routes(restored) == 0
+    assert controller.ingress_route_cache.get(GROUP, 'apps', 'web') is not None
+
+
+class FakeCoreApi:
+    def __init__(self):
+        self.config_maps = {}
+        self.writes = 0
+
+    def read_namespaced_config_map(self, name, namespace, **_):
+        if (namespace, name) not in self.config_maps:
+            raise ApiException(status=404)
+        return SimpleNamespace(binary_data=self.config_maps[namespace, name]['binaryData'])
+
+    def replace_namespaced_config_map(self, name, namespace, body, **_):
+        if (namespace, name) not in self.config_maps:
+            raise ApiException(status=404)
+        self.writes += 1
+        self.config_maps[namespace, name] = body
+
+    def create_namespaced_config_map(self, namespace, body, **_):
+        self.writes += 1
+        self.config_maps[namespace, body['metadata']['name']] = body
+
+
+@pytest.fixture
+def config_map_store(monkeypatch):
+    api = FakeCoreApi()
+    monkeypatch.setattr(controller, 'core_v1_api', api)
+    return api, controller.ConfigMapSnapshotStore('system', 'snapshot')
+
+
+def test_config_map_store_round_trip(config_map_store):
+    api, store = config_map_store
+    assert store.load() is None
+
+    assert store.save(b'first')   # created
+    assert store.save(b'second')  # replaced
+
+    assert store.load() == b'second'
+    assert api.writes == 2
+    assert base64.b64decode(api.config_maps['system', 'snapshot']['binaryData'][controller.SNAPSHOT_CONFIGMAP_KEY]) == b'second'
+
+
+def test_config_map_store_skips_snapshots_over_the_size_limit(config_map_store, monkeypatch, caplog):
+    api, store = config_map_store
+    monkeypatch.setattr(controller, 'SNAPSHOT_CONFIGMAP_MAX_BYTES', 100)
+    store.save(b'small')
+
+    with caplog.at_level(logging.WARNING, logger=controller.logger.name):
+        assert not store.save(b'x' * 200)
+        assert not store.save(b'y' * 200)
+
+    # Warned and cleared once, so a restart goes cold instead of using the old snapshot
+    assert len([record for record in caplog.records if 'does not fit' in record.message]) == 1
+    assert api.writes == 2
+    assert store.load() is None
+    assert store.save(b'small again')
+    assert store.load() == b'small again'
+
+
+def test_saved_snapshot_is_gzipped_json(state):
+    add_route('web', {})
+    controller.save_snapshot()
+
+    snapshot = json.loads(gzip.decompress((state / 'snapshot').read_bytes()))
+    assert snapshot['routes'] == [[GROUP, 'apps', 'web', '1', 'public', {}]]
+    assert snapshot['fingerprint'] == controller.snapshot_fingerprint()
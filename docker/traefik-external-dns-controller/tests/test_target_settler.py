@@ -0,0 +1,31 @@
+"""Convergence of a settled LoadBalancer change is measured from its first event."""
+import threading
+import time
+
+import controller
+
+
+def test_settled_change_is_applied_with_its_first_seen_time():
+    applied = []
+    done = threading.Event()
+    settler = controller.TargetSettler(lambda *args: applied.append(args) or done.set(), settle=0.05, max_delay=1)
+
+    before = time.monotonic()
+    assert settler.observe('public', 'a.lb.example.com', 'old.lb.example.com') == 'pending'
+    time.sleep(0.02)
+    assert settler.observe('public', 'b.lb.example.com', 'old.lb.example.com') == 'pending'
+    assert done.wait(1)
+
+    [(service_type, targets, first_seen)] = applied
+    assert (service_type, targets) == ('public', 'b.lb.example.com')
+    assert before <= first_seen < before + 0.02
+
+
+def test_convergence_includes_the_settle_window():
+    def observed_sum():
+        return controller.REGISTRY.get_sample_value(
+            f'{controller.METRICS_PREFIX}_lb_convergence_seconds_sum', {'service_type': 'settle-test'}) or 0
+
+    before = observed_sum()
+    controller.ResyncProgress('test', 0, 'settle-test', started=time.monotonic() - 5)
+    assert observed_sum() - before >= 5
@@ -0,0 +1,166 @@
+"""RateLimitedWorkQueue, TokenBucket and patch_worker, driven without kopf or a cluster."""
+import threading
+import time
+
+import controller
+import pytest
+
+
+def key(namespace, name):
+    return ('traefik.io', namespace, name)
+
+
+@pytest.fixture
+def queue():
+    return controller.RateLimitedWorkQueue(base_delay=10, max_delay=40)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(controller.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(controller.time, 'sleep', clock.sleep)
+    return clock
+
+
+def test_pending_key_is_added_once(queue):
+    queue.add(key('a', 'r1'))
+    queue.add(key('a', 'r1'))
+
+    assert queue.qsize() == 1
+    assert queue.coalesced == 1
+    assert queue.get() == (key('a', 'r1'), [])
+
+
+def test_key_added_while_processing_is_queued_again_when_done(queue):
+    queue.add(key('a', 'r1'))
+    got, _ = queue.get()
+    queue.add(got)
+    queue.add(got)
+
+    # Never handed to a second worker while the first one holds it
+    assert queue.qsize() == 0
+    queue.done(got)
+    assert queue.qsize() == 1
+    assert queue.get()[0] == got
+
+
+def test_progress_batches_follow_the_key(queue):
+    first, second = object(), object()
+    queue.add(key('a', 'r1'), [first])
+    queue.add(key('a', 'r1'), [first, second])
+
+    assert queue.get() == (key('a', 'r1'), [first, second])
+
+
+def test_namespaces_take_turns(queue):
+    for name in ('r1', 'r2', 'r3'):
+        queue.add(key('busy', name))
+    queue.add(key('quiet', 'r1'))
+    queue.add(key('other', 'r1'))
+
+    order = []
+    while queue.qsize():
+        got, _ = queue.get()
+        queue.done(got)
+        order.append(got)
+
+    assert order == [key('busy', 'r1'), key('quiet', 'r1'), key('other', 'r1'), key('busy', 'r2'), key('busy', 'r3')]
+
+
+def test_backoff_doubles_up_to_the_maximum_and_resets_on_forget(queue, clock):
+    k = key('a', 'r1')
+    assert [queue.add_rate_limited(k) for _ in range(4)] == [10, 20, 40, 40]
+    assert queue.num_requeues(k) == 4
+
+    queue.forget(k)
+    assert queue.num_requeues(k) == 0
+    assert queue.add_rate_limited(k) == 10
+
+
+def test_rate_limited_key_is_not_ready_before_its_delay(queue, clock):
+    k = key('a', 'r1')
+    queue.add_rate_limited(k)
+    assert queue.qsize() == 1
+
+    got = []
+    worker = threading.Thread(target=lambda: got.append(queue.get()), daemon=True)
+    worker.start()
+    worker.join(0.1)
+    assert not got
+
+    clock.now += 10
+    with queue._cond:
+        queue._cond.notify_all()
+    worker.join(1)
+    assert got == [(k, [])]
+
+
+def test_token_bucket_allows_a_burst_then_throttles(clock):
+    bucket = controller.TokenBucket(rate=10, burst=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == []
+
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.slept == pytest.approx([0.1, 0.1])
+
+
+def test_token_bucket_refills_while_idle(clock):
+    bucket = controller.TokenBucket(rate=10, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 1
+
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.slept == []
+
+
+def test_token_bucket_rate_zero_is_unlimited(clock):
+    bucket = controller.TokenBucket(rate=0, burst=1)
+    for _ in range(100):
+        bucket.acquire()
+    assert clock.slept == []
+
+
+def test_patch_worker_retries_with_backoff_and_resets_on_success(monkeypatch):
+    queue = controller.RateLimitedWorkQueue(base_delay=0.01, max_delay=0.01)
+    attempts = []
+    reconciled = threading.Event()
+
+    def reconcile(group, namespace, name, bulk=False):
+        attempts.append(queue.num_requeues((group, namespace, name)))
+        if len(attempts) < 3:
+            raise RuntimeError('conflict')
+        reconciled.set()
+        return True
+    monkeypatch.setattr(controller, 'update_queue', queue)
+    monkeypatch.setattr(controller, 'reconcile_ingress_route', reconcile)
+    progress = controller.ResyncProgress('test', 1)
+
+    queue.add(key('a', 'r1'), [progress])
+    threading.Thread(target=controller.patch_worker, daemon=True).start()
+
+    assert reconciled.wait(5)
+    for _ in range(100):
+        if progress.done:
+            break
+        time.sleep(0.01)
+    assert attempts == [0, 1, 2]
+    assert queue.num_requeues(key('a', 'r1')) == 0
+    assert (progress.done, progress.updated) == (1, 1)